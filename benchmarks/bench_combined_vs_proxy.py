@@ -0,0 +1,126 @@
+"""Compare request latency of split (proxy -> backend) and combined deployments.
+
+Starts the servers as subprocesses in a scratch work directory, waits until
+they answer, then times the same GET against each mode:
+
+    python benchmarks/bench_combined_vs_proxy.py --requests 500 --concurrency 8
+
+Requires the package to be installed with the web UI built (make build),
+since both the proxy and the combined server serve the frontend.
+"""
+import argparse
+import asyncio
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+
+def start_server(module, args, cwd):
+    return subprocess.Popen(
+        [sys.executable, "-m", module, *args],
+        cwd=cwd,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+
+
+async def wait_until_up(url, timeout=60.0):
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as client:
+        while time.monotonic() < deadline:
+            try:
+                await client.get(url, timeout=1.0)
+                return
+            except httpx.HTTPError:
+                await asyncio.sleep(0.2)
+    raise RuntimeError(f"{url} did not come up within {timeout}s")
+
+
+async def measure(url, requests, concurrency):
+    latencies = []
+    semaphore = asyncio.Semaphore(concurrency)
+    async with httpx.AsyncClient() as client:
+        # Warm up connections and server-side caches
+        for _ in range(10):
+            await client.get(url)
+
+        async def one():
+            async with semaphore:
+                start = time.perf_counter()
+                response = await client.get(url)
+                latencies.append(time.perf_counter() - start)
+                response.raise_for_status()
+
+        wall_start = time.perf_counter()
+        await asyncio.gather(*[one() for _ in range(requests)])
+        wall = time.perf_counter() - wall_start
+
+    latencies.sort()
+    return {
+        "mean_ms": statistics.mean(latencies) * 1000,
+        "p50_ms": latencies[len(latencies) // 2] * 1000,
+        "p95_ms": latencies[int(len(latencies) * 0.95) - 1] * 1000,
+        "rps": requests / wall,
+    }
+
+
+def report(name, result):
+    print(
+        f"{name:<10} mean {result['mean_ms']:8.2f} ms  p50 {result['p50_ms']:8.2f} ms  "
+        f"p95 {result['p95_ms']:8.2f} ms  {result['rps']:8.1f} req/s"
+    )
+
+
+async def run(args):
+    workdir = tempfile.mkdtemp(prefix="william-toolbox-bench-")
+    processes = []
+    try:
+        processes.append(start_server(
+            "williamtoolbox.server.backend_server",
+            ["--host", "127.0.0.1", "--port", str(args.backend_port)],
+            workdir,
+        ))
+        processes.append(start_server(
+            "williamtoolbox.server.proxy_server",
+            ["--host", "127.0.0.1", "--port", str(args.proxy_port),
+             "--backend_url", f"http://127.0.0.1:{args.backend_port}"],
+            workdir,
+        ))
+        processes.append(start_server(
+            "williamtoolbox.server.combined_server",
+            ["--host", "127.0.0.1", "--port", str(args.combined_port)],
+            workdir,
+        ))
+
+        split_url = f"http://127.0.0.1:{args.proxy_port}{args.path}"
+        combined_url = f"http://127.0.0.1:{args.combined_port}{args.path}"
+        await wait_until_up(split_url)
+        await wait_until_up(combined_url)
+
+        print(f"GET {args.path}: {args.requests} requests, concurrency {args.concurrency}")
+        report("split", await measure(split_url, args.requests, args.concurrency))
+        report("combined", await measure(combined_url, args.requests, args.concurrency))
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.wait(timeout=10)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Split vs combined latency benchmark")
+    parser.add_argument("--path", default="/config", help="GET path to time (default: /config)")
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--backend_port", type=int, default=18005)
+    parser.add_argument("--proxy_port", type=int, default=18006)
+    parser.add_argument("--combined_port", type=int, default=18007)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
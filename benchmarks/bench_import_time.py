@@ -0,0 +1,101 @@
+"""Measure backend start-up cost: import time and resident memory.
+
+Each measurement runs in a fresh interpreter with ``-X importtime`` so module
+caches from a previous run do not hide anything:
+
+    python benchmarks/bench_import_time.py --top 15
+    python benchmarks/bench_import_time.py --apps rag,models
+
+The first line is the cost of importing backend_server alone (routers are
+loaded lazily); then, for each selected app, the extra cost of loading it.
+"""
+import argparse
+import subprocess
+import sys
+
+BACKEND_MODULE = "williamtoolbox.server.backend_server"
+
+
+def run_import(app_names):
+    """Import the backend (and the modules of app_names) in a child interpreter.
+
+    Returns (total_seconds, [(cumulative_us, module), ...], max_rss_kb).
+    """
+    code = [f"import {BACKEND_MODULE}", "import importlib"]
+    if app_names:
+        code.append("from williamtoolbox.server.lazy_apps import BACKEND_APPS")
+        for name in app_names:
+            code.append(
+                f"[importlib.import_module(m, 'williamtoolbox.server') for m in BACKEND_APPS[{name!r}][0]]"
+            )
+    code.append("import resource; print(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)")
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "; ".join(code)],
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1])
+    max_rss = int(result.stdout.strip().splitlines()[-1])
+
+    modules = []
+    for line in result.stderr.splitlines():
+        # "import time: self [us] | cumulative | imported package"
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, self_us, cumulative_us, name = line.replace("import time:", "|").split("|")
+        modules.append((int(cumulative_us), name[1:].rstrip()))
+    # Top-level imports (no indentation) add up to the total
+    total_us = sum(
+        cumulative
+        for cumulative, name in modules
+        if not name.startswith(" ")
+    )
+    modules = [(cumulative, name.strip()) for cumulative, name in modules]
+    return total_us / 1e6, sorted(modules, reverse=True), max_rss
+
+
+def best_of(app_names, repeat):
+    """Run run_import repeat times and keep the fastest (least noisy) result."""
+    return min((run_import(app_names) for _ in range(repeat)), key=lambda result: result[0])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Backend import-time benchmark")
+    parser.add_argument("--apps", default="all", help="Comma separated apps to measure (default: all)")
+    parser.add_argument("--top", type=int, default=10, help="Slowest modules to list")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per measurement, fastest is kept")
+    args = parser.parse_args()
+
+    from williamtoolbox.server.lazy_apps import parse_enabled_apps
+
+    apps = parse_enabled_apps(args.apps)
+
+    base_seconds, base_modules, base_rss = best_of([], args.repeat)
+    print(f"{'backend_server (lazy)':<28} {base_seconds * 1000:9.1f} ms  max RSS {base_rss / 1024:7.1f} MiB")
+    for cumulative, name in base_modules[: args.top]:
+        print(f"    {cumulative / 1000:9.1f} ms  {name}")
+
+    importable = []
+    for name in apps:
+        try:
+            seconds, _, rss = best_of([name], args.repeat)
+        except RuntimeError as e:
+            print(f"{'+ ' + name:<28} failed: {e}")
+            continue
+        importable.append(name)
+        print(
+            f"{'+ ' + name:<28} {(seconds - base_seconds) * 1000:+9.1f} ms  "
+            f"max RSS {(rss - base_rss) / 1024:+7.1f} MiB"
+        )
+
+    if not importable:
+        return
+    seconds, modules, rss = best_of(importable, args.repeat)
+    print(f"{'all selected apps':<28} {seconds * 1000:9.1f} ms  max RSS {rss / 1024:7.1f} MiB")
+    for cumulative, name in modules[: args.top]:
+        print(f"    {cumulative / 1000:9.1f} ms  {name}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1140,6 +1140,17 @@ const Chat: React.FC = () => {
                           <Typography.Text style={{ color: item.role === 'user' ? '#096dd9' : '#389e0d', flex: 1 }}>
                             <ReactMarkdown
                               components={{
+                                img({ src, alt, ...props }: any) {
+                                  // Load a resized WebP for RAG images; click through for the original
+                                  const thumbSrc = src && src.includes('_images') && !src.includes('?')
+                                    ? `${src}?w=800&fmt=webp`
+                                    : src;
+                                  return (
+                                    <a href={src} target="_blank" rel="noopener noreferrer">
+                                      <img src={thumbSrc} alt={alt} loading="lazy" style={{ maxWidth: '100%' }} {...props} />
+                                    </a>
+                                  );
+                                },
                                 code({ inline, className, children, ...props }: any) {
                                   const match = /language-(\w+)/.exec(className || '');
                                   return !inline && match ? (
@@ -33,6 +33,7 @@ setup(
             'william.toolbox = williamtoolbox.williamtoolbox_command:main',
             'william.toolbox.backend = williamtoolbox.server.backend_server:main',
             'william.toolbox.frontend = williamtoolbox.server.proxy_server:main',
+            'william.toolbox.combined = williamtoolbox.server.combined_server:main',
         ],
     },
     package_dir={"": "src"},
@@ -14,6 +14,7 @@ from openai import AsyncOpenAI
 from loguru import logger
 from byzerllm.utils.client import code_utils
 from williamtoolbox.storage.json_file import load_config, load_models_from_json, load_rags_from_json
+from williamtoolbox.server.rag_replicas import rag_balancer
 from autocoder.rag.relevant_utils import FilterDoc
 
 
@@ -231,21 +232,16 @@ async def chat_with_rag(rag_name: str, messages: List[Dict[str, str]]) -> str:
         if rag_info["status"] != "running":
             raise ValueError(f"RAG {rag_name} is not running")
             
-        host = rag_info.get("host", "localhost")
-        port = rag_info.get("port", 8000)
-        if host == "0.0.0.0":
-            host = "127.0.0.1"
-
-        base_url = f"http://{host}:{port}/v1"
-        client = AsyncOpenAI(base_url=base_url, api_key="xxxx")
-
-        # 调用RAG
-        response = await client.chat.completions.create(
-            model=rag_info.get("model", "deepseek_chat"),
-            messages=messages,
-            stream=False,
-            max_tokens=4*1024
-        )
+        async with rag_balancer.route(rag_name, rag_info) as base_url:
+            client = AsyncOpenAI(base_url=base_url, api_key="xxxx")
+
+            # 调用RAG
+            response = await client.chat.completions.create(
+                model=rag_info.get("model", "deepseek_chat"),
+                messages=messages,
+                stream=False,
+                max_tokens=4*1024
+            )
         return response.choices[0].message.content
         
     except Exception as e:
@@ -0,0 +1,259 @@
+import time
+from typing import Dict, List, Optional, Sequence, Tuple
+
+# In-process metrics rendered in the Prometheus text format at /metrics.
+# Every backend worker keeps its own values; there is no external collector.
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+RATE_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+INF_LABEL = 'le="+Inf"'
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class Metric:
+    metric_type = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), registry=None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        (registry if registry is not None else REGISTRY).register(self)
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.metric_type}"]
+        lines.extend(self.samples())
+        return "\n".join(lines)
+
+
+class Counter(Metric):
+    metric_type = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def samples(self) -> List[str]:
+        return [
+            f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+            for key, value in sorted(self._values.items())
+        ]
+
+
+class Gauge(Counter):
+    metric_type = "gauge"
+
+    def dec(self, amount: float = 1.0, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels):
+        self._values[self._key(labels)] = value
+
+
+class Histogram(Metric):
+    metric_type = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS, registry=None):
+        super().__init__(name, documentation, labelnames, registry)
+        self.buckets = tuple(sorted(buckets))
+        # key -> ([count per bucket], sum, count)
+        self._values: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        state = self._values.get(key)
+        if state is None:
+            state = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                state[0][i] += 1
+                break
+        state[1] += value
+        state[2] += 1
+
+    def count(self, **labels) -> int:
+        state = self._values.get(self._key(labels))
+        return state[2] if state else 0
+
+    def samples(self) -> List[str]:
+        lines = []
+        for key, (bucket_counts, total, count) in sorted(self._values.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, bucket_counts):
+                cumulative += bucket_count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+            lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, INF_LABEL)} {count}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: Dict[str, Metric] = {}
+
+    def register(self, metric: Metric):
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} is already registered")
+        self._metrics[metric.name] = metric
+
+    def get(self, name: str) -> Optional[Metric]:
+        return self._metrics.get(name)
+
+    def render(self) -> str:
+        return "\n".join(metric.render() for metric in self._metrics.values()) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+# HTTP
+HTTP_REQUESTS = Counter(
+    "http_requests_total", "HTTP requests by route template and status.", ["method", "route", "status"]
+)
+HTTP_REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds", "Time until the response body was sent.", ["method", "route"]
+)
+HTTP_REQUESTS_IN_FLIGHT = Gauge(
+    "http_requests_in_flight", "Requests currently being served.", ["method"]
+)
+HTTP_RESPONSE_SIZE = Histogram(
+    "http_response_size_bytes", "Response body size.", ["method", "route"], buckets=SIZE_BUCKETS
+)
+
+# JSON registries (models.json, rags.json, ...)
+STORAGE_LOCK_WAIT = Histogram(
+    "storage_lock_wait_seconds", "Time spent waiting for a registry file lock.", ["registry"]
+)
+STORAGE_OPERATION_DURATION = Histogram(
+    "storage_operation_duration_seconds", "Registry load/save duration (excluding lock wait).",
+    ["registry", "operation"]
+)
+STORAGE_BYTES = Counter(
+    "storage_bytes_total", "Bytes read from or written to registry files.", ["registry", "operation"]
+)
+
+# Chat streams
+CHAT_TIME_TO_FIRST_TOKEN = Histogram(
+    "chat_stream_time_to_first_token_seconds", "Time from request to the first streamed token.",
+    ["list_type", "upstream"]
+)
+CHAT_TOKENS_PER_SECOND = Histogram(
+    "chat_stream_tokens_per_second", "Streamed tokens per second after the first token.",
+    ["list_type", "upstream"], buckets=RATE_BUCKETS
+)
+CHAT_STREAM_TOKENS = Counter(
+    "chat_stream_tokens_total", "Streamed tokens (one per upstream delta).", ["list_type", "upstream"]
+)
+CHAT_STREAM_EVENTS = Counter(
+    "chat_stream_events_total", "Events written to chat event files.", ["list_type", "upstream", "event"]
+)
+
+TOKEN_EVENTS = ("chunk", "thought", "stream_thought")
+
+
+class ChatStreamRecorder:
+    """Records the chat_stream_* metrics for one streamed answer.
+
+    Each upstream stream delta is counted as one token; OpenAI-compatible
+    servers send one token per delta in practice.
+    """
+
+    def __init__(self, list_type: str, upstream: str):
+        self.labels = {"list_type": list_type, "upstream": upstream}
+        self.start = time.perf_counter()
+        self.first_token_at: Optional[float] = None
+        self.tokens = 0
+
+    def record(self, event: Dict) -> None:
+        event_type = event.get("event", "")
+        CHAT_STREAM_EVENTS.inc(event=event_type, **self.labels)
+        if event_type in TOKEN_EVENTS and event.get("content"):
+            if self.first_token_at is None:
+                self.first_token_at = time.perf_counter()
+                CHAT_TIME_TO_FIRST_TOKEN.observe(self.first_token_at - self.start, **self.labels)
+            self.tokens += 1
+            CHAT_STREAM_TOKENS.inc(**self.labels)
+
+    def finish(self) -> None:
+        if self.first_token_at is None or self.tokens < 2:
+            return
+        elapsed = time.perf_counter() - self.first_token_at
+        if elapsed > 0:
+            CHAT_TOKENS_PER_SECOND.observe((self.tokens - 1) / elapsed, **self.labels)
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware recording the http_* metrics.
+
+    Requests are labelled with the route template (e.g. /rags/{rag_name})
+    rather than the raw path so label cardinality stays bounded.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        start = time.perf_counter()
+        status = 500
+        size = 0
+        has_length = False
+        HTTP_REQUESTS_IN_FLIGHT.inc(method=method)
+
+        async def send_wrapper(message):
+            nonlocal status, size, has_length
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                for name, value in message.get("headers", []):
+                    if name.lower() == b"content-length":
+                        size = int(value)
+                        has_length = True
+            elif message["type"] == "http.response.body" and not has_length:
+                size += len(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            HTTP_REQUESTS_IN_FLIGHT.dec(method=method)
+            route = getattr(scope.get("route"), "path", None) or "unmatched"
+            HTTP_REQUESTS.inc(method=method, route=route, status=str(status))
+            HTTP_REQUEST_DURATION.observe(time.perf_counter() - start, method=method, route=route)
+            HTTP_RESPONSE_SIZE.observe(size, method=method, route=route)
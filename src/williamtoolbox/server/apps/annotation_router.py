@@ -3,10 +3,11 @@ from fastapi.responses import JSONResponse
 from pathlib import Path
 import uuid
 import traceback
-import asyncio
-from concurrent.futures import ThreadPoolExecutor
 from typing import Dict, Any, List
 from williamtoolbox.storage.json_file import load_file_resources, save_file_resources
+from williamtoolbox.server.uploads import save_upload
+from williamtoolbox.storage.blob_store import blob_store
+from functools import partial
 from williamtoolbox.annotation import extract_text_from_docx, extract_annotations_from_docx, auto_generate_annotations
 from datetime import datetime
 from pydantic import BaseModel
@@ -16,29 +17,30 @@ import aiofiles
 router = APIRouter()
 
 
-# 线程池用于处理阻塞操作
-executor = ThreadPoolExecutor(max_workers=4)
-
 # 确保上传目录存在
 UPLOAD_DIR = Path("./data/upload")
 UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
 
-async def save_uploaded_file(file: UploadFile) -> str:
-    """保存上传的文件并返回生成的UUID"""
+async def save_uploaded_file(file: UploadFile):
+    """保存上传的文件并返回生成的UUID和内容的sha256"""
     file_uuid = str(uuid.uuid4())
     file_path = UPLOAD_DIR / file_uuid
     
     try:
-        with open(file_path, "wb") as buffer:
-            buffer.write(await file.read())
-        return file_uuid
+        # 分块写入内容寻址存储，相同内容只保存一份
+        _, sha256 = await save_upload(file, str(file_path))
+        return file_uuid, sha256
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to save file: {str(e)}")
 
+async def extract_cached(file_resource: Dict[str, Any], kind: str, func):
+    """按内容 sha256 缓存解析结果，相同文档（无论上传几次）只解析一次"""
+    return await blob_store.derived(kind, file_resource.get("sha256"), partial(func, file_resource["path"]))
+
 @router.post("/api/annotations/upload")
 async def upload_file(file: UploadFile, username: str):
     """上传文档接口"""
-    file_uuid = await save_uploaded_file(file)
+    file_uuid, sha256 = await save_uploaded_file(file)
     
     # 保存文件资源信息
     file_resources = await load_file_resources()
@@ -47,6 +49,7 @@ async def upload_file(file: UploadFile, username: str):
         "path": str(UPLOAD_DIR / file_uuid),
         "username": username,
         "original_name": file.filename,
+        "sha256": sha256,
         "upload_time": str(datetime.now())
     }
     await save_file_resources(file_resources)
@@ -63,17 +66,10 @@ async def get_document_content(file_uuid: str):
     if file_uuid not in file_resources:
         raise HTTPException(status_code=404, detail="File not found")
     
-    file_path = file_resources[file_uuid]["path"]
-    
-    # 使用线程池处理阻塞操作
-    loop = asyncio.get_event_loop()
+    # 在线程中解析，结果按内容缓存
     try:
-        full_text = await loop.run_in_executor(
-            executor, extract_text_from_docx, file_path
-        )
-        comments = await loop.run_in_executor(
-            executor, extract_annotations_from_docx, file_path
-        )
+        full_text = await extract_cached(file_resources[file_uuid], "docx_text", extract_text_from_docx)
+        comments = await extract_cached(file_resources[file_uuid], "docx_annotations", extract_annotations_from_docx)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to process document: {str(e)}")
     
@@ -100,13 +96,8 @@ async def save_all_annotations(file_uuid: str, annotations: List[Dict[str, Any]]
         if file_uuid not in file_resources:
             raise HTTPException(status_code=404, detail="File not found")
         
-        file_path = file_resources[file_uuid]["path"]
-        
         # 读取文档内容
-        loop = asyncio.get_event_loop()
-        doc_text = await loop.run_in_executor(
-            executor, extract_text_from_docx, file_path
-        )
+        doc_text = await extract_cached(file_resources[file_uuid], "docx_text", extract_text_from_docx)
         
         # 确保保存目录存在
         save_dir = Path("./data/annotations")
@@ -142,14 +133,9 @@ async def auto_generate_annotation(request: AutoGenerateAnnotationRequest):
     if request.file_uuid not in file_resources:
         raise HTTPException(status_code=404, detail="File not found")
     
-    file_path = file_resources[request.file_uuid]["path"]
-    
     try:
         # 读取文档内容
-        loop = asyncio.get_event_loop()
-        doc_text = await loop.run_in_executor(
-            executor, extract_text_from_docx, file_path
-        )
+        doc_text = await extract_cached(file_resources[request.file_uuid], "docx_text", extract_text_from_docx)
         
         # 调用自动生成批注
         result = await auto_generate_annotations(request.rag_name, doc_text, request.model_name)
@@ -0,0 +1,262 @@
+import os
+import stat
+import uuid
+import hashlib
+import tarfile
+import zipfile
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, AsyncIterator, Dict, IO, List, Optional, Tuple
+from loguru import logger
+
+from ..metrics import Counter
+from ..storage.blob_store import blob_store
+from .doc_manifest import parse_exts, load_manifest, HASH_BLOCK_BYTES, EXCLUDED_DIRS
+from .uploads import write_atomic, resolve_target, temp_path
+
+# Archives are spooled here (streamed, never held in memory) before extraction
+ARCHIVE_SPOOL_DIR = os.path.join("data", "uploads", "archives")
+MAX_ARCHIVE_BYTES = int(os.environ.get("WILLIAM_TOOLBOX_MAX_ARCHIVE_BYTES", 20 * 1024 ** 3))
+# Guards against archive bombs: limits on what an archive may expand to
+MAX_MEMBERS = 200_000
+MAX_EXTRACTED_BYTES = int(os.environ.get("WILLIAM_TOOLBOX_MAX_EXTRACTED_BYTES", 100 * 1024 ** 3))
+EXTRACT_WORKERS = min(8, (os.cpu_count() or 1) + 2)
+# Never written by an archive: image extraction output and the index cache
+RESERVED_DIRS = EXCLUDED_DIRS + ("__MACOSX",)
+
+ARCHIVE_FILES = Counter("rag_archive_files_total", "Files seen in ingested archives.", ["status"])
+
+ADDED, UPDATED, UNCHANGED, SKIPPED, FAILED = "added", "updated", "unchanged", "skipped", "failed"
+
+
+async def spool(blocks: AsyncIterator[bytes]) -> str:
+    """Write a streamed archive to a temp file and return its path."""
+    path = os.path.join(ARCHIVE_SPOOL_DIR, uuid.uuid4().hex)
+    await write_atomic(blocks, path, max_bytes=MAX_ARCHIVE_BYTES)
+    return path
+
+
+def _file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while True:
+            block = f.read(HASH_BLOCK_BYTES)
+            if not block:
+                return digest.hexdigest()
+            digest.update(block)
+
+
+class _Extraction:
+    """State shared by the extraction workers of one archive."""
+
+    def __init__(self, doc_dir: str, exts: List[str], strip_components: int,
+                 subdir: Optional[str], known: Dict[str, Dict[str, Any]]):
+        self.doc_dir = os.path.abspath(doc_dir)
+        self.exts = exts
+        self.strip_components = strip_components
+        self.subdir = subdir
+        # Manifest entries of the last build: lets unchanged files skip hashing
+        self.known = known
+        self.extracted_bytes = 0
+        self._lock = threading.Lock()
+
+    def target(self, name: str) -> Tuple[Optional[str], Optional[str]]:
+        """doc_dir-relative path of an archive member, or (None, reason) to skip it."""
+        parts = [p for p in name.replace("\\", "/").split("/") if p not in ("", ".")]
+        if ".." in parts or os.path.isabs(name):
+            return None, "path escapes doc_dir"
+        if any(p.startswith(".") or p in RESERVED_DIRS for p in parts):
+            return None, "hidden or reserved path"
+        parts = parts[self.strip_components:]
+        if not parts:
+            return None, "outside strip_components"
+        if self.exts and os.path.splitext(parts[-1])[1].lower() not in self.exts:
+            return None, "extension not in required_exts"
+        rel_path = os.path.join(*([self.subdir] if self.subdir else []), *parts)
+        try:
+            resolve_target(self.doc_dir, rel_path)
+        except ValueError:
+            return None, "path escapes doc_dir"
+        return rel_path, None
+
+    def _existing_sha256(self, rel_path: str, size: int) -> Optional[str]:
+        path = os.path.join(self.doc_dir, rel_path)
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            return None
+        if st.st_size != size:
+            return ""
+        entry = self.known.get(rel_path)
+        if entry and entry["size"] == st.st_size and entry["mtime_ns"] == st.st_mtime_ns:
+            return entry["sha256"]
+        return _file_sha256(path)
+
+    def write_temp(self, rel_path: str, size: int, source: IO[bytes]) -> Tuple[str, int, str]:
+        """Copy a member into a temp file beside its target while hashing it."""
+        with self._lock:
+            if self.extracted_bytes + size > MAX_EXTRACTED_BYTES:
+                raise ValueError(f"Archive expands beyond {MAX_EXTRACTED_BYTES} bytes")
+            self.extracted_bytes += size
+        path = os.path.join(self.doc_dir, rel_path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = temp_path(path)
+        digest = hashlib.sha256()
+        written = 0
+        try:
+            with open(tmp_path, "wb") as out:
+                while True:
+                    block = source.read(HASH_BLOCK_BYTES)
+                    if not block:
+                        break
+                    written += len(block)
+                    if written > size:
+                        raise ValueError("member larger than its declared size")
+                    digest.update(block)
+                    out.write(block)
+        except BaseException:
+            self.discard(tmp_path)
+            raise
+        return tmp_path, written, digest.hexdigest()
+
+    def commit(self, rel_path: str, tmp_path: str, size: int, sha256: str) -> Dict[str, Any]:
+        """Move the temp file into place unless doc_dir already has the same content."""
+        try:
+            existing = self._existing_sha256(rel_path, size)
+            if existing == sha256:
+                self.discard(tmp_path)
+                return {"path": rel_path, "status": UNCHANGED, "size": size, "sha256": sha256}
+            link = blob_store.store_file_sync(tmp_path, sha256, os.path.join(self.doc_dir, rel_path))
+        except Exception as e:
+            self.discard(tmp_path)
+            return {"path": rel_path, "status": FAILED, "reason": str(e)}
+        return {"path": rel_path, "status": ADDED if existing is None else UPDATED, "size": size, "sha256": sha256,
+                "link": link}
+
+    @staticmethod
+    def discard(tmp_path: str) -> None:
+        try:
+            os.remove(tmp_path)
+        except FileNotFoundError:
+            pass
+
+
+def _extract_zip(archive_path: str, extraction: _Extraction) -> List[Dict[str, Any]]:
+    with zipfile.ZipFile(archive_path) as zf:
+        members = zf.infolist()
+    if len(members) > MAX_MEMBERS:
+        raise ValueError(f"Archive has more than {MAX_MEMBERS} entries")
+    local = threading.local()
+    handles = []
+
+    def one(info: zipfile.ZipInfo) -> Optional[Dict[str, Any]]:
+        if info.is_dir():
+            return None
+        if stat.S_ISLNK(info.external_attr >> 16):
+            return {"path": info.filename, "status": SKIPPED, "reason": "symlink"}
+        rel_path, reason = extraction.target(info.filename)
+        if rel_path is None:
+            return {"path": info.filename, "status": SKIPPED, "reason": reason}
+        # ZipFile handles are not safe to share between threads; one per worker
+        if not hasattr(local, "zf"):
+            local.zf = zipfile.ZipFile(archive_path)
+            handles.append(local.zf)
+        try:
+            with local.zf.open(info) as source:
+                spooled = extraction.write_temp(rel_path, info.file_size, source)
+        except Exception as e:
+            return {"path": rel_path, "status": FAILED, "reason": str(e)}
+        return extraction.commit(rel_path, *spooled)
+
+    try:
+        with ThreadPoolExecutor(max_workers=EXTRACT_WORKERS) as pool:
+            results = [r for r in pool.map(one, members) if r is not None]
+    finally:
+        for zf in handles:
+            zf.close()
+    return results
+
+
+def _extract_tar(archive_path: str, extraction: _Extraction) -> List[Dict[str, Any]]:
+    """A compressed tar can only be read front to back, so members are
+    decompressed in order; hashing the doc_dir copies is what runs in parallel."""
+    results = []
+    futures = []
+    with tarfile.open(archive_path, mode="r:*") as tf, ThreadPoolExecutor(max_workers=EXTRACT_WORKERS) as pool:
+        for count, member in enumerate(tf, 1):
+            if count > MAX_MEMBERS:
+                raise ValueError(f"Archive has more than {MAX_MEMBERS} entries")
+            if member.isdir():
+                continue
+            if not member.isfile():
+                results.append({"path": member.name, "status": SKIPPED, "reason": "not a regular file"})
+                continue
+            rel_path, reason = extraction.target(member.name)
+            if rel_path is None:
+                results.append({"path": member.name, "status": SKIPPED, "reason": reason})
+                continue
+            try:
+                with tf.extractfile(member) as source:
+                    spooled = extraction.write_temp(rel_path, member.size, source)
+            except Exception as e:
+                results.append({"path": rel_path, "status": FAILED, "reason": str(e)})
+                continue
+            futures.append(pool.submit(extraction.commit, rel_path, *spooled))
+        for future in futures:
+            results.append(future.result())
+    return results
+
+
+def detect_format(archive_path: str) -> str:
+    if zipfile.is_zipfile(archive_path):
+        return "zip"
+    try:
+        with tarfile.open(archive_path, mode="r:*"):
+            return "tar"
+    except tarfile.TarError:
+        raise ValueError("Unsupported archive: expected zip, tar or tar.gz")
+
+
+def ingest_sync(archive_path: str, doc_dir: str, required_exts: Optional[str] = None,
+                strip_components: int = 0, subdir: Optional[str] = None,
+                known: Optional[Dict[str, Dict[str, Any]]] = None) -> Dict[str, Any]:
+    """Extract an archive into doc_dir. Blocking; run it in a worker thread.
+
+    Only regular files are extracted; links, hidden entries, reserved
+    directories, paths escaping doc_dir and files outside required_exts are
+    skipped. A file whose content matches what doc_dir already has is left
+    untouched (its mtime too, so the next index build skips it as well).
+    """
+    fmt = detect_format(archive_path)
+    extraction = _Extraction(doc_dir, parse_exts(required_exts), strip_components, subdir, known or {})
+    results = (_extract_zip if fmt == "zip" else _extract_tar)(archive_path, extraction)
+    summary = {status: 0 for status in (ADDED, UPDATED, UNCHANGED, SKIPPED, FAILED)}
+    for result in results:
+        summary[result["status"]] += 1
+        ARCHIVE_FILES.inc(status=result["status"])
+    return {
+        "format": fmt,
+        "summary": summary,
+        "extracted_bytes": extraction.extracted_bytes,
+        "files": sorted(results, key=lambda r: r["path"]),
+    }
+
+
+async def ingest(rag_name: str, archive_path: str, doc_dir: str, required_exts: Optional[str] = None,
+                 strip_components: int = 0, subdir: Optional[str] = None) -> Dict[str, Any]:
+    manifest = await load_manifest(rag_name)
+    known = (manifest or {}).get("files", {})
+    try:
+        result = await asyncio.to_thread(ingest_sync, archive_path, doc_dir, required_exts,
+                                         strip_components, subdir, known)
+    finally:
+        try:
+            os.remove(archive_path)
+        except FileNotFoundError:
+            pass
+    await blob_store.add_refs(
+        (f["sha256"], os.path.join(doc_dir, f["path"]), f["link"]) for f in result["files"] if "link" in f
+    )
+    logger.info(f"Ingested {result['format']} archive into RAG {rag_name}: {result['summary']}")
+    return result
@@ -1,19 +1,11 @@
-from .user_router import router as user_router
-from .byzer_sql_router import router as byzer_sql_router
-from .super_analysis_router import router as super_analysis_router
-from .auto_coder_chat_router import router as auto_coder_chat_router
-from .config_router import router as config_router
-from .openai_service_router import router as openai_service_router
-from .model_router import router as model_router
-from .rag_router import router as rag_router
 from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import Response
 import uvicorn
 from typing import Any, List
-import mimetypes
 import os
 import argparse
+import asyncio
 import subprocess
 from typing import List, Dict
 import subprocess
@@ -27,50 +19,46 @@ import psutil
 from datetime import datetime
 import uuid
 from .request_types import *
-from urllib.parse import unquote
-
-from .chat_router import router as chat_router
-from .file_router import router as file_router
-from .apps.annotation_router import router as annotation_router
-from .openapi_router import router as openapi_router
-from .search_router import router as search_router
-app = FastAPI()
-app.include_router(chat_router)
-app.include_router(file_router)
-app.include_router(rag_router)
-app.include_router(model_router)
-app.include_router(openai_service_router)
-app.include_router(config_router)
-app.include_router(auto_coder_chat_router)
-app.include_router(super_analysis_router)
-app.include_router(byzer_sql_router)
-app.include_router(user_router)
-app.include_router(annotation_router)
-app.include_router(openapi_router)
-app.include_router(search_router)
-
-@app.get("/{full_path:path}")
+
+from .lazy_apps import LazyAppLoader, LazyAppMiddleware, BACKEND_APPS, ENABLED_APPS_ENV, EAGER_APPS_ENV, parse_enabled_apps
+from .file_serving import resolve_image_request, file_response
+from .image_thumbnails import thumbnail_cache, ThumbnailUnavailable
+from ..storage.shared_state import owner_lease, WORKERS_ENV
+from ..storage.json_file import (
+    BUILD_JOBS_JSON_PATH,
+    read_json_file,
+    with_file_lock,
+    load_rags_from_json,
+    load_boot_profiles,
+)
+from ..storage.blob_store import blob_store
+from ..metrics import REGISTRY, CONTENT_TYPE, MetricsMiddleware
+from .supervisor import service_supervisor
+from .log_rotation import log_rotator
+from .diagnostics import router as diagnostics_router, loop_monitor, start_diagnostics, DIAGNOSTICS_ENV, BLOCKING_THRESHOLD_ENV
+from .profiler import router as profiler_router, ProfilerMiddleware, PROFILE_SAMPLE_RATE_ENV
+
 async def serve_image(full_path: str, request: Request):
     if "_images" in full_path:
+        # 只允许访问已注册 RAG 的 doc_dir 下 _images 目录中的文件
+        file_path = await resolve_image_request(full_path)
+        if file_path is None:
+            raise HTTPException(status_code=404, detail="Image not found")
+        width = request.query_params.get("w")
+        fmt = request.query_params.get("fmt")
         try:
-            # 获取文件的完整路径，并进行URL解码            
-            file_path = unquote(full_path)            
-            # 使用 os.path.normpath 来标准化路径，自动处理不同操作系统的路径分隔符
-            file_path = os.path.normpath(file_path)
-            print(file_path)
-            if not os.path.isabs(file_path):
-                file_path = os.path.join("/", file_path)
-            # 读取文件内容
-            with open(file_path, "rb") as f:
-                content = f.read()
-            
-            # 获取文件的 MIME 类型
-            content_type, _ = mimetypes.guess_type(file_path)
-            if not content_type:
-                content_type = "application/octet-stream"
-            
-            # 返回文件内容
-            return Response(content=content, media_type=content_type)
+            if width or fmt:
+                # 返回缩放/转码后的缩略图，结果缓存在磁盘上
+                try:
+                    derivative_path, media_type = await thumbnail_cache.get(
+                        file_path, int(width) if width else None, fmt.lower() if fmt else None
+                    )
+                    return await file_response(request, derivative_path, media_type=media_type)
+                except ThumbnailUnavailable as e:
+                    logger.warning(f"Serving original image, thumbnail unavailable: {str(e)}")
+            return await file_response(request, file_path)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
         except FileNotFoundError:
             raise HTTPException(status_code=404, detail="Image not found")
         except Exception as e:
@@ -79,14 +67,124 @@ async def serve_image(full_path: str, request: Request):
     # 如果路径中没有 _images，返回 404
     raise HTTPException(status_code=404, detail="Not found")
 
-# Add CORS middleware with restricted origins
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],  # Restrict to trusted origins
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
+
+async def metrics():
+    """Prometheus text exposition of this worker's in-process metrics."""
+    return Response(content=REGISTRY.render(), media_type=CONTENT_TYPE)
+
+
+# Owner tasks of lazily loaded apps check the registries this often and only
+# load their app once there is work for it
+OWNER_TASK_POLL_SECONDS = 5.0
+
+
+async def _wait_until(condition) -> None:
+    while not await condition():
+        await asyncio.sleep(OWNER_TASK_POLL_SECONDS)
+
+
+async def _has_active_build_jobs() -> bool:
+    # Jobs may be queued by any worker, so the shared job file is what counts
+    async with with_file_lock(BUILD_JOBS_JSON_PATH):
+        jobs = await read_json_file(BUILD_JOBS_JSON_PATH, {})
+    return any(job.get("state") in ("queued", "running") for job in jobs.values())
+
+
+async def _has_auto_build_rags() -> bool:
+    rags = await load_rags_from_json()
+    return any(info.get("auto_build") and info.get("enable_hybrid_index") for info in rags.values())
+
+
+def include_backend_routers(target_app: FastAPI):
+    """Register every backend router on target_app.
+
+    Routers are included lazily: each app in BACKEND_APPS is imported the
+    first time a request hits one of its URL prefixes (or at startup with
+    --eager-apps). The _images catch-all always stays behind them.
+    """
+    loader = LazyAppLoader(target_app)
+    target_app.state.app_loader = loader
+    target_app.add_middleware(LazyAppMiddleware, loader=loader)
+    target_app.add_middleware(ProfilerMiddleware)
+    target_app.add_middleware(MetricsMiddleware)
+    target_app.add_api_route("/metrics", metrics, methods=["GET"], include_in_schema=False)
+    target_app.include_router(diagnostics_router)
+    target_app.include_router(profiler_router)
+    target_app.add_api_route("/{full_path:path}", serve_image, methods=["GET"])
+    owner_lease.register("service-supervisor", service_supervisor.run)
+    owner_lease.register("log-rotation", log_rotator.run)
+    owner_lease.register("blob-gc", blob_store.run)
+
+    async def run_build_queue():
+        """Run queued RAG cache builds (and resume interrupted ones)."""
+        if "rag" not in loader.enabled:
+            return
+        await _wait_until(_has_active_build_jobs)
+        await loader.ensure_loaded(["rag"])
+        from .build_queue import build_queue
+        await build_queue.run()
+
+    owner_lease.register("build-queue", run_build_queue)
+
+    async def run_doc_watcher():
+        """Queue incremental cache builds for RAGs with auto_build enabled."""
+        if "rag" not in loader.enabled:
+            return
+        await _wait_until(_has_auto_build_rags)
+        await loader.ensure_loaded(["rag"])
+        from .doc_watcher import doc_watcher
+        await doc_watcher.run()
+
+    owner_lease.register("doc-watcher", run_doc_watcher)
+
+    async def restore_boot_profile():
+        """Start the services of the boot profile marked restore_on_boot."""
+        if not {"bulk", "rag", "models"} <= loader.enabled:
+            return
+        data = await load_boot_profiles()
+        if data.get("restore_on_boot") not in data["profiles"]:
+            return
+        await loader.ensure_loaded(["bulk", "rag", "models"])
+        from .bulk_router import restore_on_boot
+        await restore_on_boot()
+
+    owner_lease.register("boot-profile", restore_boot_profile)
+    target_app.router.add_event_handler("startup", start_diagnostics)
+    target_app.router.add_event_handler("startup", thumbnail_cache.startup)
+    target_app.router.add_event_handler("startup", loader.startup)
+    target_app.router.add_event_handler("startup", owner_lease.start)
+    target_app.router.add_event_handler("shutdown", owner_lease.stop)
+    target_app.router.add_event_handler("shutdown", thumbnail_cache.shutdown)
+    target_app.router.add_event_handler("shutdown", loop_monitor.stop)
+
+
+def create_backend_app() -> FastAPI:
+    """Build the backend app (uvicorn factory).
+
+    Registering the routers also registers the owner tasks, so this only
+    happens when an app is actually built, not when the module is imported
+    (combined_server imports it to serve the routers from its own app).
+    """
+    backend_app = FastAPI()
+    include_backend_routers(backend_app)
+
+    # Add CORS middleware with restricted origins
+    backend_app.add_middleware(
+        CORSMiddleware,
+        allow_origins=["*"],  # Restrict to trusted origins
+        allow_credentials=True,
+        allow_methods=["*"],
+        allow_headers=["*"],
+    )
+    return backend_app
+
+
+def __getattr__(name: str):
+    # Keeps backend_server:app working; built on first access
+    if name == "app":
+        globals()["app"] = create_backend_app()
+        return globals()["app"]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 def main():
@@ -103,9 +201,67 @@ def main():
         default="0.0.0.0",
         help="Host to run the backend server on (default: 0.0.0.0)",
     )
+    parser.add_argument(
+        "--enable-apps",
+        type=str,
+        default="all",
+        help=f"Comma separated backend apps to serve (default: all). Available: {', '.join(BACKEND_APPS)}",
+    )
+    parser.add_argument(
+        "--eager-apps",
+        action="store_true",
+        help="Import every enabled app at startup instead of on first request",
+    )
+    parser.add_argument(
+        "--diagnostics",
+        action="store_true",
+        help="Report callbacks that block the event loop (see GET /diagnostics/blocking)",
+    )
+    parser.add_argument(
+        "--blocking-threshold-ms",
+        type=int,
+        default=100,
+        help="With --diagnostics, log event loop stalls longer than this (default: 100)",
+    )
+    parser.add_argument(
+        "--profile-sample-rate",
+        type=float,
+        default=0.0,
+        help="Fraction of requests to profile into profiles/ (default: 0, only on X-Profile: 1 from an admin)",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Number of worker processes (default: 1). With more than one, shared state is kept in shared_state.db",
+    )
     args = parser.parse_args()
-    print(f"Starting backend server on {args.host}:{args.port}")
-    uvicorn.run(app, host=args.host, port=args.port)
+    try:
+        enabled_apps = parse_enabled_apps(args.enable_apps)
+    except ValueError as e:
+        parser.error(str(e))
+    # Read by each worker at startup
+    os.environ[ENABLED_APPS_ENV] = ",".join(enabled_apps)
+    os.environ[EAGER_APPS_ENV] = "1" if args.eager_apps else "0"
+    if args.diagnostics:
+        os.environ[DIAGNOSTICS_ENV] = "1"
+        os.environ[BLOCKING_THRESHOLD_ENV] = str(args.blocking_threshold_ms)
+    if args.profile_sample_rate > 0:
+        os.environ[PROFILE_SAMPLE_RATE_ENV] = str(args.profile_sample_rate)
+
+    print(f"Starting backend server on {args.host}:{args.port} with {args.workers} worker(s)")
+    if args.workers > 1:
+        # Workers are spawned as separate processes and inherit this setting
+        os.environ[WORKERS_ENV] = str(args.workers)
+        uvicorn.run(
+            "williamtoolbox.server.backend_server:create_backend_app",
+            factory=True,
+            host=args.host,
+            port=args.port,
+            workers=args.workers,
+        )
+    else:
+        uvicorn.run(create_backend_app(), host=args.host, port=args.port)
 
 
 if __name__ == "__main__":
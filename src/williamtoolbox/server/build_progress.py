@@ -0,0 +1,142 @@
+import os
+import re
+import time
+from typing import Any, Dict, List, Optional
+
+# Things that look like a file path in a log line
+PATH_RE = re.compile(r"[^\s'\"\[\](){},;]+\.[A-Za-z0-9]{1,8}\b")
+# tqdm bars: " 45%|####      | 9/20 [00:12<00:15, 1.2it/s]"
+TQDM_RE = re.compile(r"(\d+)/(\d+) \[(?:\d+:)?\d+:\d+<((?:\d+:)?\d+:\d+|\?)")
+# "12 chunks" or "chunks=12"; in "chunks=8 tokens=900" the 8 belongs to chunks
+CHUNKS_RE = re.compile(r"(?<![=\d.])(\d+)\s+chunks?\b|\bchunks?\s*[:=]\s*(\d+)", re.IGNORECASE)
+TOKENS_RE = re.compile(r"(?<![=\d.])(\d+)\s+tokens?\b|\btokens?\s*[:=]\s*(\d+)", re.IGNORECASE)
+# "... took 1.23s", "... in 4.5 seconds", "cost: 2.1s"
+DURATION_RE = re.compile(r"\b(?:took|in|cost|time)\s*[:=]?\s*(\d+(?:\.\d+)?)\s*(?:s|sec|secs|seconds)\b",
+                         re.IGNORECASE)
+TOTAL_RE = re.compile(r"\btotal\b", re.IGNORECASE)
+
+# Per-file times kept in the progress snapshot; all of them are in timings()
+SLOWEST_FILES = 10
+
+
+def _clock(text: str) -> Optional[int]:
+    if text == "?":
+        return None
+    seconds = 0
+    for part in text.split(":"):
+        seconds = seconds * 60 + int(part)
+    return seconds
+
+
+class BuildProgress:
+    """Turns build_hybrid_index output lines into structured progress.
+
+    The builder's output is not a stable format, so several sources are
+    combined: the files the manifest diff expects to be (re)processed are
+    recognized wherever their paths are mentioned, tqdm bars give processed
+    and total counts, and lines with chunk/token counts or durations are
+    picked up. A file counts as started when first mentioned and as done
+    when another file is mentioned (or the build ends); a duration on the
+    line mentioning it ("took 1.2s") takes precedence.
+    """
+
+    def __init__(self, files: List[str], started_at: Optional[float] = None):
+        self.started_at = started_at or time.time()
+        self.files_total = len(files)
+        # basename -> relative paths, to match mentioned paths cheaply
+        self._by_name: Dict[str, List[str]] = {}
+        for rel_path in files:
+            self._by_name.setdefault(os.path.basename(rel_path), []).append(rel_path.replace(os.sep, "/"))
+        self._started: Dict[str, float] = {}
+        self._done: Dict[str, float] = {}
+        self.bar_done: Optional[int] = None
+        self.bar_total: Optional[int] = None
+        self.bar_eta: Optional[int] = None
+        self.chunks = 0
+        self.tokens = 0
+        self.current_file: Optional[str] = None
+        self.lines = 0
+
+    def _match(self, token: str) -> Optional[str]:
+        token = token.replace("\\", "/")
+        for rel_path in self._by_name.get(os.path.basename(token), ()):
+            if token == rel_path or token.endswith("/" + rel_path):
+                return rel_path
+        return None
+
+    @staticmethod
+    def _count(pattern: re.Pattern, line: str, current: int, restated: bool) -> int:
+        values = [int(a or b) for a, b in pattern.findall(line)]
+        if not values:
+            return current
+        # Totals and progress bars restate the running count; other lines add to it
+        return max(values) if restated else current + sum(values)
+
+    def feed(self, line: str, now: Optional[float] = None) -> None:
+        now = now or time.time()
+        self.lines += 1
+        for token in PATH_RE.findall(line):
+            rel_path = self._match(token)
+            if rel_path is None:
+                continue
+            if rel_path != self.current_file:
+                self._complete(now)
+                self.current_file = rel_path
+                self._started.setdefault(rel_path, now)
+            duration = DURATION_RE.search(line)
+            if duration:
+                self._done[rel_path] = float(duration.group(1))
+            break
+
+        bars = TQDM_RE.findall(line)
+        if bars:
+            done, total, eta = bars[-1]
+            self.bar_done, self.bar_total, self.bar_eta = int(done), int(total), _clock(eta)
+        restated = bool(bars) or bool(TOTAL_RE.search(line))
+        self.chunks = self._count(CHUNKS_RE, line, self.chunks, restated)
+        self.tokens = self._count(TOKENS_RE, line, self.tokens, restated)
+
+    def _complete(self, now: float) -> None:
+        current = self.current_file
+        if current is not None and current not in self._done:
+            self._done[current] = now - self._started[current]
+
+    def finish(self, now: Optional[float] = None) -> None:
+        """The builder exited: the file it was on is done too."""
+        self._complete(now or time.time())
+        self.current_file = None
+
+    def snapshot(self, now: Optional[float] = None) -> Dict[str, Any]:
+        now = now or time.time()
+        elapsed = now - self.started_at
+        processed, total = len(self._done), self.files_total
+        # A progress bar over the files, when the builder prints one, is more exact
+        if self.bar_total is not None and (not total or self.bar_total == total):
+            processed, total = max(processed, self.bar_done), self.bar_total
+        processed = min(processed, total) if total else processed
+
+        eta = None
+        if self.bar_eta is not None and self.bar_total == total:
+            eta = self.bar_eta
+        elif total and processed:
+            eta = round(elapsed / processed * (total - processed), 1)
+        slowest = sorted(self._done.items(), key=lambda item: item[1], reverse=True)[:SLOWEST_FILES]
+        return {
+            "files_processed": processed,
+            "files_total": total,
+            "percent": round(processed * 100 / total, 1) if total else None,
+            "chunks": self.chunks,
+            "tokens": self.tokens,
+            "current_file": self.current_file,
+            "elapsed_seconds": round(elapsed, 1),
+            "eta_seconds": eta,
+            "slowest_files": [{"path": path, "seconds": round(seconds, 3)} for path, seconds in slowest],
+            "updated_at": now,
+        }
+
+    def timings(self) -> List[Dict[str, Any]]:
+        """Every processed file with its time, slowest first."""
+        return [
+            {"path": path, "seconds": round(seconds, 3)}
+            for path, seconds in sorted(self._done.items(), key=lambda item: item[1], reverse=True)
+        ]
@@ -0,0 +1,411 @@
+import os
+import re
+import json
+import time
+import uuid
+import asyncio
+import traceback
+import psutil
+from contextlib import asynccontextmanager
+from typing import Any, Dict, List, Optional, Tuple
+from loguru import logger
+
+from ..metrics import Counter, Gauge, Histogram
+from ..storage.json_file import (
+    BUILD_JOBS_JSON_PATH,
+    load_rags_from_json,
+    read_json_file,
+    write_json_file,
+    with_file_lock,
+)
+from .doc_manifest import plan_build, save_manifest, summarize
+from .build_progress import BuildProgress
+from .process_manager import process_manager
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+CANCELLED = "cancelled"
+FINISHED = (SUCCEEDED, FAILED, CANCELLED)
+
+# Finished jobs kept in build_jobs.json for their logs and results
+KEEP_FINISHED = 200
+# Touched paths remembered per job (watcher-triggered builds)
+MAX_JOB_PATHS = 1000
+# build_hybrid_index parses and embeds documents; a few at a time keep the
+# machine (and the embedding model) responsive.
+BUILD_CONCURRENCY = int(os.environ.get(
+    "WILLIAM_TOOLBOX_BUILD_CONCURRENCY", max(1, min(4, (os.cpu_count() or 1) // 4))
+))
+
+BUILD_QUEUE_DEPTH = Gauge("rag_build_queue_depth", "Cache build jobs waiting to run.")
+BUILD_JOBS_RUNNING = Gauge("rag_build_jobs_running", "Cache build jobs currently running.")
+BUILD_QUEUE_WAIT = Histogram(
+    "rag_build_queue_wait_seconds", "Time cache build jobs spent queued before they started.",
+    buckets=(1, 5, 10, 30, 60, 120, 300, 600, 1800, 3600),
+)
+BUILD_DURATION = Histogram(
+    "rag_build_duration_seconds", "Run time of cache build jobs.", ["result"],
+    buckets=(1, 10, 30, 60, 120, 300, 600, 1800, 3600, 7200),
+)
+BUILD_JOBS = Counter("rag_build_jobs_total", "Finished cache build jobs.", ["result"])
+
+# How often a running build's progress is written to its job
+PROGRESS_INTERVAL = 1.0
+# tqdm redraws its bar with \r, so both end a line
+LINE_BREAK_RE = re.compile(rb"[\r\n]")
+
+
+@asynccontextmanager
+async def _jobs():
+    """build_jobs.json, locked for a read-modify-write across workers."""
+    async with with_file_lock(BUILD_JOBS_JSON_PATH):
+        jobs = await read_json_file(BUILD_JOBS_JSON_PATH, {})
+        yield jobs
+        await write_json_file(BUILD_JOBS_JSON_PATH, jobs)
+
+
+def _prune(jobs: Dict[str, Any]) -> None:
+    finished = sorted(
+        (job for job in jobs.values() if job["state"] in FINISHED),
+        key=lambda job: job.get("finished_at") or 0,
+    )
+    for job in finished[:max(0, len(finished) - KEEP_FINISHED)]:
+        del jobs[job["job_id"]]
+
+
+def build_command(rag_info: Dict[str, Any]) -> str:
+    command = "auto-coder.rag build_hybrid_index"
+    command += f" --model {rag_info['model']}"
+    command += f" --doc_dir {rag_info['doc_dir']}"
+
+    if "emb_model" in rag_info:
+        command += f" --emb_model {rag_info['emb_model']}"
+
+    if rag_info.get("required_exts"):
+        command += f" --required_exts {rag_info['required_exts']}"
+
+    command += " --enable_hybrid_index"
+    return command
+
+
+def _create_time(pid: int) -> Optional[float]:
+    """Start time of a process, used to tell it apart from a later one reusing its pid."""
+    try:
+        return psutil.Process(pid).create_time()
+    except (psutil.NoSuchProcess, psutil.AccessDenied):
+        return None
+
+
+class BuildQueue:
+    """Persistent queue of hybrid-index builds, run by the owner worker.
+
+    Jobs live in build_jobs.json, so queued builds survive a restart and a
+    build interrupted by one is queued again. Any worker can enqueue or
+    cancel; only the owner starts builds: at most `concurrency` at a time,
+    never two for the same RAG, highest priority first (FIFO within a
+    priority). A RAG has at most one queued job; enqueueing again merges
+    into it.
+    """
+
+    def __init__(self, concurrency: int = BUILD_CONCURRENCY, poll_interval: float = 1.0):
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self._wakeup = asyncio.Event()
+        self._running: Dict[str, asyncio.Task] = {}
+        # job_id -> pid of the build started by this worker
+        self._processes: Dict[str, int] = {}
+
+    async def enqueue(self, rag_name: str, full: bool = False, priority: int = 0, trigger: str = "api",
+                      paths: Optional[List[str]] = None) -> Tuple[Dict[str, Any], bool]:
+        """Queue a build; returns (job, created). An already queued job of the
+        same RAG is reused, keeping the higher priority and full flag.
+
+        paths are the doc_dir files known to have changed (from the watcher);
+        they are informational, the manifest diff decides what is rebuilt.
+        """
+        async with _jobs() as jobs:
+            for job in jobs.values():
+                if job["rag_name"] == rag_name and job["state"] == QUEUED:
+                    job["priority"] = max(job["priority"], priority)
+                    job["full"] = job["full"] or full
+                    if paths:
+                        merged = set(job.get("paths") or []) | set(paths)
+                        job["paths"] = sorted(merged)[:MAX_JOB_PATHS]
+                    existing = dict(job)
+                    break
+            else:
+                existing = None
+                job_id = str(uuid.uuid4())
+                log_file = os.path.join("logs", f"cache_build_{rag_name}_{job_id}.log")
+                os.makedirs("logs", exist_ok=True)
+                with open(log_file, "w") as f:
+                    f.write(f"Queued cache build for {rag_name} (priority {priority}, trigger {trigger})\n")
+                job = {
+                    "job_id": job_id,
+                    "rag_name": rag_name,
+                    "priority": priority,
+                    "full": full,
+                    "trigger": trigger,
+                    "paths": sorted(paths)[:MAX_JOB_PATHS] if paths else None,
+                    "state": QUEUED,
+                    "enqueued_at": time.time(),
+                    "started_at": None,
+                    "finished_at": None,
+                    "log_file": log_file,
+                    "pid": None,
+                    "attempts": 0,
+                }
+                jobs[job_id] = job
+                _prune(jobs)
+        self._wakeup.set()
+        if existing is not None:
+            return existing, False
+        return dict(job), True
+
+    async def cancel(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Drop a queued job, or stop a running build."""
+        async with _jobs() as jobs:
+            job = jobs.get(job_id)
+            if job is None:
+                return None
+            if job["state"] == QUEUED:
+                job.update(state=CANCELLED, finished_at=time.time())
+                BUILD_JOBS.inc(result=CANCELLED)
+            elif job["state"] == RUNNING:
+                # The worker running it stops the process (see _tick)
+                job["cancel_requested"] = True
+            job = dict(job)
+        pid = self._processes.get(job_id)
+        if pid is not None:
+            await process_manager.stop(pid)
+        return job
+
+    async def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        async with with_file_lock(BUILD_JOBS_JSON_PATH):
+            jobs = await read_json_file(BUILD_JOBS_JSON_PATH, {})
+        return jobs.get(job_id)
+
+    async def list(self, rag_name: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Running and queued jobs in scheduling order, then finished ones, newest first."""
+        async with with_file_lock(BUILD_JOBS_JSON_PATH):
+            jobs = await read_json_file(BUILD_JOBS_JSON_PATH, {})
+        jobs = [job for job in jobs.values() if rag_name is None or job["rag_name"] == rag_name]
+        active = sorted(
+            (job for job in jobs if job["state"] not in FINISHED),
+            key=lambda job: (job["state"] != RUNNING, -job["priority"], job["enqueued_at"]),
+        )
+        finished = sorted(
+            (job for job in jobs if job["state"] in FINISHED),
+            key=lambda job: job.get("finished_at") or 0, reverse=True,
+        )
+        return active + finished
+
+    async def _update(self, job_id: str, **fields) -> Dict[str, Any]:
+        async with _jobs() as jobs:
+            job = jobs.get(job_id)
+            if job is None:
+                return {}
+            job.update(fields)
+            return dict(job)
+
+    @staticmethod
+    def _next(jobs: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        busy = {job["rag_name"] for job in jobs.values() if job["state"] == RUNNING}
+        candidates = [job for job in jobs.values() if job["state"] == QUEUED and job["rag_name"] not in busy]
+        if not candidates:
+            return None
+        return min(candidates, key=lambda job: (-job["priority"], job["enqueued_at"]))
+
+    async def _recover(self):
+        """Requeue builds that were running when the previous owner exited."""
+        stale = []
+        async with _jobs() as jobs:
+            for job in jobs.values():
+                if job["state"] == RUNNING and job["job_id"] not in self._running:
+                    if job.get("pid"):
+                        stale.append((job["pid"], job.get("pid_create_time")))
+                    job.update(state=QUEUED, pid=None, pid_create_time=None, cancel_requested=False)
+                    logger.info(f"Resuming interrupted cache build {job['job_id']} of {job['rag_name']}")
+        for pid, create_time in stale:
+            # A build orphaned by a crashed worker would overlap the resumed one.
+            # After a reboot the pid may belong to an unrelated process, so only
+            # stop it while it is still the build that was started.
+            if create_time is not None and _create_time(pid) == create_time:
+                await process_manager.stop(pid)
+
+    async def _tick(self):
+        started = []
+        async with _jobs() as jobs:
+            cancels = [
+                job_id for job_id, job in jobs.items()
+                if job["state"] == RUNNING and job.get("cancel_requested") and job_id in self._processes
+            ]
+            while len(self._running) + len(started) < self.concurrency:
+                job = self._next(jobs)
+                if job is None:
+                    break
+                job.update(state=RUNNING, started_at=time.time(), attempts=job.get("attempts", 0) + 1)
+                started.append(dict(job))
+            BUILD_QUEUE_DEPTH.set(sum(1 for job in jobs.values() if job["state"] == QUEUED))
+
+        for job_id in cancels:
+            await process_manager.stop(self._processes[job_id])
+        for job in started:
+            BUILD_QUEUE_WAIT.observe(job["started_at"] - job["enqueued_at"])
+            task = asyncio.create_task(self._run_job(job))
+            self._running[job["job_id"]] = task
+            task.add_done_callback(lambda _, job_id=job["job_id"]: self._running.pop(job_id, None))
+        BUILD_JOBS_RUNNING.set(len(self._running))
+
+    async def run(self):
+        """Scheduler loop; registered on the owner lease so it runs in one worker."""
+        await self._recover()
+        try:
+            while True:
+                try:
+                    await self._tick()
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    logger.error(f"Build scheduler error: {str(e)}")
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                self._wakeup.clear()
+        finally:
+            # No longer the owner: the next one resumes these jobs
+            for task in list(self._running.values()):
+                task.cancel()
+
+    async def _finish(self, job: Dict[str, Any], state: str, **fields):
+        async with _jobs() as jobs:
+            current = jobs.get(job["job_id"])
+            if current is None or current.get("attempts") != job["attempts"]:
+                # Taken over and resumed by a newer attempt
+                return
+            current.update(state=state, finished_at=time.time(), pid=None, pid_create_time=None, **fields)
+        BUILD_JOBS.inc(result=state)
+        BUILD_DURATION.observe(time.time() - job["started_at"], result=state)
+        logger.info(f"Cache build {job['job_id']} of {job['rag_name']}: {state}")
+        self._wakeup.set()
+
+    async def _run_job(self, job: Dict[str, Any]):
+        """Run one build: diff doc_dir against the manifest, then spawn the CLI."""
+        job_id, rag_name, log_file = job["job_id"], job["rag_name"], job["log_file"]
+        try:
+            rags = await load_rags_from_json()
+            rag_info = rags.get(rag_name)
+            if rag_info is None:
+                await self._finish(job, FAILED, error=f"RAG {rag_name} not found")
+                return
+            command = build_command(rag_info)
+            # 与上次成功构建时的文件清单比较，只有新增/修改/删除的文件需要重新处理
+            manifest, changes = await plan_build(rag_name, rag_info, job["full"])
+            files = summarize(changes)
+            await self._update(job_id, command=command, files=files)
+
+            with open(log_file, "a") as f:
+                f.write(f"Starting cache build for {rag_name}\n")
+                f.write(f"Command: {command}\n")
+                f.write(f"Files: {files['reprocessed']} to process ({files['added']} added, "
+                        f"{files['changed']} changed), {files['removed']} removed, {files['skipped']} unchanged\n")
+                for label in ("added", "changed", "removed"):
+                    for path in changes[label][:200]:
+                        f.write(f"  {label}: {path}\n")
+                f.write("\n")
+
+            progress = BuildProgress(changes["added"] + changes["changed"])
+            if not changes["full"] and not (changes["added"] or changes["changed"] or changes["removed"]):
+                with open(log_file, "a") as f:
+                    f.write("No files changed since the last build, nothing to do.\n")
+                    f.write("Cache build completed successfully!\n")
+                # Keeps the new mtimes, so touched files are not hashed again
+                await save_manifest(rag_name, manifest)
+                await self._finish(job, SUCCEEDED, return_code=0, skipped=True, progress=progress.snapshot())
+                return
+
+            with open(log_file, "a") as f:
+                # Own session, so cancelling stops the whole process group
+                process = await asyncio.create_subprocess_shell(
+                    command,
+                    stdout=asyncio.subprocess.PIPE,
+                    stderr=asyncio.subprocess.PIPE,
+                    start_new_session=True,
+                )
+                self._processes[job_id] = process.pid
+                await self._update(job_id, pid=process.pid, pid_create_time=_create_time(process.pid))
+
+                # 实时处理输出并写入日志，同时解析构建进度
+                async def read_stream(stream):
+                    pending = b""
+                    while True:
+                        data = await stream.read(64 * 1024)
+                        if not data:
+                            break
+                        f.write(data.decode("utf-8", errors="replace"))
+                        f.flush()
+                        *lines, pending = LINE_BREAK_RE.split(pending + data)
+                        for line in lines:
+                            if line:
+                                progress.feed(line.decode("utf-8", errors="replace"))
+                    if pending:
+                        progress.feed(pending.decode("utf-8", errors="replace"))
+
+                # Stopped with an event, not cancelled, so it never leaves a half-written build_jobs.json
+                finished = asyncio.Event()
+
+                async def publish():
+                    while not finished.is_set():
+                        try:
+                            await asyncio.wait_for(finished.wait(), PROGRESS_INTERVAL)
+                        except asyncio.TimeoutError:
+                            await self._update(job_id, progress=progress.snapshot())
+
+                publisher = asyncio.create_task(publish())
+                try:
+                    # 同时处理stdout和stderr
+                    await asyncio.gather(read_stream(process.stdout), read_stream(process.stderr))
+                    return_code = await process.wait()
+                finally:
+                    finished.set()
+                await publisher
+                progress.finish()
+
+                current = await self.get(job_id) or {}
+                f.write(f"\nBuild process completed with return code: {return_code}\n")
+                if current.get("cancel_requested"):
+                    f.write("Cache build cancelled.\n")
+                elif return_code == 0:
+                    f.write("Cache build completed successfully!\n")
+                else:
+                    f.write("Cache build failed. See above for errors.\n")
+
+            # Per-file processing times, to find documents that are slow to index
+            timings_file = os.path.splitext(log_file)[0] + ".timings.json"
+            with open(timings_file, "w") as timings:
+                json.dump(progress.timings(), timings, ensure_ascii=False)
+            result = {"return_code": return_code, "progress": progress.snapshot(), "timings_file": timings_file}
+            if current.get("cancel_requested"):
+                await self._finish(job, CANCELLED, **result)
+            elif return_code == 0:
+                await save_manifest(rag_name, manifest)
+                await self._finish(job, SUCCEEDED, **result)
+            else:
+                await self._finish(job, FAILED, **result)
+        except asyncio.CancelledError:
+            # Backend shutting down: leave the job running, _recover() requeues it
+            raise
+        except Exception as e:
+            logger.error(f"Error running build task: {str(e)}")
+            with open(log_file, "a") as f:
+                f.write(f"\nError running build task: {str(e)}\n")
+                f.write(traceback.format_exc())
+            await self._finish(job, FAILED, error=str(e))
+        finally:
+            self._processes.pop(job_id, None)
+
+
+build_queue = BuildQueue()
@@ -0,0 +1,243 @@
+import json
+import time
+import asyncio
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+from fastapi import APIRouter, HTTPException
+from loguru import logger
+from sse_starlette.sse import EventSourceResponse
+
+from ..storage.json_file import (
+    load_rags_from_json,
+    load_models_from_json,
+    load_boot_profiles,
+    modify_boot_profiles,
+)
+from .supervisor import service_supervisor
+from .request_types import BulkActionRequest, BulkSelector, SaveBootProfileRequest
+
+router = APIRouter()
+
+# Running bulk tasks; referenced here so they are not garbage collected
+_bulk_tasks = set()
+
+KINDS = ("rags", "models")
+ACTIONS = ("start", "stop", "restart")
+# Models first: RAGs are configured to use them
+START_ORDER = ("models", "rags")
+
+
+async def _load_registry(kind: str) -> Dict[str, Any]:
+    if kind == "rags":
+        return await load_rags_from_json()
+    return await load_models_from_json()
+
+
+async def _manage(kind: str, name: str, action: str):
+    # The routers are imported on first use, like the lazy app loader does
+    if kind == "rags":
+        from .rag_router import manage_rag
+        return await manage_rag(name, action)
+    from .model_router import manage_model
+    return await manage_model(name, action)
+
+
+def _select(registry: Dict[str, Any], names: List[str], selector: Optional[BulkSelector]) -> List[str]:
+    if names:
+        return list(dict.fromkeys(names))
+    if selector is None:
+        raise HTTPException(status_code=400, detail="Provide names or a selector")
+    if not (selector.all or selector.product_type or selector.tags):
+        raise HTTPException(status_code=400, detail="Empty selector; use all, product_type or tags")
+    selected = []
+    for name, info in registry.items():
+        if selector.product_type and info.get("product_type", "pro") != selector.product_type:
+            continue
+        if selector.tags and not set(selector.tags) & set(info.get("tags", [])):
+            continue
+        selected.append(name)
+    return selected
+
+
+async def _run_item(kind: str, name: str, action: str, registry: Dict[str, Any]) -> Dict[str, Any]:
+    start = time.perf_counter()
+    event = {"kind": kind, "name": name, "action": action}
+    info = registry.get(name)
+    if info is None:
+        return {**event, "status": "error", "detail": f"{name} not found"}
+    if kind == "models" and info.get("product_type", "pro") == "lite":
+        return {**event, "status": "skipped", "detail": "Lite models cannot be started or stopped"}
+    running = info.get("status") == "running"
+    if (action == "start" and running) or (action == "stop" and not running):
+        return {**event, "status": "skipped", "detail": f"Already {info.get('status')}"}
+    try:
+        if action == "restart":
+            if running:
+                await _manage(kind, name, "stop")
+            await _manage(kind, name, "start")
+        else:
+            await _manage(kind, name, action)
+    except HTTPException as e:
+        return {**event, "status": "error", "detail": e.detail, "elapsed": round(time.perf_counter() - start, 3)}
+    except Exception as e:
+        logger.error(f"Bulk {action} of {kind} {name} failed: {str(e)}")
+        return {**event, "status": "error", "detail": str(e), "elapsed": round(time.perf_counter() - start, 3)}
+    return {**event, "status": "ok", "elapsed": round(time.perf_counter() - start, 3)}
+
+
+async def run_bulk(plan: List[tuple], action: str, parallelism: int, queue: Optional[asyncio.Queue] = None) -> Dict[str, Any]:
+    """Apply action to every (kind, name) in plan, at most `parallelism` at a time.
+
+    Kinds are processed in plan order (all models before any RAG); progress
+    events are put on queue as each item finishes.
+    """
+    start = time.perf_counter()
+    semaphore = asyncio.Semaphore(parallelism)
+    results = []
+
+    async def run(kind, name, registry):
+        async with semaphore:
+            if queue is not None:
+                await queue.put({"event": "item", "kind": kind, "name": name, "action": action, "status": "in_progress"})
+            result = await _run_item(kind, name, action, registry)
+        results.append(result)
+        if queue is not None:
+            await queue.put({"event": "item", **result})
+
+    kinds = list(dict.fromkeys(kind for kind, _ in plan))
+    for kind in kinds:
+        registry = await _load_registry(kind)
+        await asyncio.gather(*[run(kind, name, registry) for k, name in plan if k == kind])
+
+    summary = {
+        "event": "done",
+        "action": action,
+        "total": len(results),
+        "ok": sum(1 for r in results if r["status"] == "ok"),
+        "skipped": sum(1 for r in results if r["status"] == "skipped"),
+        "failed": sum(1 for r in results if r["status"] == "error"),
+        "elapsed": round(time.perf_counter() - start, 3),
+    }
+    logger.info(f"Bulk {action}: {summary}")
+    return summary
+
+
+def _stream(plan: List[tuple], action: str, parallelism: int) -> EventSourceResponse:
+    """Run the bulk action in a task and stream its progress as SSE.
+
+    The task is not tied to the connection: a client that disconnects does
+    not leave services half started or half stopped.
+    """
+    queue: asyncio.Queue = asyncio.Queue()
+
+    async def worker():
+        try:
+            await queue.put(await run_bulk(plan, action, parallelism, queue))
+        except Exception as e:
+            logger.error(f"Bulk {action} failed: {str(e)}")
+            await queue.put({"event": "done", "action": action, "error": str(e)})
+
+    task = asyncio.create_task(worker())
+    _bulk_tasks.add(task)
+    task.add_done_callback(_bulk_tasks.discard)
+
+    async def event_generator():
+        yield {"event": "message", "data": json.dumps({
+            "event": "plan", "action": action, "parallelism": parallelism,
+            "items": [{"kind": kind, "name": name} for kind, name in plan],
+        })}
+        while True:
+            event = await queue.get()
+            yield {"event": "message", "data": json.dumps(event, ensure_ascii=False)}
+            if event["event"] == "done":
+                break
+
+    return EventSourceResponse(event_generator())
+
+
+@router.post("/bulk/{kind}/{action}")
+async def bulk_action(kind: str, action: str, request: BulkActionRequest):
+    """Start/stop/restart several RAGs or models, streaming per-item progress (SSE)."""
+    if kind not in KINDS:
+        raise HTTPException(status_code=400, detail=f"Invalid kind. Use one of {', '.join(KINDS)}")
+    if action not in ACTIONS:
+        raise HTTPException(status_code=400, detail=f"Invalid action. Use one of {', '.join(ACTIONS)}")
+    registry = await _load_registry(kind)
+    names = _select(registry, request.names, request.selector)
+    return _stream([(kind, name) for name in names], action, request.parallelism)
+
+
+# ---- boot profiles ------------------------------------------------------
+
+def _profile_plan(profile: Dict[str, Any]) -> List[tuple]:
+    return [(kind, name) for kind in START_ORDER for name in profile.get(kind, [])]
+
+
+@router.get("/bulk/boot-profiles")
+async def list_boot_profiles():
+    return await load_boot_profiles()
+
+
+@router.post("/bulk/boot-profiles")
+async def save_boot_profile(request: SaveBootProfileRequest):
+    """Save a set of RAGs/models; without explicit lists, what is running now."""
+    profile = {"created_at": datetime.now().isoformat()}
+    for kind, names in (("rags", request.rags), ("models", request.models)):
+        registry = await _load_registry(kind)
+        if names is None:
+            # Lite models have no process to restore; lite RAGs do
+            names = [
+                name for name, info in registry.items()
+                if info.get("status") == "running"
+                and not (kind == "models" and info.get("product_type", "pro") == "lite")
+            ]
+        unknown = [name for name in names if name not in registry]
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown {kind}: {', '.join(unknown)}")
+        profile[kind] = names
+
+    def save(data: Dict[str, Any]) -> bool:
+        data["profiles"][request.name] = profile
+        if request.restore_on_boot:
+            data["restore_on_boot"] = request.name
+        elif data.get("restore_on_boot") == request.name:
+            data["restore_on_boot"] = None
+        return True
+
+    await modify_boot_profiles(save)
+    return {"message": f"Boot profile {request.name} saved", "profile": profile}
+
+
+@router.delete("/bulk/boot-profiles/{name}")
+async def delete_boot_profile(name: str):
+    def delete(data: Dict[str, Any]) -> bool:
+        if name not in data["profiles"]:
+            raise HTTPException(status_code=404, detail=f"Boot profile {name} not found")
+        del data["profiles"][name]
+        if data.get("restore_on_boot") == name:
+            data["restore_on_boot"] = None
+        return True
+
+    await modify_boot_profiles(delete)
+    return {"message": f"Boot profile {name} deleted"}
+
+
+@router.post("/bulk/boot-profiles/{name}/restore")
+async def restore_boot_profile(name: str, parallelism: int = 4):
+    """Start every service of a profile (models first), streaming progress."""
+    data = await load_boot_profiles()
+    if name not in data["profiles"]:
+        raise HTTPException(status_code=404, detail=f"Boot profile {name} not found")
+    return _stream(_profile_plan(data["profiles"][name]), "start", max(1, min(parallelism, 32)))
+
+
+async def restore_on_boot(parallelism: int = 4):
+    """Owner-worker startup task: start the profile marked restore_on_boot."""
+    data = await load_boot_profiles()
+    name = data.get("restore_on_boot")
+    if not name or name not in data["profiles"]:
+        return
+    # Statuses left in the registries by a previous boot are stale until checked
+    await service_supervisor.scan_once(check_models=True)
+    logger.info(f"Restoring boot profile {name}")
+    await run_bulk(_profile_plan(data["profiles"][name]), "start", parallelism)
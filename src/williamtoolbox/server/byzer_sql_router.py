@@ -7,16 +7,19 @@ from loguru import logger
 import traceback
 from typing import Dict, Any
 from pathlib import Path
-import subprocess
 import uuid
-import psutil
 import asyncio
 import httpx
 from fastapi import Request
 import shutil
 from sse_starlette.sse import EventSourceResponse
-from ..storage.json_file import load_byzer_sql_from_json, save_byzer_sql_to_json
+from ..storage.json_file import load_byzer_sql_from_json, save_byzer_sql_to_json, update_byzer_sql_in_json
+from ..storage.shared_state import get_shared_state
 from .request_types import AddByzerSQLRequest, RunSQLRequest, RunSQLRequest
+from .supervisor import service_supervisor, BYZER_SQL
+from .process_manager import process_manager
+from .log_tail import read_chunk
+from .port_allocator import reserve, PortConflict
 from jproperties import Properties
 
 router = APIRouter()
@@ -65,6 +68,10 @@ async def run_script(request: RunSQLRequest):
 async def list_byzer_sql():
     """List all Byzer SQL services."""
     services = await load_byzer_sql_from_json()
+    statuses = await service_supervisor.table(BYZER_SQL)
+    for name, info in services.items():
+        if name in statuses:
+            info["status"] = statuses[name]["status"]
     return [{"name": name, **info} for name, info in services.items()]
 
 
@@ -89,6 +96,11 @@ async def add_byzer_sql(request: AddByzerSQLRequest):
             status_code=400, detail=f"Byzer SQL {request.name} already exists"
         )
 
+    try:
+        await reserve(BYZER_SQL, request.name, request.port, request.host, probe=False)
+    except PortConflict as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
     # Check if directory exists and validate its structure
     if not os.path.exists(request.install_dir):
         os.makedirs(request.install_dir)
@@ -145,8 +157,25 @@ async def add_byzer_sql(request: AddByzerSQLRequest):
     return {"message": f"Byzer SQL {request.name} added successfully"}
 
 
-# 全局变量存储各个下载任务的进度
-download_progress_store = {}
+# 下载任务的进度保存在共享存储中，多 worker 时 SSE 请求可以落在任意进程
+DOWNLOAD_PROGRESS = "download_progress"
+_last_reported_progress = {}
+
+
+async def set_download_progress(task_id: str, progress_data: Dict[str, Any]):
+    """Publish progress for a download task.
+
+    Updates that do not change the (type, progress) pair are dropped so the
+    per-chunk and per-member loops do not write on every iteration.
+    """
+    marker = (progress_data.get("type"), progress_data.get("progress"))
+    is_final = "completed" in progress_data or "error" in progress_data
+    if not is_final and _last_reported_progress.get(task_id) == marker:
+        return
+    _last_reported_progress[task_id] = marker
+    if is_final:
+        _last_reported_progress.pop(task_id, None)
+    await get_shared_state().set(DOWNLOAD_PROGRESS, task_id, progress_data)
 
 
 @router.get("/api/download-progress/{task_id}")
@@ -154,12 +183,13 @@ async def download_progress(request: Request, task_id: str):
     """SSE endpoint for download progress updates"""
 
     async def event_generator():
+        state = get_shared_state()
         while True:
             if await request.is_disconnected():
                 break
 
-            if task_id in download_progress_store:
-                progress_data = download_progress_store[task_id]
+            progress_data = await state.get(DOWNLOAD_PROGRESS, task_id)
+            if progress_data is not None:
                 # Convert progress_data to JSON string and ensure it's properly formatted
                 data = json.dumps(progress_data)
 
@@ -167,7 +197,7 @@ async def download_progress(request: Request, task_id: str):
                 yield {"event": "message", "data": data}
 
                 if progress_data.get("completed", False):
-                    del download_progress_store[task_id]
+                    await state.delete(DOWNLOAD_PROGRESS, task_id)
                     break
 
             await asyncio.sleep(0.5)
@@ -181,7 +211,7 @@ async def download_byzer_sql(request: Dict[str, str]):
     download_url = request["download_url"]
     install_dir = request["install_dir"]
     task_id = str(uuid.uuid4())
-    download_progress_store[task_id] = {"task_id": task_id}
+    await set_download_progress(task_id, {"task_id": task_id})
 
     async def download_and_extract():
         try:
@@ -225,7 +255,7 @@ async def download_byzer_sql(request: Dict[str, str]):
                                     await f.write(chunk)
                                     downloaded_size += len(chunk)
                                     progress = int((downloaded_size / total_size) * 100)
-                                    download_progress_store[task_id] = {
+                                    await set_download_progress(task_id, {
                                         "task_id": task_id,
                                         "type": "download",
                                         "progress": progress,
@@ -237,12 +267,12 @@ async def download_byzer_sql(request: Dict[str, str]):
                                         "estimated_time": calculate_eta(
                                             downloaded_size, total_size, start_time
                                         ),
-                                    }
+                                    })
                     except asyncio.TimeoutError:
-                        download_progress_store[task_id] = {
+                        await set_download_progress(task_id, {
                             "task_id": task_id,
                             "error": "下载超时",
-                        }
+                        })
                         raise Exception("Download timeout")
 
             # Extract the file asynchronously using tar command
@@ -251,13 +281,13 @@ async def download_byzer_sql(request: Dict[str, str]):
             import tarfile
             
             # 创建进度监控函数
-            def report_progress(total_members, task_id, download_progress_store):
+            def report_progress(total_members, task_id):
                 current_member = 0
                 def progress_callback(member):
                     nonlocal current_member
                     current_member += 1
                     progress = int((current_member / total_members) * 100)
-                    download_progress_store[task_id] = {
+                    return {
                         "task_id": task_id,
                         "type": "extract",
                         "progress": min(progress, 100),
@@ -276,9 +306,9 @@ async def download_byzer_sql(request: Dict[str, str]):
 
                 # 解压文件
                 with tarfile.open(tar_path, 'r:gz') as tar:
-                    progress_callback = report_progress(total_members, task_id, download_progress_store)
+                    progress_callback = report_progress(total_members, task_id)
                     for member in tar.getmembers():
-                        progress_callback(member)
+                        await set_download_progress(task_id, progress_callback(member))
                         tar.extract(member, temp_dir)
 
                 # 获取第一级目录并移动文件
@@ -315,12 +345,12 @@ async def download_byzer_sql(request: Dict[str, str]):
             byzer_llm_path = os.path.join(libs_dir, "byzer-llm-3.3_2.12-0.1.9.jar")
 
             async with httpx.AsyncClient() as client:
-                download_progress_store[task_id] = {
+                await set_download_progress(task_id, {
                     "task_id": task_id, 
                     "type": "download",
                     "progress": 0,
                     "subTitle": "正在下载 byzer-llm 扩展..."
-                }
+                })
                 
                 async with client.stream('GET', byzer_llm_url) as response:
                     total = int(response.headers.get('content-length', 0))
@@ -331,12 +361,12 @@ async def download_byzer_sql(request: Dict[str, str]):
                             await f.write(chunk)
                             downloaded += len(chunk)
                             progress = int((downloaded / total) * 100) if total else 0
-                            download_progress_store[task_id] = {
+                            await set_download_progress(task_id, {
                                 "task_id": task_id,
                                 "type": "download",
                                 "progress": progress,
                                 "subTitle": f"正在下载 byzer-llm 扩展... {progress}%"
-                            }
+                            })
 
             # Update byzer.properties.override
             config_file = os.path.join(install_dir, "conf", "byzer.properties.override")
@@ -388,12 +418,12 @@ async def download_byzer_sql(request: Dict[str, str]):
                         async with aiofiles.open(start_script, 'w') as f:
                             await f.write(modified_content)
 
-            download_progress_store[task_id] = {"task_id": task_id, "completed": True}
+            await set_download_progress(task_id, {"task_id": task_id, "completed": True})
 
         except Exception as e:
             logger.error(f"Error during download/extraction: {str(e)}")
             logger.error(traceback.format_exc())
-            download_progress_store[task_id] = {"task_id": task_id, "error": str(e)}
+            await set_download_progress(task_id, {"task_id": task_id, "error": str(e)})
 
     # Start the download process asynchronously
     asyncio.create_task(download_and_extract())
@@ -533,8 +563,7 @@ async def update_byzer_sql(service_name: str, request: AddByzerSQLRequest):
         )
 
     service_info.update(request.model_dump())
-    services[service_name] = service_info
-    await save_byzer_sql_to_json(services)
+    await update_byzer_sql_in_json(service_name, service_info)
 
     return {"message": f"Byzer SQL {service_name} updated successfully"}
 
@@ -563,19 +592,21 @@ async def manage_byzer_sql(service_name: str, action: str):
             detail="Invalid installation directory. Missing byzer.sh script.",
         )
 
-    try:
-        os.makedirs("logs", exist_ok=True)
-        stdout_log = open(os.path.join("logs", f"{service_name}.out"), "w")
-        stderr_log = open(os.path.join("logs", f"{service_name}.err"), "w")
+    if action == "start":
+        try:
+            await reserve(BYZER_SQL, service_name, service_info["port"], service_info.get("host"))
+        except PortConflict as e:
+            raise HTTPException(status_code=400, detail=str(e))
 
+    try:
         if action == "start":
             start_script = os.path.join(install_dir, "bin", "byzer.sh")
-            # Execute start command
-            subprocess.run(
+            # byzer.sh 启动 JVM 后台进程后即返回，这里异步等待它结束
+            await process_manager.run_command(
                 [start_script, "start"],
-                stdout=stdout_log,
-                stderr=stderr_log,
                 cwd=install_dir,
+                log_name=service_name,
+                timeout=120,
                 check=True,
             )
 
@@ -583,12 +614,7 @@ async def manage_byzer_sql(service_name: str, action: str):
             pid_file = os.path.join(install_dir, "pid")
             try:
                 # Wait a bit for the pid file to be created
-                for _ in range(60):
-                    if os.path.exists(pid_file):
-                        break
-                    await asyncio.sleep(0.5)
-
-                if os.path.exists(pid_file):
+                if await process_manager.wait_ready(lambda: os.path.exists(pid_file), timeout=30):
                     async with aiofiles.open(pid_file, "r") as f:
                         pid = int((await f.read()).strip())
                     service_info["status"] = "running"
@@ -604,12 +630,15 @@ async def manage_byzer_sql(service_name: str, action: str):
         else:  # stop
             if "process_id" in service_info:
                 stop_script = os.path.join(install_dir, "bin", "byzer.sh")
-                subprocess.run([stop_script, "stop"], check=True, cwd=install_dir)
+                await process_manager.run_command(
+                    [stop_script, "stop"], cwd=install_dir, timeout=120, check=True
+                )
                 service_info["status"] = "stopped"
                 del service_info["process_id"]
 
-        services[service_name] = service_info
-        await save_byzer_sql_to_json(services)
+        # 只更新当前条目，并发启停其他服务时不会互相覆盖
+        await update_byzer_sql_in_json(service_name, service_info)
+        await service_supervisor.refresh()
         return {"message": f"Byzer SQL {service_name} {action}ed successfully"}
 
     except Exception as e:
@@ -629,47 +658,14 @@ async def get_byzer_sql_status(service_name: str):
             status_code=404, detail=f"Byzer SQL {service_name} not found"
         )
 
-    service_info = services[service_name]
-    install_dir = service_info["install_dir"]
-    pid_file = os.path.join(install_dir, "pid")
-
-    # Check if pid file exists and process is running
-    is_alive = False
-    process_id = None
-    if os.path.exists(pid_file):
-        try:
-            async with aiofiles.open(pid_file, "r") as f:
-                content = await f.read()
-                process_id = int(content.strip())
-                try:
-                    process = psutil.Process(process_id)
-                    is_alive = process.is_running()
-                except psutil.NoSuchProcess:
-                    is_alive = False
-                    # Remove pid file if process is not running
-                    try:
-                        os.remove(pid_file)
-                    except:
-                        pass
-        except:
-            is_alive = False
-
-    # Update the status based on whether the process is alive
-    status = "running" if is_alive else "stopped"
-    service_info["status"] = status
-    if is_alive and process_id:
-        service_info["process_id"] = process_id
-    elif "process_id" in service_info:
-        del service_info["process_id"]
-
-    services[service_name] = service_info
-    await save_byzer_sql_to_json(services)
+    # pid 文件由 supervisor 后台检测，这里只读取状态表
+    entry = await service_supervisor.get(BYZER_SQL, service_name) or {}
 
     return {
         "service": service_name,
-        "status": status,
-        "process_id": process_id if is_alive else None,
-        "is_alive": is_alive,
+        "status": entry.get("status", "stopped"),
+        "process_id": entry.get("process_id"),
+        "is_alive": entry.get("is_alive", False),
         "success": True,
     }
 
@@ -697,33 +693,8 @@ async def get_byzer_sql_logs(
         log_file = os.path.join(install_dir, "logs", "check-env.error")
 
     try:
-        if not os.path.exists(log_file):
-            return {"content": "", "exists": False, "offset": 0}
-
-        file_size = os.path.getsize(log_file)
-
-        if offset < 0:
-            read_size = min(abs(offset), file_size)
-            async with aiofiles.open(
-                log_file, mode="r", encoding="utf-8", errors="ignore"
-            ) as f:
-                if read_size < file_size:
-                    await f.seek(file_size - read_size)
-                content = await f.read(read_size)
-                current_offset = file_size
-            return {"content": content, "exists": True, "offset": current_offset}
-        else:
-            if offset > file_size:
-                return {"content": "", "exists": True, "offset": file_size}
-
-            async with aiofiles.open(
-                log_file, mode="r", encoding="utf-8", errors="ignore"
-            ) as f:
-                await f.seek(offset)
-                content = await f.read()
-                current_offset = await f.tell()
-            return {"content": content, "exists": True, "offset": current_offset}
-
+        # 每次最多读取 MAX_CHUNK_BYTES，前端从返回的 offset 继续轮询
+        return await read_chunk(log_file, offset)
     except Exception as e:
         logger.error(f"Error reading log file: {str(e)}")
         logger.error(traceback.format_exc())
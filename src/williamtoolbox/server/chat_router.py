@@ -12,8 +12,10 @@ from .request_types import *
 from ..storage.json_file import *
 import aiofiles
 import traceback
-from byzerllm.utils.client import code_utils
-from autocoder.utils.stream_thinking import stream_with_thinking_async, separate_stream_thinking_async
+from ..metrics import ChatStreamRecorder
+from .supervisor import SUPER_ANALYSIS, MODEL, OPENAI_SERVICE, OPENAI_SERVICE_NAME
+from .readiness import readiness, ServiceNotReady
+from .rag_replicas import rag_balancer
 
 router = APIRouter()
 
@@ -40,6 +42,8 @@ async def ask(request: AskRequest):
 
         if not first_model:
             raise HTTPException(status_code=404, detail="No running models available")
+        await readiness.ensure_ready(OPENAI_SERVICE, OPENAI_SERVICE_NAME)
+        await readiness.ensure_ready(MODEL, first_model)
             
         # 获取OpenAI服务配置
         openai_server = config.get("openaiServerList", [{}])[0]
@@ -61,6 +65,10 @@ async def ask(request: AskRequest):
 
         return {"response": response.choices[0].message.content}
         
+    except HTTPException:
+        raise
+    except ServiceNotReady as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         logger.error(f"Error in ask endpoint: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -183,10 +191,16 @@ async def process_message_stream(
     response_message_id: str,
     chat_data: ChatData,
 ):
+    # Imported here so loading the router does not pull in autocoder
+    from autocoder.utils.stream_thinking import separate_stream_thinking_async
+
     file_path = await get_event_file_path(request_id)
     idx = 0
     thoughts = []
+    stream_metrics = ChatStreamRecorder(request.list_type, request.selected_item)
     async with aiofiles.open(file_path, "w") as event_file:
+        # Replica serving a RAG request, released when the stream ends
+        lease = None
         try:
             config = await load_config()
             if request.list_type == "models":
@@ -197,6 +211,9 @@ async def process_message_stream(
                 product_type = model_info.get("product_type", "pro")
 
                 if product_type == "pro":
+                    # 服务仍在启动时短暂等待，不健康则直接报错
+                    await readiness.ensure_ready(OPENAI_SERVICE, OPENAI_SERVICE_NAME)
+                    await readiness.ensure_ready(MODEL, model_name)
                     openai_server = config.get("openaiServerList", [{}])[0]
                     
                     host = openai_server.get("host", "localhost")
@@ -237,6 +254,7 @@ async def process_message_stream(
                         await event_file.write(
                             json.dumps(event, ensure_ascii=False) + "\n"
                         )
+                        stream_metrics.record(event)
                         await event_file.flush()
                         idx += 1
 
@@ -251,12 +269,14 @@ async def process_message_stream(
                         await event_file.write(
                             json.dumps(event, ensure_ascii=False) + "\n"
                         )
+                        stream_metrics.record(event)
                         await event_file.flush()
                         idx += 1 
 
             elif request.list_type == "super-analysis":
                 super_analyses = await load_super_analysis_from_json()
                 analysis_info = super_analyses.get(request.selected_item, {})
+                await readiness.ensure_ready(SUPER_ANALYSIS, request.selected_item)
                 host = analysis_info.get("host", "localhost")
                 port = analysis_info.get("port", 8000)
                 if host == "0.0.0.0":
@@ -289,6 +309,7 @@ async def process_message_stream(
                         await event_file.write(
                             json.dumps(event, ensure_ascii=False) + "\n"
                         )
+                        stream_metrics.record(event)
                         await event_file.flush()
                         idx += 1
 
@@ -303,20 +324,18 @@ async def process_message_stream(
                         await event_file.write(
                             json.dumps(event, ensure_ascii=False) + "\n"
                         )
+                        stream_metrics.record(event)
                         await event_file.flush()
                         idx += 1        
 
             elif request.list_type == "rags":
                 rags = await load_rags_from_json()
                 rag_info = rags.get(request.selected_item, {})
-                host = rag_info.get("host", "localhost")
-                port = rag_info.get("port", 8000)
-                if host == "0.0.0.0":
-                    host = "127.0.0.1"
+                # 多副本时选择进行中请求最少的健康副本
+                lease = await rag_balancer.acquire(request.selected_item, rag_info)
+                base_url = lease[1]
 
-                base_url = f"http://{host}:{port}/v1"
-
-                logger.info(f"RAG {request.selected_item} is using {base_url}")
+                logger.info(f"RAG {request.selected_item} is using {base_url} ({lease[0]})")
                 inference_deep_thought = rag_info.get(
                     "inference_deep_thought", "False"
                 ) in ["True", "true", True]
@@ -356,6 +375,7 @@ async def process_message_stream(
                             await event_file.write(
                                 json.dumps(event, ensure_ascii=False) + "\n"
                             )
+                            stream_metrics.record(event)
                             await event_file.flush()
 
                             idx += 1
@@ -370,6 +390,7 @@ async def process_message_stream(
                             await event_file.write(
                                 json.dumps(event, ensure_ascii=False) + "\n"
                             )
+                            stream_metrics.record(event)
                             await event_file.flush()
 
                             idx += 1
@@ -417,6 +438,7 @@ async def process_message_stream(
                                 await event_file.write(
                                     json.dumps(event, ensure_ascii=False) + "\n"
                                 )
+                                stream_metrics.record(event)
                                 await event_file.flush()                            
                                 idx += 1
                             if evt["event_type"] == "chunk" or evt["event_type"] == "done":
@@ -435,6 +457,7 @@ async def process_message_stream(
                             await event_file.write(
                                 json.dumps(event, ensure_ascii=False) + "\n"
                             )
+                            stream_metrics.record(event)
                             await event_file.flush()
 
                             idx += 1
@@ -448,8 +471,11 @@ async def process_message_stream(
                 "timestamp": datetime.now().isoformat(),
             }
             await event_file.write(json.dumps(error_event, ensure_ascii=False) + "\n")
+            stream_metrics.record(error_event)
             await event_file.flush()
             logger.error(traceback.format_exc())
+        finally:
+            rag_balancer.release(lease)
 
         await event_file.write(
             json.dumps(
@@ -464,6 +490,7 @@ async def process_message_stream(
             + "\n"
         )
         await event_file.flush()
+        stream_metrics.finish()
 
     s = ""
     async with aiofiles.open(file_path, "r") as event_file:
@@ -530,6 +557,8 @@ class ExtractCSVRequest(BaseModel):
 @router.post("/chat/extract_csv")
 async def extract_csv(request: ExtractCSVRequest):
     """Extract CSV content from markdown code block"""
+    from byzerllm.utils.client import code_utils
+
     try:
         code_blocks = code_utils.extract_code(request.content)
         for code_block in code_blocks:
@@ -0,0 +1,45 @@
+from fastapi import FastAPI
+from fastapi.middleware.cors import CORSMiddleware
+import uvicorn
+import argparse
+from .proxy_server import mount_frontend
+from .backend_server import include_backend_routers
+
+# Single-process mode: the web UI and every backend router live in one ASGI
+# app, so UI requests skip the proxy -> backend HTTP hop. Use
+# william.toolbox.backend + william.toolbox.frontend for split deployments.
+app = FastAPI()
+
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=["*"],
+    allow_credentials=True,
+    allow_methods=["*"],
+    allow_headers=["*"],
+)
+
+mount_frontend(app)
+include_backend_routers(app)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Combined Frontend and Backend Server")
+    parser.add_argument(
+        "--port",
+        type=int,
+        default=8006,
+        help="Port to run the combined server on (default: 8006)",
+    )
+    parser.add_argument(
+        "--host",
+        type=str,
+        default="0.0.0.0",
+        help="Host to run the combined server on (default: 0.0.0.0)",
+    )
+    args = parser.parse_args()
+    print(f"Starting combined server on {args.host}:{args.port}")
+    uvicorn.run(app, host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
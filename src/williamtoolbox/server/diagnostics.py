@@ -0,0 +1,189 @@
+import os
+import sys
+import time
+import asyncio
+import threading
+import traceback
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+from fastapi import APIRouter, Depends
+from loguru import logger
+
+from .openapi_router import verify_admin
+from ..metrics import Histogram, Counter
+
+router = APIRouter()
+
+DIAGNOSTICS_ENV = "WILLIAM_TOOLBOX_DIAGNOSTICS"
+BLOCKING_THRESHOLD_ENV = "WILLIAM_TOOLBOX_BLOCKING_THRESHOLD_MS"
+DEFAULT_BLOCKING_THRESHOLD_MS = 100
+
+# Only frames from this package are used to name the blocking call site
+PACKAGE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+EVENT_LOOP_LAG = Histogram(
+    "event_loop_lag_seconds", "Delay between a heartbeat's scheduled and actual wake-up.",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0),
+)
+EVENT_LOOP_BLOCKED = Counter(
+    "event_loop_blocked_total", "Times the event loop was blocked longer than the threshold.", ["site"]
+)
+
+
+@dataclass
+class BlockingSite:
+    site: str
+    count: int = 0
+    total_seconds: float = 0.0
+    max_seconds: float = 0.0
+    last_seen: float = 0.0
+    stack: List[str] = field(default_factory=list)
+
+
+def _call_site(frames: List[traceback.FrameSummary]) -> str:
+    """Innermost frame from our own code, which is what needs offloading."""
+    for frame in reversed(frames):
+        if frame.filename.startswith(PACKAGE_DIR) and not frame.filename.endswith("diagnostics.py"):
+            return f"{os.path.relpath(frame.filename, PACKAGE_DIR)}:{frame.lineno} in {frame.name}"
+    frame = frames[-1]
+    return f"{frame.filename}:{frame.lineno} in {frame.name}"
+
+
+class LoopMonitor:
+    """Detects callbacks that block the event loop.
+
+    A heartbeat task wakes up every `interval` seconds and records how late
+    it ran (loop lag). A watchdog thread notices when the heartbeat is
+    overdue by more than `threshold` and captures the loop thread's stack
+    while the blocking call is still running, so the report points at the
+    offending line rather than at the code that ran afterwards.
+    """
+
+    def __init__(self, threshold: float = DEFAULT_BLOCKING_THRESHOLD_MS / 1000, interval: float = 0.05):
+        self.threshold = threshold
+        self.interval = interval
+        self.sites: Dict[str, BlockingSite] = {}
+        self._loop_thread_id: Optional[int] = None
+        self._last_beat = 0.0
+        # Stack captured by the watchdog for the stall in progress
+        self._stall_stack: Optional[List[traceback.FrameSummary]] = None
+        self._task: Optional[asyncio.Task] = None
+        self._stop = threading.Event()
+        self._watchdog: Optional[threading.Thread] = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None
+
+    async def _heartbeat(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.interval
+            self._last_beat = time.monotonic()
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, loop.time() - expected)
+            EVENT_LOOP_LAG.observe(lag)
+            if lag >= self.threshold:
+                self._record(lag)
+            else:
+                self._stall_stack = None
+
+    def _record(self, lag: float):
+        frames = self._stall_stack
+        self._stall_stack = None
+        if not frames:
+            # The stall ended before the watchdog looked; nothing to attribute
+            site, stack = "unknown (stall ended before capture)", []
+        else:
+            site, stack = _call_site(frames), traceback.format_list(frames)
+        entry = self.sites.get(site)
+        if entry is None:
+            entry = self.sites[site] = BlockingSite(site=site)
+        entry.count += 1
+        entry.total_seconds += lag
+        entry.max_seconds = max(entry.max_seconds, lag)
+        entry.last_seen = time.time()
+        if stack:
+            entry.stack = stack
+        EVENT_LOOP_BLOCKED.inc(site=site)
+        logger.warning(
+            f"Event loop blocked for {lag * 1000:.0f}ms at {site}\n" + "".join(entry.stack[-8:])
+        )
+
+    def _watch(self):
+        while not self._stop.wait(self.threshold / 2):
+            overdue = time.monotonic() - self._last_beat - self.interval
+            if overdue < self.threshold or self._stall_stack is not None:
+                continue
+            frame = sys._current_frames().get(self._loop_thread_id)
+            if frame is not None:
+                self._stall_stack = traceback.extract_stack(frame)
+
+    async def start(self):
+        if self.running:
+            return
+        self._loop_thread_id = threading.get_ident()
+        self._last_beat = time.monotonic()
+        self._stop.clear()
+        self._task = asyncio.create_task(self._heartbeat())
+        self._watchdog = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self._watchdog.start()
+        logger.info(f"Event loop diagnostics enabled (threshold {self.threshold * 1000:.0f}ms)")
+
+    async def stop(self):
+        self._stop.set()
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def report(self) -> Dict[str, Any]:
+        sites = sorted(self.sites.values(), key=lambda entry: entry.total_seconds, reverse=True)
+        return {
+            "enabled": self.running,
+            "pid": os.getpid(),
+            "threshold_ms": self.threshold * 1000,
+            "sites": [
+                {
+                    "site": entry.site,
+                    "count": entry.count,
+                    "total_ms": round(entry.total_seconds * 1000, 1),
+                    "max_ms": round(entry.max_seconds * 1000, 1),
+                    "last_seen": entry.last_seen,
+                    "stack": entry.stack,
+                }
+                for entry in sites
+            ],
+        }
+
+
+def diagnostics_enabled() -> bool:
+    return os.environ.get(DIAGNOSTICS_ENV, "") in ("1", "true", "True")
+
+
+def blocking_threshold() -> float:
+    try:
+        return float(os.environ.get(BLOCKING_THRESHOLD_ENV, DEFAULT_BLOCKING_THRESHOLD_MS)) / 1000
+    except ValueError:
+        return DEFAULT_BLOCKING_THRESHOLD_MS / 1000
+
+
+loop_monitor = LoopMonitor()
+
+
+async def start_diagnostics():
+    if diagnostics_enabled():
+        loop_monitor.threshold = blocking_threshold()
+        await loop_monitor.start()
+
+
+@router.get("/diagnostics/blocking")
+async def get_blocking_report(_: dict = Depends(verify_admin)):
+    """Call sites that blocked this worker's event loop, worst first."""
+    return loop_monitor.report()
+
+
+@router.delete("/diagnostics/blocking")
+async def reset_blocking_report(_: dict = Depends(verify_admin)):
+    loop_monitor.sites.clear()
+    return {"message": "Blocking report cleared"}
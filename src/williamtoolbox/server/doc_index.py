@@ -0,0 +1,248 @@
+import os
+import json
+import time
+import base64
+import bisect
+import asyncio
+import fnmatch
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+from .doc_manifest import EXCLUDED_DIRS
+
+# Directory mtimes are checked at most this often per doc_dir
+CHECK_INTERVAL = 2.0
+# Rewriting an existing file leaves its directory's mtime alone, so every
+# file is re-stat'ed this often as well
+FULL_RESCAN_INTERVAL = 300.0
+SORT_KEYS = ("name", "size", "modified", "ext")
+
+
+def _ext(name: str) -> str:
+    return os.path.splitext(name)[1].lower()
+
+
+def encode_cursor(value: Any, name: str) -> str:
+    return base64.urlsafe_b64encode(json.dumps([value, name]).encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(cursor: str) -> Tuple[Any, str]:
+    try:
+        value, name = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+    except (ValueError, TypeError):
+        raise ValueError("Invalid cursor")
+    return value, name
+
+
+class DocDirIndex:
+    """In-memory listing of one doc_dir, kept current by directory mtime checks.
+
+    Adding, removing or renaming a file changes its directory's mtime, so a
+    check only stats directories and rescans the ones that changed. The
+    whole tree is re-stat'ed every FULL_RESCAN_INTERVAL to pick up files
+    rewritten in place; uploads through the API update their entry directly.
+    All methods are blocking and meant for a worker thread.
+    """
+
+    def __init__(self, doc_dir: str):
+        self.doc_dir = doc_dir
+        # dir (relative, "" for doc_dir) -> [mtime_ns, {file: (size, mtime)}, {subdirs}]
+        self._dirs: Dict[str, list] = {}
+        self._lock = threading.Lock()
+        self.version = 0
+        self.checked_at = 0.0
+        self.scanned_at = 0.0
+        self._views: Dict[str, Tuple[int, List[tuple], List[tuple]]] = {}
+
+    def _scan_dir(self, rel_dir: str) -> bool:
+        """(Re)read one directory; returns False if it is gone."""
+        path = os.path.join(self.doc_dir, rel_dir) if rel_dir else self.doc_dir
+        try:
+            mtime = os.stat(path).st_mtime_ns
+            files, subdirs = {}, set()
+            with os.scandir(path) as entries:
+                for entry in entries:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            if entry.name not in EXCLUDED_DIRS:
+                                subdirs.add(entry.name)
+                        elif entry.is_file():
+                            stat = entry.stat()
+                            files[entry.name] = (stat.st_size, stat.st_mtime)
+                    except FileNotFoundError:
+                        continue
+        except (FileNotFoundError, NotADirectoryError):
+            self._drop(rel_dir)
+            return False
+        old = self._dirs.get(rel_dir)
+        self._dirs[rel_dir] = [mtime, files, subdirs]
+        for name in subdirs - (old[2] if old else set()):
+            self._scan_dir(os.path.join(rel_dir, name) if rel_dir else name)
+        for name in (old[2] if old else set()) - subdirs:
+            self._drop(os.path.join(rel_dir, name) if rel_dir else name)
+        return True
+
+    def _drop(self, rel_dir: str):
+        entry = self._dirs.pop(rel_dir, None)
+        if entry is None:
+            return
+        for name in entry[2]:
+            self._drop(os.path.join(rel_dir, name) if rel_dir else name)
+
+    def refresh(self, force: bool = False) -> None:
+        now = time.time()
+        with self._lock:
+            if not force and now - self.checked_at < CHECK_INTERVAL:
+                return
+            changed = False
+            if not self._dirs or now - self.scanned_at >= FULL_RESCAN_INTERVAL:
+                self._dirs.clear()
+                self._scan_dir("")
+                self.scanned_at = now
+                changed = True
+            else:
+                for rel_dir in list(self._dirs):
+                    if rel_dir not in self._dirs:
+                        # Dropped together with a removed parent
+                        continue
+                    path = os.path.join(self.doc_dir, rel_dir) if rel_dir else self.doc_dir
+                    try:
+                        mtime = os.stat(path).st_mtime_ns
+                    except FileNotFoundError:
+                        mtime = None
+                    if mtime != self._dirs[rel_dir][0]:
+                        self._scan_dir(rel_dir)
+                        changed = True
+            if changed:
+                self.version += 1
+            self.checked_at = now
+
+    def touch(self, rel_path: str) -> None:
+        """A file was written or deleted through the API: update its entry now."""
+        rel_dir, name = os.path.split(os.path.normpath(rel_path))
+        with self._lock:
+            entry = self._dirs.get(rel_dir)
+            if entry is None:
+                # New directory: rescanned by the next check
+                self.checked_at = 0.0
+                return
+            try:
+                stat = os.stat(os.path.join(self.doc_dir, rel_path))
+                entry[1][name] = (stat.st_size, stat.st_mtime)
+            except FileNotFoundError:
+                entry[1].pop(name, None)
+            self.version += 1
+
+    def _files(self) -> List[tuple]:
+        files = []
+        for rel_dir, (_, names, _) in self._dirs.items():
+            for name, (size, mtime) in names.items():
+                rel_path = os.path.join(rel_dir, name) if rel_dir else name
+                files.append((rel_path, size, mtime, _ext(name)))
+        return files
+
+    def _view(self, sort: str) -> Tuple[List[tuple], List[tuple]]:
+        """Files sorted by (sort value, name) and the matching keys, cached per version."""
+        cached = self._views.get(sort)
+        if cached is not None and cached[0] == self.version:
+            return cached[1], cached[2]
+        column = {"name": 0, "size": 1, "modified": 2, "ext": 3}[sort]
+        files = sorted(self._files(), key=lambda f: (f[column], f[0]))
+        keys = [(f[column], f[0]) for f in files]
+        self._views[sort] = (self.version, files, keys)
+        return files, keys
+
+    def query(self, sort: str = "name", order: str = "asc", prefix: Optional[str] = None,
+              glob: Optional[str] = None, ext: Optional[str] = None, limit: int = 100,
+              cursor: Optional[str] = None) -> Dict[str, Any]:
+        """One page of the listing plus totals for everything matching the filters.
+
+        The cursor is the (sort value, name) of the last item returned, so
+        pages stay consistent while files are added or removed.
+        """
+        self.refresh()
+        with self._lock:
+            files, keys = self._view(sort)
+            version = self.version
+        exts = {e.strip().lower() if e.strip().startswith(".") else f".{e.strip().lower()}"
+                for e in ext.split(",") if e.strip()} if ext else set()
+
+        def matches(f: tuple) -> bool:
+            if prefix and not f[0].startswith(prefix):
+                return False
+            if exts and f[3] not in exts:
+                return False
+            if glob and not fnmatch.fnmatch(f[0], glob):
+                return False
+            return True
+
+        descending = order == "desc"
+        if cursor:
+            key = decode_cursor(cursor)
+            try:
+                start = bisect.bisect_left(keys, key) - 1 if descending else bisect.bisect_right(keys, key)
+            except TypeError:
+                # A cursor from a listing with another sort key
+                raise ValueError("Cursor does not match the sort key")
+        else:
+            start = len(files) - 1 if descending else 0
+        step = -1 if descending else 1
+
+        items = []
+        position = start
+        while 0 <= position < len(files) and len(items) < limit:
+            f = files[position]
+            if matches(f):
+                items.append(f)
+            position += step
+        # More matches after this page?
+        more = False
+        while 0 <= position < len(files):
+            if matches(files[position]):
+                more = True
+                break
+            position += step
+
+        extensions: Dict[str, Dict[str, int]] = {}
+        total = total_bytes = 0
+        for f in files:
+            if matches(f):
+                total += 1
+                total_bytes += f[1]
+                aggregate = extensions.setdefault(f[3] or "(none)", {"count": 0, "bytes": 0})
+                aggregate["count"] += 1
+                aggregate["bytes"] += f[1]
+
+        column = SORT_KEYS.index(sort)
+        return {
+            "items": [{"name": f[0], "size": f[1], "modified": f[2], "ext": f[3]} for f in items],
+            "next_cursor": encode_cursor(items[-1][column], items[-1][0]) if more and items else None,
+            "total": total,
+            "total_bytes": total_bytes,
+            "extensions": extensions,
+            "version": version,
+            "checked_at": self.checked_at,
+        }
+
+
+class DocIndexRegistry:
+    """One DocDirIndex per doc_dir, built on first use in a worker thread."""
+
+    def __init__(self):
+        self._indexes: Dict[str, DocDirIndex] = {}
+
+    def get(self, doc_dir: str) -> DocDirIndex:
+        doc_dir = os.path.abspath(doc_dir)
+        index = self._indexes.get(doc_dir)
+        if index is None:
+            index = self._indexes[doc_dir] = DocDirIndex(doc_dir)
+        return index
+
+    async def query(self, doc_dir: str, **kwargs) -> Dict[str, Any]:
+        return await asyncio.to_thread(self.get(doc_dir).query, **kwargs)
+
+    async def touch(self, doc_dir: str, rel_path: str) -> None:
+        await asyncio.to_thread(self.get(doc_dir).touch, rel_path)
+
+
+doc_index = DocIndexRegistry()
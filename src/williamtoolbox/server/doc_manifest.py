@@ -0,0 +1,175 @@
+import os
+import time
+import hashlib
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+from ..storage.json_file import read_json_file, write_json_file, with_file_lock
+
+# Manifest of the files a RAG's hybrid index was last built from:
+# relative path -> size, mtime and sha256 of the content.
+MANIFEST_DIR = os.path.join("data", "manifests")
+HASH_WORKERS = min(8, (os.cpu_count() or 1) + 2)
+HASH_BLOCK_BYTES = 1024 * 1024
+# Written into doc_dir by the RAG itself (image extraction output and the
+# index cache); never documents, so never listed, hashed or built from
+EXCLUDED_DIRS = ("_images", ".cache")
+
+
+def manifest_path(rag_name: str) -> str:
+    return os.path.join(MANIFEST_DIR, f"{rag_name}.json")
+
+
+def parse_exts(required_exts: Optional[str]) -> List[str]:
+    """".md,.pdf" / "md, pdf" -> [".md", ".pdf"]; empty means every file."""
+    if not required_exts:
+        return []
+    exts = []
+    for ext in required_exts.split(","):
+        ext = ext.strip().lower()
+        if ext:
+            exts.append(ext if ext.startswith(".") else f".{ext}")
+    return exts
+
+
+def walk_doc_dir(doc_dir: str, exts: List[str]) -> Dict[str, os.stat_result]:
+    """Files under doc_dir, skipping hidden entries and EXCLUDED_DIRS."""
+    files = {}
+    for root, dirs, names in os.walk(doc_dir):
+        dirs[:] = [d for d in dirs if not d.startswith(".") and d not in EXCLUDED_DIRS]
+        for name in names:
+            if name.startswith("."):
+                continue
+            if exts and os.path.splitext(name)[1].lower() not in exts:
+                continue
+            path = os.path.join(root, name)
+            try:
+                files[os.path.relpath(path, doc_dir)] = os.stat(path)
+            except FileNotFoundError:
+                continue
+    return files
+
+
+def _sha256(path: str) -> Optional[str]:
+    digest = hashlib.sha256()
+    try:
+        with open(path, "rb") as f:
+            while True:
+                block = f.read(HASH_BLOCK_BYTES)
+                if not block:
+                    return digest.hexdigest()
+                digest.update(block)
+    except FileNotFoundError:
+        # Deleted between the walk and hashing
+        return None
+
+
+def scan_sync(doc_dir: str, required_exts: Optional[str] = None,
+              previous: Optional[Dict[str, Any]] = None) -> Dict[str, Dict[str, Any]]:
+    """Current manifest entries of doc_dir.
+
+    Files whose size and mtime match the previous manifest reuse its hash;
+    only the rest are read, in a thread pool (hashlib releases the GIL).
+    """
+    previous_files = (previous or {}).get("files", {})
+    entries = {}
+    to_hash = []
+    for rel_path, stat in walk_doc_dir(doc_dir, parse_exts(required_exts)).items():
+        entry = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+        old = previous_files.get(rel_path)
+        if old and old["size"] == entry["size"] and old["mtime_ns"] == entry["mtime_ns"]:
+            entry["sha256"] = old["sha256"]
+        else:
+            to_hash.append(rel_path)
+        entries[rel_path] = entry
+
+    with ThreadPoolExecutor(max_workers=HASH_WORKERS) as pool:
+        digests = pool.map(_sha256, [os.path.join(doc_dir, rel_path) for rel_path in to_hash])
+        for rel_path, digest in zip(to_hash, digests):
+            if digest is None:
+                del entries[rel_path]
+            else:
+                entries[rel_path]["sha256"] = digest
+    return entries
+
+
+def diff(previous: Optional[Dict[str, Any]], files: Dict[str, Dict[str, Any]]) -> Dict[str, Any]:
+    """Added/changed/removed paths between two manifests; a touch without a
+    content change does not count as changed."""
+    old = (previous or {}).get("files", {})
+    added = sorted(path for path in files if path not in old)
+    removed = sorted(path for path in old if path not in files)
+    changed = sorted(path for path in files if path in old and files[path]["sha256"] != old[path]["sha256"])
+    return {
+        "added": added,
+        "changed": changed,
+        "removed": removed,
+        "unchanged": len(files) - len(added) - len(changed),
+    }
+
+
+async def load_manifest(rag_name: str) -> Optional[Dict[str, Any]]:
+    path = manifest_path(rag_name)
+    if not os.path.exists(path):
+        return None
+    async with with_file_lock(path):
+        return await read_json_file(path, None)
+
+
+async def save_manifest(rag_name: str, manifest: Dict[str, Any]) -> None:
+    os.makedirs(MANIFEST_DIR, exist_ok=True)
+    path = manifest_path(rag_name)
+    async with with_file_lock(path):
+        await write_json_file(path, manifest)
+
+
+async def delete_manifest(rag_name: str) -> None:
+    try:
+        os.remove(manifest_path(rag_name))
+    except FileNotFoundError:
+        pass
+
+
+def build_settings(rag_info: Dict[str, Any]) -> Dict[str, Any]:
+    """RAG settings an index build depends on; changing any of them needs a full build."""
+    return {
+        "doc_dir": rag_info["doc_dir"],
+        "required_exts": rag_info.get("required_exts") or None,
+        "emb_model": rag_info.get("emb_model"),
+    }
+
+
+async def plan_build(rag_name: str, rag_info: Dict[str, Any],
+                     full: bool = False) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """Scan doc_dir and diff it against the manifest of the last successful build.
+
+    Returns the new manifest (to be saved once the build succeeds) and the
+    changes. Without a usable previous manifest (first build, full=True, or
+    changed build settings) every file counts as added.
+    """
+    settings = build_settings(rag_info)
+    previous = await load_manifest(rag_name)
+    if previous is not None and previous.get("settings") != settings:
+        previous = None
+    files = await asyncio.to_thread(scan_sync, settings["doc_dir"], settings["required_exts"], previous)
+    changes = diff(None if full else previous, files)
+    changes["full"] = full or previous is None
+    manifest = {
+        "settings": settings,
+        "scanned_at": time.time(),
+        "files": files,
+    }
+    return manifest, changes
+
+
+def summarize(changes: Dict[str, Any]) -> Dict[str, Any]:
+    """Counts reported with build results."""
+    return {
+        "added": len(changes["added"]),
+        "changed": len(changes["changed"]),
+        "removed": len(changes["removed"]),
+        "skipped": changes["unchanged"],
+        "reprocessed": len(changes["added"]) + len(changes["changed"]),
+        "full": changes["full"],
+    }
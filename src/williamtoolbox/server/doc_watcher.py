@@ -0,0 +1,200 @@
+import os
+import time
+import asyncio
+from typing import Any, AsyncIterator, Dict, List, Optional, Set, Tuple
+from loguru import logger
+
+from ..metrics import Counter
+from ..storage.json_file import load_rags_from_json
+from ..storage.shared_state import get_shared_state
+from .doc_manifest import parse_exts, walk_doc_dir, EXCLUDED_DIRS
+from .build_queue import build_queue
+
+# Shared-state namespace with the watch status of each RAG (readable from any worker)
+RAG_WATCHERS = "rag_watchers"
+
+DEFAULT_QUIET_SECONDS = 10.0
+DEFAULT_MIN_INTERVAL_SECONDS = 300.0
+# A directory that never goes quiet still gets a build after quiet * this
+MAX_DELAY_FACTOR = 10
+# Watcher-triggered builds yield to builds requested by hand
+WATCH_PRIORITY = -1
+
+WATCH_BUILDS = Counter("rag_watch_builds_total", "Cache builds queued by the doc_dir watcher.")
+WATCH_CHANGES = Counter("rag_watch_changes_total", "doc_dir changes seen by the watcher.", ["mode"])
+
+
+def _watched(rag_info: Dict[str, Any]) -> bool:
+    return bool(rag_info.get("auto_build") and rag_info.get("enable_hybrid_index"))
+
+
+def _settings(rag_info: Dict[str, Any]) -> Tuple:
+    return (
+        rag_info["doc_dir"],
+        rag_info.get("required_exts") or "",
+        float(rag_info.get("auto_build_quiet_seconds") or DEFAULT_QUIET_SECONDS),
+        float(rag_info.get("auto_build_min_interval_seconds", DEFAULT_MIN_INTERVAL_SECONDS)),
+    )
+
+
+def _relevant(doc_dir: str, path: str, exts: List[str]) -> Optional[str]:
+    """doc_dir-relative path of a change worth a build, or None.
+
+    Hidden entries and EXCLUDED_DIRS are ignored: a build writes its .cache
+    and extracted _images into doc_dir and must not trigger builds of itself.
+    """
+    rel_path = os.path.relpath(path, doc_dir)
+    if rel_path.startswith(".."):
+        return None
+    if any(part.startswith(".") or part in EXCLUDED_DIRS for part in rel_path.split(os.sep)):
+        return None
+    if exts and os.path.splitext(rel_path)[1].lower() not in exts:
+        return None
+    return rel_path
+
+
+class DocDirWatcher:
+    """Queues incremental cache builds when the doc_dir of a RAG changes.
+
+    Enabled per RAG with auto_build (hybrid index RAGs only). Changes are
+    collected until doc_dir has been quiet for auto_build_quiet_seconds, and
+    builds of one RAG are queued at most once per
+    auto_build_min_interval_seconds. Uses inotify through watchfiles when
+    it is installed and stat polling otherwise. Runs in the owner worker.
+    """
+
+    def __init__(self, reconcile_interval: float = 10.0, poll_interval: float = 5.0):
+        self.reconcile_interval = reconcile_interval
+        self.poll_interval = poll_interval
+        self._watches: Dict[str, Tuple[Tuple, asyncio.Task]] = {}
+
+    async def run(self):
+        """Keep one watch task per RAG with auto_build enabled."""
+        try:
+            while True:
+                try:
+                    await self.reconcile()
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    logger.error(f"doc_dir watcher error: {str(e)}")
+                await asyncio.sleep(self.reconcile_interval)
+        finally:
+            for _, task in self._watches.values():
+                task.cancel()
+            self._watches.clear()
+
+    async def reconcile(self):
+        rags = await load_rags_from_json()
+        wanted = {
+            name: _settings(info) for name, info in rags.items()
+            if _watched(info) and os.path.isdir(info["doc_dir"])
+        }
+        state = get_shared_state()
+        for name in list(self._watches):
+            settings, task = self._watches[name]
+            if wanted.get(name) != settings or task.done():
+                task.cancel()
+                del self._watches[name]
+                if name not in wanted:
+                    await state.delete(RAG_WATCHERS, name)
+                    logger.info(f"Stopped watching doc_dir of {name}")
+        for name, settings in wanted.items():
+            if name not in self._watches:
+                self._watches[name] = (settings, asyncio.create_task(self._watch(name, settings)))
+                logger.info(f"Watching doc_dir of {name}: {settings[0]}")
+
+    @staticmethod
+    def _awatch():
+        try:
+            from watchfiles import awatch
+        except ImportError:
+            return None
+        return awatch
+
+    async def _changes(self, doc_dir: str, exts: List[str]) -> AsyncIterator[Set[str]]:
+        """Yield batches of changed doc_dir-relative paths."""
+        awatch = self._awatch()
+        if awatch is not None:
+            async for changes in awatch(doc_dir, debounce=200):
+                paths = {_relevant(doc_dir, path, exts) for _, path in changes}
+                paths.discard(None)
+                if paths:
+                    yield paths
+            return
+
+        previous = await asyncio.to_thread(self._snapshot, doc_dir, exts)
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            current = await asyncio.to_thread(self._snapshot, doc_dir, exts)
+            paths = {path for path in current.keys() | previous.keys() if current.get(path) != previous.get(path)}
+            previous = current
+            if paths:
+                yield paths
+
+    @staticmethod
+    def _snapshot(doc_dir: str, exts: List[str]) -> Dict[str, Tuple[int, int]]:
+        return {
+            rel_path: (stat.st_size, stat.st_mtime_ns)
+            for rel_path, stat in walk_doc_dir(doc_dir, exts).items()
+        }
+
+    async def _watch(self, rag_name: str, settings: Tuple):
+        doc_dir, required_exts, quiet, min_interval = settings
+        exts = parse_exts(required_exts)
+        state = get_shared_state()
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue()
+        mode = "inotify" if self._awatch() is not None else "polling"
+        status = {"doc_dir": doc_dir, "mode": mode, "pending": 0, "last_change_at": None, "last_build_at": None,
+                  "quiet_seconds": quiet, "min_interval_seconds": min_interval}
+
+        async def produce():
+            try:
+                async for paths in self._changes(doc_dir, exts):
+                    WATCH_CHANGES.inc(len(paths), mode=mode)
+                    await queue.put(paths)
+            except Exception as e:
+                # Ends this watch; reconcile() starts a new one
+                await queue.put(e)
+
+        producer = asyncio.create_task(produce())
+        pending: Set[str] = set()
+        first_change = last_change = 0.0
+        last_build = -min_interval
+        try:
+            await state.set(RAG_WATCHERS, rag_name, status)
+            while True:
+                timeout = None
+                if pending:
+                    settled = min(last_change + quiet, first_change + quiet * MAX_DELAY_FACTOR)
+                    timeout = max(0.0, max(settled, last_build + min_interval) - loop.time())
+                try:
+                    paths = await asyncio.wait_for(queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    job, _ = await build_queue.enqueue(rag_name, priority=WATCH_PRIORITY, trigger="watch",
+                                                       paths=sorted(pending))
+                    WATCH_BUILDS.inc()
+                    logger.info(f"doc_dir of {rag_name} changed ({len(pending)} paths), queued build {job['job_id']}")
+                    last_build = loop.time()
+                    pending.clear()
+                    status.update(pending=0, last_build_at=time.time(), last_job_id=job["job_id"])
+                    await state.set(RAG_WATCHERS, rag_name, status)
+                    continue
+                if isinstance(paths, Exception):
+                    logger.warning(f"Watching doc_dir of {rag_name} failed: {str(paths)}")
+                    return
+                if not pending:
+                    first_change = loop.time()
+                pending |= paths
+                last_change = loop.time()
+                status.update(pending=len(pending), last_change_at=time.time())
+                await state.set(RAG_WATCHERS, rag_name, status)
+        finally:
+            producer.cancel()
+
+    async def table(self) -> Dict[str, Any]:
+        return await get_shared_state().items(RAG_WATCHERS)
+
+
+doc_watcher = DocDirWatcher()
@@ -1,14 +1,19 @@
-from fastapi import APIRouter, HTTPException, UploadFile, File
-from typing import List, Dict
+from fastapi import APIRouter, HTTPException, UploadFile, File, Query, Request, Header
+from typing import List, Dict, Optional
 import os
-import aiofiles
+import asyncio
 import uuid
 from ..storage.json_file import with_file_lock
+from .doc_index import doc_index
+from .build_queue import build_queue
+from .archive_ingest import spool, ingest
+from .request_types import UploadInitRequest
+from . import uploads
 from loguru import logger
 
 router = APIRouter()
 
-from ..storage.json_file import load_rags_from_json
+from ..storage.json_file import load_rags_from_json, set_rag_fields
 
 async def ensure_rag_dir(rag_name: str):
     """确保RAG目录存在"""
@@ -29,43 +34,58 @@ async def get_rag_files(rag_name: str):
     """获取RAG文件列表"""
     try:
         rag_dir = await ensure_rag_dir(rag_name)
-        files = []
-        for root, dirs, filenames in os.walk(rag_dir):
-            # 过滤掉 _images 和 .cache 目录
-            dirs[:] = [d for d in dirs if d not in ["_images", ".cache"]]
-            for filename in filenames:
-                file_path = os.path.join(root, filename)
-                if os.path.isfile(file_path):
-                    stat = os.stat(file_path)
-                    relative_path = os.path.relpath(file_path, rag_dir)
-                    # 过滤掉 _images 和 .cache 目录下的文件
-                    if not any(part in ["_images", ".cache"] for part in relative_path.split(os.sep)):
-                        files.append({
-                            "name": relative_path,
-                            "size": f"{stat.st_size / 1024:.2f} KB",
-                            "modified": stat.st_mtime
-                        })
-        return files
+        # 从缓存的索引读取（过滤掉 _images 和 .cache 目录），不在事件循环里遍历目录
+        listing = await doc_index.query(rag_dir, limit=2**31)
+        return [
+            {
+                "name": item["name"],
+                "size": f"{item['size'] / 1024:.2f} KB",
+                "modified": item["modified"]
+            }
+            for item in listing["items"]
+        ]
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error getting files for RAG {rag_name}: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.get("/rags/{rag_name}/files/index")
+async def get_rag_files_page(
+    rag_name: str,
+    sort: str = Query("name", pattern="^(name|size|modified|ext)$"),
+    order: str = Query("asc", pattern="^(asc|desc)$"),
+    prefix: Optional[str] = None,
+    glob: Optional[str] = None,
+    ext: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = None,
+):
+    """分页获取RAG文件列表，附带按扩展名的文件数和总大小"""
+    rag_dir = await ensure_rag_dir(rag_name)
+    try:
+        return await doc_index.query(rag_dir, sort=sort, order=order, prefix=prefix, glob=glob,
+                                     ext=ext, limit=limit, cursor=cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
 @router.post("/rags/{rag_name}/upload")
 async def upload_file_to_rag(rag_name: str, file: UploadFile = File(...)):
     """上传文件到RAG"""
     try:
         rag_dir = await ensure_rag_dir(rag_name)
         # 保持原始文件名
-        file_path = os.path.join(rag_dir, file.filename)
-        
-        # 确保目录存在
-        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        file_path = uploads.resolve_target(rag_dir, file.filename)
         
-        # 异步写入文件
-        async with aiofiles.open(file_path, "wb") as f:
-            await f.write(await file.read())
+        # 分块写入临时文件后原子重命名，不把整个文件读进内存
+        await uploads.save_upload(file, file_path)
+        await doc_index.touch(rag_dir, file.filename)
         
         return {"filename": file.filename}
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"Error uploading file to RAG {rag_name}: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -81,7 +101,105 @@ async def delete_rag_file(rag_name: str, filename: str):
             raise HTTPException(status_code=404, detail="File not found")
         
         os.remove(file_path)
+        await doc_index.touch(rag_dir, filename)
         return {"message": "File deleted successfully"}
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error deleting file {filename} from RAG {rag_name}: {str(e)}")
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
+
+# 可断点续传的分块上传：init -> PUT chunk N（任意顺序，可重试）-> complete
+def _upload_error(e: Exception) -> HTTPException:
+    if isinstance(e, LookupError):
+        return HTTPException(status_code=404, detail=str(e))
+    return HTTPException(status_code=400, detail=str(e))
+
+@router.post("/rags/{rag_name}/uploads")
+async def init_rag_upload(rag_name: str, request: UploadInitRequest):
+    """创建分块上传会话"""
+    rag_dir = await ensure_rag_dir(rag_name)
+    try:
+        session = await uploads.create_session(rag_name, rag_dir, request.filename, request.size,
+                                               request.chunk_size, request.sha256)
+    except ValueError as e:
+        raise _upload_error(e)
+    return uploads.session_status(session)
+
+@router.get("/rags/{rag_name}/uploads/{upload_id}")
+async def get_rag_upload(rag_name: str, upload_id: str):
+    """查询上传进度（已收到/缺失的分块），用于断点续传"""
+    try:
+        return uploads.session_status(await uploads.load_session(upload_id, rag_name))
+    except LookupError as e:
+        raise _upload_error(e)
+
+@router.put("/rags/{rag_name}/uploads/{upload_id}/chunks/{index}")
+async def put_rag_upload_chunk(rag_name: str, upload_id: str, index: int, request: Request,
+                               x_chunk_sha256: Optional[str] = Header(default=None)):
+    """上传第 index 个分块（请求体为原始字节），可选 X-Chunk-Sha256 校验"""
+    try:
+        session = await uploads.put_chunk(upload_id, rag_name, index, request.stream(), x_chunk_sha256)
+    except (LookupError, ValueError) as e:
+        raise _upload_error(e)
+    return uploads.session_status(session)
+
+@router.post("/rags/{rag_name}/uploads/{upload_id}/complete")
+async def complete_rag_upload(rag_name: str, upload_id: str):
+    """合并分块并校验整个文件的 sha256"""
+    rag_dir = await ensure_rag_dir(rag_name)
+    try:
+        result = await uploads.complete_session(upload_id, rag_name)
+    except (LookupError, ValueError) as e:
+        raise _upload_error(e)
+    await doc_index.touch(rag_dir, os.path.relpath(result.pop("path"), rag_dir))
+    logger.info(f"Upload {upload_id} to RAG {rag_name} completed: {result['filename']} ({result['size']} bytes)")
+    return result
+
+@router.delete("/rags/{rag_name}/uploads/{upload_id}")
+async def abort_rag_upload(rag_name: str, upload_id: str):
+    """取消上传并删除已收到的分块"""
+    try:
+        await uploads.abort_session(upload_id, rag_name)
+    except LookupError as e:
+        raise _upload_error(e)
+    return {"message": "Upload aborted"}
+
+@router.post("/rags/{rag_name}/archive")
+async def ingest_archive_to_rag(
+    rag_name: str,
+    request: Request,
+    subdir: Optional[str] = None,
+    strip_components: int = Query(0, ge=0),
+    build: bool = False,
+):
+    """批量导入：请求体为 zip / tar / tar.gz 压缩包（流式写盘），解压到 doc_dir
+
+    遵循 required_exts，内容未变化的文件不会被覆盖；build=true 时在有文件变化后
+    排队一次增量索引构建。
+    """
+    rag_dir = await ensure_rag_dir(rag_name)
+    rags = await load_rags_from_json()
+    rag_info = rags[rag_name]
+    if build and not rag_info.get("enable_hybrid_index"):
+        raise HTTPException(status_code=400, detail="Only RAGs with hybrid index enabled can build cache")
+    try:
+        archive_path = await spool(request.stream())
+        result = await ingest(rag_name, archive_path, rag_dir, rag_info.get("required_exts"),
+                              strip_components, subdir)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error ingesting archive into RAG {rag_name}: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+    # 让文件列表索引立刻看到新文件
+    await asyncio.to_thread(doc_index.get(rag_dir).refresh, True)
+    result["build"] = None
+    changed = [f["path"] for f in result["files"] if f["status"] in ("added", "updated")]
+    if build and changed:
+        job, created = await build_queue.enqueue(rag_name, trigger="archive", paths=changed)
+        # 解压可能持续数分钟，期间的启停不能被旧快照覆盖，只更新这一字段
+        await set_rag_fields(rag_name, cache_build_task_id=job["job_id"])
+        result["build"] = {"task_id": job["job_id"], "created": created}
+    return result
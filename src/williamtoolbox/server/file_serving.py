@@ -0,0 +1,154 @@
+import asyncio
+import hashlib
+import mimetypes
+import os
+from email.utils import formatdate, parsedate_to_datetime
+from typing import List, Optional, Tuple
+from urllib.parse import unquote
+
+from fastapi import Request
+from fastapi.responses import FileResponse, Response
+from loguru import logger
+
+from ..storage.json_file import RAGS_JSON_PATH, load_rags_from_json
+
+# Images under doc_dir/_images are content produced by the RAG build and do not
+# change in place, so browsers and CDNs may keep them for a day and revalidate.
+IMAGE_CACHE_CONTROL = "public, max-age=86400"
+IMAGES_DIR_NAME = "_images"
+
+
+class ImageRoots:
+    """Directories images may be served from: every RAG doc_dir.
+
+    The list is rebuilt only when rags.json changes on disk, so per-image
+    requests do not re-read the registry.
+    """
+
+    def __init__(self):
+        self._mtime: Optional[float] = None
+        self._roots: List[str] = []
+        self._lock: Optional[asyncio.Lock] = None
+
+    async def get(self) -> List[str]:
+        try:
+            mtime = os.stat(RAGS_JSON_PATH).st_mtime
+        except FileNotFoundError:
+            return []
+        if mtime == self._mtime:
+            return self._roots
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            if mtime != self._mtime:
+                rags = await load_rags_from_json()
+                roots = [
+                    os.path.realpath(rag_info["doc_dir"])
+                    for rag_info in rags.values()
+                    if rag_info.get("doc_dir")
+                ]
+                self._roots = roots
+                self._mtime = mtime
+        return self._roots
+
+
+image_roots = ImageRoots()
+
+
+def request_path_to_file_path(full_path: str) -> str:
+    """Map the catch-all URL path to an absolute filesystem path."""
+    # 获取文件的完整路径，并进行URL解码
+    file_path = unquote(full_path)
+    # 使用 os.path.normpath 来标准化路径，自动处理不同操作系统的路径分隔符
+    file_path = os.path.normpath(file_path)
+    if not os.path.isabs(file_path):
+        file_path = os.path.join("/", file_path)
+    return file_path
+
+
+def scoped_image_path(file_path: str, roots: List[str]) -> Optional[str]:
+    """Resolve file_path and return it only if it lies in an _images directory
+    below one of roots. Symlinks are resolved before the check."""
+    real_path = os.path.realpath(file_path)
+    for root in roots:
+        try:
+            if os.path.commonpath([root, real_path]) != root:
+                continue
+        except ValueError:
+            # Different drives on Windows
+            continue
+        relative_parts = os.path.relpath(real_path, root).split(os.sep)
+        if IMAGES_DIR_NAME in relative_parts[:-1]:
+            return real_path
+    return None
+
+
+def file_etag(stat_result: os.stat_result) -> str:
+    etag_base = f"{stat_result.st_mtime}-{stat_result.st_size}"
+    return f'"{hashlib.md5(etag_base.encode()).hexdigest()}"'
+
+
+def is_not_modified(request: Request, etag: str, mtime: float) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        candidates = [tag.strip() for tag in if_none_match.split(",")]
+        return "*" in candidates or etag in candidates or f"W/{etag}" in candidates
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since:
+        try:
+            since = parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+        return int(mtime) <= since
+    return False
+
+
+def _stat_file(file_path: str) -> Tuple[str, os.stat_result]:
+    stat_result = os.stat(file_path)
+    if not os.path.isfile(file_path):
+        raise FileNotFoundError(file_path)
+    return file_path, stat_result
+
+
+async def file_response(
+    request: Request,
+    file_path: str,
+    cache_control: str = IMAGE_CACHE_CONTROL,
+    media_type: Optional[str] = None,
+) -> Response:
+    """Stream a file with ETag/Last-Modified validation and Range support.
+
+    The stat runs in a worker thread and the body is sent by FileResponse,
+    which streams in chunks (or uses the server's zero-copy pathsend) and
+    honours Range/If-Range, so large files never block the event loop.
+    """
+    file_path, stat_result = await asyncio.to_thread(_stat_file, file_path)
+    etag = file_etag(stat_result)
+    headers = {
+        "etag": etag,
+        "last-modified": formatdate(stat_result.st_mtime, usegmt=True),
+        "cache-control": cache_control,
+    }
+    if is_not_modified(request, etag, stat_result.st_mtime):
+        return Response(status_code=304, headers=headers)
+
+    if media_type is None:
+        media_type, _ = mimetypes.guess_type(file_path)
+    return FileResponse(
+        file_path,
+        media_type=media_type or "application/octet-stream",
+        headers=headers,
+        stat_result=stat_result,
+    )
+
+
+async def resolve_image_request(full_path: str) -> Optional[str]:
+    """Return the on-disk image for a catch-all URL, or None if it is outside
+    every RAG's _images directory."""
+    file_path = request_path_to_file_path(full_path)
+    roots = await image_roots.get()
+    if not roots:
+        logger.warning(f"Refusing to serve {file_path}: no RAG doc_dir is registered")
+        return None
+    return await asyncio.to_thread(scoped_image_path, file_path, roots)
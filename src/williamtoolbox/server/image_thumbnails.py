@@ -0,0 +1,176 @@
+import asyncio
+import hashlib
+import importlib.util
+import os
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Optional, Tuple
+
+from loguru import logger
+
+# Derivatives of doc_dir/_images files (resized and/or re-encoded) live here,
+# keyed by source path, mtime, size, width and format.
+IMAGE_CACHE_DIR = os.path.join("data", "image_cache")
+IMAGE_CACHE_MAX_BYTES = int(
+    os.environ.get("WILLIAM_TOOLBOX_IMAGE_CACHE_MAX_BYTES", 512 * 1024 * 1024)
+)
+
+# Requested widths are rounded up to one of these so arbitrary ?w= values
+# cannot fill the cache with near-identical variants.
+WIDTH_BUCKETS = [64, 128, 256, 320, 480, 640, 800, 1024, 1280, 1600, 1920, 2560]
+
+FORMATS = {
+    "webp": ("WEBP", "webp", "image/webp"),
+    "jpeg": ("JPEG", "jpg", "image/jpeg"),
+    "jpg": ("JPEG", "jpg", "image/jpeg"),
+    "png": ("PNG", "png", "image/png"),
+}
+
+
+class ThumbnailUnavailable(Exception):
+    """Raised when derivatives cannot be produced (e.g. Pillow is missing)."""
+
+
+def snap_width(width: int) -> int:
+    for bucket in WIDTH_BUCKETS:
+        if width <= bucket:
+            return bucket
+    return WIDTH_BUCKETS[-1]
+
+
+def _render_derivative(src_path: str, dest_path: str, width: Optional[int], pil_format: Optional[str]) -> int:
+    """Runs in a worker process: resize src_path and write it to dest_path."""
+    from PIL import Image
+
+    with Image.open(src_path) as image:
+        image_format = pil_format or image.format or "PNG"
+        if width and image.width > width:
+            height = max(1, round(image.height * width / image.width))
+            image = image.resize((width, height), Image.LANCZOS)
+        if image_format == "JPEG" and image.mode not in ("RGB", "L"):
+            image = image.convert("RGB")
+        tmp_path = f"{dest_path}.{uuid.uuid4().hex}.tmp"
+        save_kwargs = {"quality": 82} if image_format in ("JPEG", "WEBP") else {}
+        image.save(tmp_path, format=image_format, **save_kwargs)
+    os.replace(tmp_path, dest_path)
+    return os.path.getsize(dest_path)
+
+
+class ThumbnailCache:
+    """On-disk derivative cache with LRU eviction by total bytes."""
+
+    def __init__(self, cache_dir: str = IMAGE_CACHE_DIR, max_bytes: int = IMAGE_CACHE_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, int]" = OrderedDict()
+        self._total_bytes = 0
+        self._loaded = False
+        self._load_lock: Optional[asyncio.Lock] = None
+        self._pending: Dict[str, asyncio.Future] = {}
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    def _executor_or_create(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=min(4, os.cpu_count() or 1))
+        return self._executor
+
+    def _scan_index(self) -> "OrderedDict[str, int]":
+        """LRU order of the files already on disk (oldest access first)."""
+        os.makedirs(self.cache_dir, exist_ok=True)
+        files = []
+        for entry in os.scandir(self.cache_dir):
+            if entry.is_file() and not entry.name.endswith(".tmp"):
+                stat = entry.stat()
+                files.append((stat.st_atime, entry.name, stat.st_size))
+        return OrderedDict((name, size) for _, name, size in sorted(files))
+
+    async def _load_index(self):
+        # Concurrent first requests share one scan instead of each adding it
+        if self._load_lock is None:
+            self._load_lock = asyncio.Lock()
+        async with self._load_lock:
+            if self._loaded:
+                return
+            self._entries = await asyncio.to_thread(self._scan_index)
+            self._total_bytes = sum(self._entries.values())
+            self._loaded = True
+
+    def _evict(self):
+        while self._total_bytes > self.max_bytes and len(self._entries) > 1:
+            name, size = self._entries.popitem(last=False)
+            self._total_bytes -= size
+            try:
+                os.remove(os.path.join(self.cache_dir, name))
+            except FileNotFoundError:
+                pass
+
+    @staticmethod
+    def cache_key(src_path: str, stat_result: os.stat_result, width: Optional[int], fmt: str) -> str:
+        key_base = f"{src_path}|{stat_result.st_mtime_ns}|{stat_result.st_size}|{width or 0}|{fmt}"
+        return hashlib.sha256(key_base.encode()).hexdigest()
+
+    async def get(self, src_path: str, width: Optional[int], fmt: Optional[str]) -> Tuple[str, str]:
+        """Return (derivative_path, media_type), generating it on first use."""
+        if fmt is not None and fmt not in FORMATS:
+            raise ValueError(f"Unsupported format: {fmt}")
+        if width is not None:
+            width = snap_width(max(1, width))
+
+        if not self._loaded:
+            await self._load_index()
+
+        stat_result = await asyncio.to_thread(os.stat, src_path)
+        if fmt is None:
+            ext = os.path.splitext(src_path)[1].lstrip(".").lower()
+            fmt = ext if ext in FORMATS else "png"
+        pil_format, ext, media_type = FORMATS[fmt]
+        name = f"{self.cache_key(src_path, stat_result, width, fmt)}.{ext}"
+        dest_path = os.path.join(self.cache_dir, name)
+
+        if name in self._entries and os.path.exists(dest_path):
+            self._entries.move_to_end(name)
+            return dest_path, media_type
+
+        pending = self._pending.get(name)
+        if pending is None:
+            pending = asyncio.get_running_loop().create_future()
+            self._pending[name] = pending
+            try:
+                size = await self._render(src_path, dest_path, width, pil_format)
+                # An entry whose file was removed behind our back is replaced, not counted twice
+                self._total_bytes += size - self._entries.pop(name, 0)
+                self._entries[name] = size
+                self._evict()
+                pending.set_result(None)
+            except BaseException as e:
+                pending.set_exception(e)
+                pending.exception()
+                raise
+            finally:
+                self._pending.pop(name, None)
+        else:
+            await asyncio.shield(pending)
+        return dest_path, media_type
+
+    async def _render(self, src_path: str, dest_path: str, width: Optional[int], pil_format: str) -> int:
+        if importlib.util.find_spec("PIL") is None:
+            raise ThumbnailUnavailable("Pillow is not installed")
+        loop = asyncio.get_running_loop()
+        logger.debug(f"Rendering derivative of {src_path} (w={width}, format={pil_format})")
+        return await loop.run_in_executor(
+            self._executor_or_create(), _render_derivative, src_path, dest_path, width, pil_format
+        )
+
+    def startup(self):
+        # find_spec only locates the package; Pillow is imported by the renderer
+        if importlib.util.find_spec("PIL") is None:
+            logger.warning("Pillow is not installed: ?w= and ?fmt= image requests will get the original image")
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+thumbnail_cache = ThumbnailCache()
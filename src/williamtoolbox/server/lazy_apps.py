@@ -0,0 +1,133 @@
+import os
+import asyncio
+import importlib
+import time
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+from fastapi import FastAPI
+from loguru import logger
+
+# Backend apps: name -> (router modules, URL prefixes served by them).
+# Modules are imported, and their routers included, the first time a request
+# hits one of the prefixes, so heavy dependencies (autocoder, byzerllm, docx,
+# git, ...) are only paid for by deployments that use them. Modules listed
+# together keep their original include order, which matters where path
+# templates overlap (e.g. POST /rags/{name}/upload vs /rags/{name}/{action}).
+BACKEND_APPS: Dict[str, Tuple[List[str], List[str]]] = {
+    "chat": ([".chat_router"], ["/chat/ask", "/chat/conversations", "/chat/extract_csv"]),
+    "rag": ([".file_router", ".rag_router"], ["/rags"]),
+    "models": ([".model_router"], ["/models"]),
+    "openai_service": ([".openai_service_router"], ["/openai-compatible-service"]),
+    "config": ([".config_router"], ["/config"]),
+    "auto_coder_chat": ([".auto_coder_chat_router"], ["/auto-coder-chat"]),
+    "super_analysis": ([".super_analysis_router"], ["/super-analysis"]),
+    "byzer_sql": ([".byzer_sql_router"], ["/byzer-sql", "/run/script", "/api/download-progress"]),
+    "users": ([".user_router"], ["/api/login", "/api/change-password", "/api/users"]),
+    "annotation": ([".apps.annotation_router"], ["/api/annotations"]),
+    "openapi": ([".openapi_router"], ["/api-keys", "/api/public"]),
+    "search": ([".search_router"], ["/chat/search"]),
+    "bulk": ([".bulk_router"], ["/bulk"]),
+    "logs": ([".log_router"], ["/logs"]),
+}
+
+ENABLED_APPS_ENV = "WILLIAM_TOOLBOX_ENABLED_APPS"
+EAGER_APPS_ENV = "WILLIAM_TOOLBOX_EAGER_APPS"
+
+# Requests for the API docs need every enabled router to describe them
+DOCS_PATHS = {"/docs", "/redoc", "/openapi.json"}
+
+CATCH_ALL_PATH = "/{full_path:path}"
+
+
+def parse_enabled_apps(value: Optional[str]) -> List[str]:
+    """Parse a comma separated app list; empty or "all" selects every app."""
+    if not value or value.strip() == "all":
+        return list(BACKEND_APPS)
+    names = [name.strip() for name in value.split(",") if name.strip()]
+    unknown = [name for name in names if name not in BACKEND_APPS]
+    if unknown:
+        raise ValueError(
+            f"Unknown app(s): {', '.join(unknown)}. Available: {', '.join(BACKEND_APPS)}"
+        )
+    return names
+
+
+class LazyAppLoader:
+    """Includes backend routers into an app on first use."""
+
+    def __init__(self, app: FastAPI, package: str = __package__):
+        self.app = app
+        self.package = package
+        self.enabled: Set[str] = set(BACKEND_APPS)
+        self.loaded: Dict[str, float] = {}
+        self._lock: Optional[asyncio.Lock] = None
+
+    def configure_from_env(self) -> bool:
+        """Read the enabled app set; returns whether apps should load eagerly."""
+        self.enabled = set(parse_enabled_apps(os.environ.get(ENABLED_APPS_ENV)))
+        return os.environ.get(EAGER_APPS_ENV, "") in ("1", "true", "True")
+
+    def apps_for_path(self, path: str) -> List[str]:
+        if path in DOCS_PATHS:
+            return [name for name in BACKEND_APPS if name in self.enabled]
+        matches = []
+        for name, (_, prefixes) in BACKEND_APPS.items():
+            if name not in self.enabled or name in self.loaded:
+                continue
+            if any(path == prefix or path.startswith(prefix + "/") for prefix in prefixes):
+                matches.append(name)
+        return matches
+
+    def _include(self, name: str, start: float):
+        modules, _ = BACKEND_APPS[name]
+        for module_name in modules:
+            module = importlib.import_module(module_name, self.package)
+            self.app.include_router(module.router)
+        self.loaded[name] = time.perf_counter() - start
+
+        # Keep the _images catch-all behind every real route
+        routes = self.app.router.routes
+        catch_all = [route for route in routes if getattr(route, "path", None) == CATCH_ALL_PATH]
+        for route in catch_all:
+            routes.remove(route)
+            routes.append(route)
+        self.app.openapi_schema = None
+        logger.info(f"Loaded backend app '{name}' in {self.loaded[name]:.2f}s")
+
+    async def ensure_loaded(self, names: Iterable[str]):
+        pending = [name for name in names if name not in self.loaded]
+        if not pending:
+            return
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            for name in pending:
+                if name not in self.loaded:
+                    start = time.perf_counter()
+                    # Imports can take seconds; keep the event loop responsive
+                    for module_name in BACKEND_APPS[name][0]:
+                        await asyncio.to_thread(importlib.import_module, module_name, self.package)
+                    self._include(name, start)
+
+    async def startup(self):
+        eager = self.configure_from_env()
+        if eager:
+            await self.ensure_loaded([name for name in BACKEND_APPS if name in self.enabled])
+        logger.info(
+            f"Backend apps enabled: {', '.join(sorted(self.enabled))} "
+            f"({'eager' if eager else 'loaded on first use'})"
+        )
+
+
+class LazyAppMiddleware:
+    """ASGI middleware that triggers LazyAppLoader before routing a request."""
+
+    def __init__(self, app, loader: LazyAppLoader):
+        self.app = app
+        self.loader = loader
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] in ("http", "websocket"):
+            names = self.loader.apps_for_path(scope["path"])
+            if names:
+                await self.loader.ensure_loaded(names)
+        await self.app(scope, receive, send)
@@ -0,0 +1,232 @@
+import os
+import re
+import gzip
+import time
+import shutil
+import asyncio
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+from loguru import logger
+
+from ..metrics import Counter
+from ..storage.json_file import LOG_POLICIES_JSON_PATH, load_log_policies, modify_json_file
+
+LOGS_DIR = "logs"
+
+# Applied to every logs/<name>.out|.err; log_policies.json can override it
+# under "default" or per service under "services": {"<name>": {...}}.
+DEFAULT_POLICY = {
+    "max_bytes": 50 * 1024 * 1024,
+    "max_age_hours": 24,
+    "keep": 10,
+    "max_total_bytes": 500 * 1024 * 1024,
+    "compression": "gzip",  # gzip | zstd | none
+}
+LOG_SUFFIXES = (".out", ".err")
+
+# <log>.<YYYYmmdd-HHMMSS>[-n][.gz|.zst]
+SEGMENT_RE = re.compile(r"\.(\d{8}-\d{6})(?:-(\d+))?(\.gz|\.zst)?$")
+
+LOG_ROTATIONS = Counter("log_rotations_total", "Service log files rotated.", ["reason"])
+LOG_SEGMENTS_REMOVED = Counter("log_segments_removed_total", "Rotated log segments deleted by retention.")
+
+
+def policy_for(policies: Dict[str, Any], log_name: str) -> Dict[str, Any]:
+    return {
+        **DEFAULT_POLICY,
+        **policies.get("default", {}),
+        **policies.get("services", {}).get(log_name, {}),
+    }
+
+
+def segment_paths(path: str) -> List[str]:
+    """Rotated segments of a log file, oldest first."""
+    directory, base = os.path.split(path)
+    try:
+        names = os.listdir(directory or ".")
+    except FileNotFoundError:
+        return []
+    segments = []
+    for name in names:
+        if not name.startswith(base + "."):
+            continue
+        match = SEGMENT_RE.fullmatch(name[len(base):])
+        if match:
+            segments.append((match.group(1), int(match.group(2) or 0), os.path.join(directory, name)))
+    return [segment for _, _, segment in sorted(segments)]
+
+
+def _zstd():
+    try:
+        import zstandard
+    except ImportError:
+        return None
+    return zstandard
+
+
+def _open_segment_writer(dest: str, compression: str, size: int):
+    if compression == "zstd":
+        zstandard = _zstd()
+        if zstandard is not None:
+            raw = open(dest + ".zst", "wb")
+            # Record the content size so readers can tell it without decompressing
+            return zstandard.ZstdCompressor(level=3).stream_writer(raw, size=size, closefd=True), dest + ".zst"
+        logger.warning("zstandard is not installed, compressing log segments with gzip")
+        compression = "gzip"
+    if compression == "gzip":
+        return gzip.open(dest + ".gz", "wb", compresslevel=6), dest + ".gz"
+    return open(dest, "wb"), dest
+
+
+def rotate_sync(path: str, compression: str = "gzip") -> Optional[str]:
+    """Copy the log into a (compressed) segment, then truncate it in place.
+
+    copytruncate keeps working while the service still has the file open:
+    children write with O_APPEND, so after the truncation they simply
+    continue at the new end. Lines written between the copy and the
+    truncation are lost, as with logrotate's copytruncate.
+    """
+    try:
+        size = os.path.getsize(path)
+    except FileNotFoundError:
+        return None
+    if size == 0:
+        return None
+    stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+    dest = f"{path}.{stamp}"
+    counter = 1
+    while any(os.path.exists(dest + suffix) for suffix in ("", ".gz", ".zst")):
+        dest = f"{path}.{stamp}-{counter}"
+        counter += 1
+
+    writer, segment = _open_segment_writer(dest, compression, size)
+    with open(path, "r+b") as source:
+        with writer:
+            # Read to EOF, not to `size`, to keep the loss window small
+            shutil.copyfileobj(source, writer, 1024 * 1024)
+        source.truncate(0)
+    return segment
+
+
+def apply_retention_sync(path: str, keep: int, max_total_bytes: int) -> List[str]:
+    """Delete the oldest segments beyond `keep` or beyond max_total_bytes."""
+    segments = segment_paths(path)
+    removed = []
+    sizes = {segment: os.path.getsize(segment) for segment in segments}
+    total = sum(sizes.values())
+    for segment in segments:
+        if len(segments) - len(removed) <= keep and total <= max_total_bytes:
+            break
+        try:
+            os.remove(segment)
+        except FileNotFoundError:
+            pass
+        removed.append(segment)
+        total -= sizes[segment]
+    return removed
+
+
+class LogRotator:
+    """Size- and time-based rotation of logs/<name>.out|.err.
+
+    The owner worker checks every log each `interval` seconds; services
+    about to be started are checked right before their log is opened.
+    """
+
+    def __init__(self, log_dir: str = LOGS_DIR, interval: float = 60.0):
+        self.log_dir = log_dir
+        self.interval = interval
+        # path -> when its current segment started (first seen, or last rotation)
+        self._since: Dict[str, float] = {}
+
+    def _segment_started(self, path: str) -> float:
+        if path not in self._since:
+            segments = segment_paths(path)
+            self._since[path] = os.path.getmtime(segments[-1]) if segments else time.time()
+        return self._since[path]
+
+    def _check_sync(self, path: str, policy: Dict[str, Any], force: bool = False) -> Optional[str]:
+        try:
+            size = os.path.getsize(path)
+        except FileNotFoundError:
+            return None
+        reason = None
+        if force:
+            reason = "restart"
+        elif size >= policy["max_bytes"]:
+            reason = "size"
+        elif size > 0 and policy["max_age_hours"] and \
+                time.time() - self._segment_started(path) >= policy["max_age_hours"] * 3600:
+            reason = "age"
+        if reason is None:
+            return None
+        segment = rotate_sync(path, policy["compression"])
+        self._since[path] = time.time()
+        if segment is not None:
+            LOG_ROTATIONS.inc(reason=reason)
+            logger.info(f"Rotated {path} ({reason}) -> {segment}")
+        removed = apply_retention_sync(path, policy["keep"], policy["max_total_bytes"])
+        if removed:
+            LOG_SEGMENTS_REMOVED.inc(len(removed))
+        return segment
+
+    async def check(self, log_name: str, force: bool = False) -> None:
+        """Rotate logs/<log_name>.out/.err if their policy says so.
+
+        force archives whatever the logs hold; used when a service is
+        (re)started so every run begins with an empty log, as before.
+        """
+        policy = policy_for(await load_log_policies(), log_name)
+        for suffix in LOG_SUFFIXES:
+            path = os.path.join(self.log_dir, log_name + suffix)
+            await asyncio.to_thread(self._check_sync, path, policy, force)
+
+    def _delete_sync(self, log_name: str) -> List[str]:
+        removed = []
+        for suffix in LOG_SUFFIXES:
+            path = os.path.join(self.log_dir, log_name + suffix)
+            for candidate in [path] + segment_paths(path):
+                try:
+                    os.remove(candidate)
+                except FileNotFoundError:
+                    continue
+                removed.append(candidate)
+            self._since.pop(path, None)
+        return removed
+
+    async def delete(self, log_name: str) -> List[str]:
+        """Delete the logs of a removed service: current files, rotated
+        segments and its entry in log_policies.json."""
+        removed = await asyncio.to_thread(self._delete_sync, log_name)
+        await modify_json_file(
+            LOG_POLICIES_JSON_PATH,
+            lambda policies: policies.get("services", {}).pop(log_name, None) is not None,
+        )
+        return removed
+
+    async def run_once(self) -> None:
+        policies = await load_log_policies()
+
+        def scan():
+            if not os.path.isdir(self.log_dir):
+                return
+            for entry in os.scandir(self.log_dir):
+                name, suffix = os.path.splitext(entry.name)
+                if suffix in LOG_SUFFIXES and entry.is_file():
+                    self._check_sync(entry.path, policy_for(policies, name))
+
+        await asyncio.to_thread(scan)
+
+    async def run(self):
+        """Rotation loop; registered on the owner lease so it runs in one worker."""
+        while True:
+            try:
+                await self.run_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Log rotation failed: {str(e)}")
+            await asyncio.sleep(self.interval)
+
+
+log_rotator = LogRotator()
@@ -0,0 +1,158 @@
+import re
+import json
+import os
+import asyncio
+from typing import Optional
+from fastapi import APIRouter, HTTPException, Request
+from sse_starlette.sse import EventSourceResponse
+
+from ..storage.json_file import (
+    load_rags_from_json,
+    load_super_analysis_from_json,
+    load_byzer_sql_from_json,
+    load_log_policies,
+    save_log_policies,
+)
+from .log_tail import read_chunk, tail_lines, grep, follow, log_size, MAX_CHUNK_BYTES
+from .log_rotation import DEFAULT_POLICY, policy_for, segment_paths
+from .request_types import LogPolicyRequest
+
+router = APIRouter()
+
+SERVICE_LOG_TYPES = ("out", "err")
+BYZER_SQL_LOGS = {
+    "byzer": "byzer.out",
+    "shell": "shell.stderr",
+    "check-env": "check-env.error",
+}
+
+
+async def resolve_log_path(kind: str, name: str, log_type: str) -> str:
+    """Log file of a managed service. Names must exist in their registry,
+    so request paths can never point outside the log directories."""
+    if kind == "byzer-sql":
+        services = await load_byzer_sql_from_json()
+        if name not in services:
+            raise HTTPException(status_code=404, detail=f"Byzer SQL {name} not found")
+        if log_type not in BYZER_SQL_LOGS:
+            raise HTTPException(status_code=400, detail="Invalid log type")
+        return os.path.join(services[name]["install_dir"], "logs", BYZER_SQL_LOGS[log_type])
+
+    if log_type not in SERVICE_LOG_TYPES:
+        raise HTTPException(status_code=400, detail="Invalid log type")
+    if kind == "openai-compatible-service":
+        return os.path.join("logs", f"openai_compatible_service.{log_type}")
+    if kind == "rags":
+        registry = await load_rags_from_json()
+    elif kind == "super-analysis":
+        registry = await load_super_analysis_from_json()
+    else:
+        raise HTTPException(status_code=404, detail=f"Unknown service kind {kind}")
+    if name not in registry:
+        raise HTTPException(status_code=404, detail=f"{name} not found")
+    return os.path.join("logs", f"{name}.{log_type}")
+
+
+def select_segment(path: str, segment: Optional[str]) -> str:
+    """The live log, or one of its rotated segments picked by file name."""
+    if not segment:
+        return path
+    for candidate in segment_paths(path):
+        if os.path.basename(candidate) == segment:
+            return candidate
+    raise HTTPException(status_code=404, detail=f"Log segment {segment} not found")
+
+
+# ---- rotation policies --------------------------------------------------
+
+@router.get("/logs/policies")
+async def get_log_policies():
+    """Built-in defaults, the configured default and per-service overrides."""
+    policies = await load_log_policies()
+    return {"builtin": DEFAULT_POLICY, **policies}
+
+
+@router.put("/logs/policies/{name}")
+async def update_log_policy(name: str, request: LogPolicyRequest):
+    """Set the rotation policy of one log (its log name, e.g. the RAG name), or "default"."""
+    policies = await load_log_policies()
+    fields = request.model_dump(exclude_none=True)
+    if name == "default":
+        policies.setdefault("default", {}).update(fields)
+    else:
+        policies.setdefault("services", {}).setdefault(name, {}).update(fields)
+    await save_log_policies(policies)
+    return {"message": f"Log policy {name} updated", "policy": policy_for(policies, name)}
+
+
+@router.delete("/logs/policies/{name}")
+async def delete_log_policy(name: str):
+    policies = await load_log_policies()
+    if name == "default":
+        policies["default"] = {}
+    elif policies.get("services", {}).pop(name, None) is None:
+        raise HTTPException(status_code=404, detail=f"No log policy for {name}")
+    await save_log_policies(policies)
+    return {"message": f"Log policy {name} reset"}
+
+
+# ---- reading --------------------------------------------------------------
+
+@router.get("/logs/{kind}/{name}/{log_type}/segments")
+async def list_log_segments(kind: str, name: str, log_type: str):
+    """Rotated segments of a log, oldest first; pass a name as ?segment= to read it."""
+    path = await resolve_log_path(kind, name, log_type)
+
+    def describe():
+        return [
+            {
+                "segment": os.path.basename(segment),
+                "compressed_bytes": os.path.getsize(segment),
+                "size": log_size(segment),
+                "rotated_at": os.path.getmtime(segment),
+            }
+            for segment in segment_paths(path)
+        ]
+
+    return {"current": os.path.basename(path), "segments": await asyncio.to_thread(describe)}
+
+
+@router.get("/logs/{kind}/{name}/{log_type}")
+async def read_log(kind: str, name: str, log_type: str, offset: int = 0, max_bytes: int = MAX_CHUNK_BYTES,
+                   segment: Optional[str] = None):
+    """Read a bounded chunk from byte offset (negative: the last |offset| bytes)."""
+    path = select_segment(await resolve_log_path(kind, name, log_type), segment)
+    return await read_chunk(path, offset, max(1, min(max_bytes, MAX_CHUNK_BYTES)))
+
+
+@router.get("/logs/{kind}/{name}/{log_type}/tail")
+async def tail_log(kind: str, name: str, log_type: str, lines: int = 1000, segment: Optional[str] = None):
+    path = select_segment(await resolve_log_path(kind, name, log_type), segment)
+    return await tail_lines(path, max(1, min(lines, 100000)))
+
+
+@router.get("/logs/{kind}/{name}/{log_type}/grep")
+async def grep_log(kind: str, name: str, log_type: str, q: str, start: int = 0, end: Optional[int] = None,
+                   regex: bool = False, ignore_case: bool = False, segment: Optional[str] = None):
+    """Search lines of the log within the byte range [start, end)."""
+    path = select_segment(await resolve_log_path(kind, name, log_type), segment)
+    try:
+        return await grep(path, q, start=start, end=end, regex=regex, ignore_case=ignore_case)
+    except re.error as e:
+        raise HTTPException(status_code=400, detail=f"Invalid search pattern: {str(e)}")
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="Log file not found")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/logs/{kind}/{name}/{log_type}/follow")
+async def follow_log(request: Request, kind: str, name: str, log_type: str, offset: int = -64 * 1024):
+    """Stream new log content (SSE) as it is written, starting at offset."""
+    path = await resolve_log_path(kind, name, log_type)
+
+    async def event_generator():
+        async for chunk in follow(path, offset, is_disconnected=request.is_disconnected):
+            yield {"event": "message", "data": json.dumps(chunk, ensure_ascii=False)}
+
+    return EventSourceResponse(event_generator())
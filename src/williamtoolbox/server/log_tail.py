@@ -0,0 +1,291 @@
+import io
+import os
+import re
+import gzip
+import struct
+import asyncio
+from typing import Any, AsyncIterator, Dict, List, Optional
+from loguru import logger
+
+# Largest chunk returned by one read; the UI keeps polling from the
+# returned offset, so a multi-GB log is never loaded at once.
+MAX_CHUNK_BYTES = 1024 * 1024
+TAIL_BLOCK_BYTES = 64 * 1024
+# grep stops after this many bytes / matches
+MAX_GREP_BYTES = 256 * 1024 * 1024
+MAX_GREP_MATCHES = 1000
+
+
+def _utf8_start(data: bytes) -> int:
+    """Skip continuation bytes so decoding starts on a character boundary."""
+    i = 0
+    while i < len(data) and i < 4 and 0x80 <= data[i] <= 0xBF:
+        i += 1
+    return i
+
+
+def _utf8_end(data: bytes) -> int:
+    """Length of data without a trailing, incomplete UTF-8 sequence."""
+    for back in range(1, min(4, len(data)) + 1):
+        byte = data[-back]
+        if byte < 0x80:
+            return len(data)
+        if byte >= 0xC0:
+            needed = 2 if byte < 0xE0 else 3 if byte < 0xF0 else 4
+            return len(data) if back >= needed else len(data) - back
+    return len(data)
+
+
+def _compressed(path: str) -> bool:
+    return path.endswith((".gz", ".zst"))
+
+
+def open_log(path: str):
+    """Open a log, or a rotated segment, for reading its uncompressed bytes.
+
+    Compressed segments only seek forward cheaply, which is all reads and
+    grep need; tail reads them front to back instead.
+    """
+    if path.endswith(".gz"):
+        return gzip.open(path, "rb")
+    if path.endswith(".zst"):
+        import zstandard
+        # Buffered for readline(), which the raw zstd reader lacks
+        return io.BufferedReader(zstandard.ZstdDecompressor().stream_reader(open(path, "rb"), closefd=True))
+    return open(path, "rb")
+
+
+def log_size(path: str) -> int:
+    """Uncompressed size of a log or rotated segment."""
+    if path.endswith(".gz"):
+        # ISIZE trailer: size modulo 2**32, plenty for rotated segments
+        with open(path, "rb") as f:
+            f.seek(-4, os.SEEK_END)
+            return struct.unpack("<I", f.read(4))[0]
+    if path.endswith(".zst"):
+        import zstandard
+        with open(path, "rb") as f:
+            size = zstandard.frame_content_size(f.read(18))
+        if size >= 0:
+            return size
+        with open_log(path) as f:
+            size = 0
+            while True:
+                block = f.read(MAX_CHUNK_BYTES)
+                if not block:
+                    return size
+                size += len(block)
+    return os.path.getsize(path)
+
+
+def _read_range(path: str, start: int, length: int) -> bytes:
+    with open_log(path) as f:
+        f.seek(start)
+        return f.read(length)
+
+
+def read_chunk_sync(path: str, offset: int = 0, max_bytes: int = MAX_CHUNK_BYTES) -> Dict[str, Any]:
+    """Read at most max_bytes of a log starting at byte offset.
+
+    A negative offset reads the last |offset| bytes. The returned offset is
+    where the next poll should continue; it never splits a UTF-8 character.
+    If the file shrank below offset (truncated or rotated) reading restarts
+    at 0 and "reset" is set.
+    """
+    if not os.path.exists(path):
+        return {"content": "", "exists": False, "offset": 0}
+    size = log_size(path)
+    reset = False
+    if offset < 0:
+        start = max(0, size - min(abs(offset), max_bytes))
+    elif offset > size:
+        start, reset = 0, True
+    else:
+        start = offset
+    data = _read_range(path, start, min(max_bytes, size - start))
+    skip = _utf8_start(data) if offset < 0 and start > 0 else 0
+    end = _utf8_end(data)
+    if end == 0 and len(data) >= 4:
+        # Invalid data rather than a split character; do not stall on it
+        end = len(data)
+    result = {
+        "content": data[skip:end].decode("utf-8", errors="replace"),
+        "exists": True,
+        "offset": start + end,
+        "size": size,
+        "eof": start + end >= size,
+    }
+    if reset:
+        result["reset"] = True
+    return result
+
+
+def tail_lines_sync(path: str, lines: int = 1000, max_bytes: int = MAX_CHUNK_BYTES) -> Dict[str, Any]:
+    """Last `lines` lines of a log, found by reading backwards in blocks."""
+    if not os.path.exists(path):
+        return {"content": "", "exists": False, "offset": 0}
+    if _compressed(path):
+        data, position = _tail_compressed(path, max_bytes)
+        size = position + len(data)
+    else:
+        size = os.path.getsize(path)
+        with open(path, "rb") as f:
+            position = size
+            data = b""
+            # One extra newline: the last line may or may not end with one
+            while position > 0 and data.count(b"\n") <= lines and len(data) < max_bytes:
+                block = min(TAIL_BLOCK_BYTES, position)
+                position -= block
+                f.seek(position)
+                data = f.read(block) + data
+    if len(data) > max_bytes:
+        position += len(data) - max_bytes
+        data = data[-max_bytes:]
+    parts = data.split(b"\n")
+    trailing_newline = data.endswith(b"\n")
+    if trailing_newline:
+        parts = parts[:-1]
+    if len(parts) > lines:
+        dropped = len(parts) - lines
+        position += sum(len(part) + 1 for part in parts[:dropped])
+        parts = parts[dropped:]
+    content = b"\n".join(parts) + (b"\n" if trailing_newline and parts else b"")
+    skip = _utf8_start(content) if position > 0 else 0
+    return {
+        "content": content[skip:].decode("utf-8", errors="replace"),
+        "exists": True,
+        "offset": size,
+        "start_offset": position + skip,
+        "lines": len(parts),
+    }
+
+
+def _tail_compressed(path: str, max_bytes: int):
+    """Last max_bytes of a compressed segment and their offset, read forward."""
+    position = 0
+    data = b""
+    with open_log(path) as f:
+        while True:
+            block = f.read(MAX_CHUNK_BYTES)
+            if not block:
+                return data, position
+            data += block
+            if len(data) > max_bytes:
+                position += len(data) - max_bytes
+                data = data[-max_bytes:]
+
+
+def grep_sync(path: str, pattern: str, start: int = 0, end: Optional[int] = None, regex: bool = False,
+              ignore_case: bool = False, max_matches: int = MAX_GREP_MATCHES) -> Dict[str, Any]:
+    """Lines containing pattern within the byte range [start, end).
+
+    Each match carries its byte offset, which can be passed back as offset
+    to read the surrounding log. At most MAX_GREP_BYTES are scanned per
+    call; "next_offset" tells where to continue.
+    """
+    if not os.path.exists(path):
+        return {"matches": [], "exists": False, "next_offset": None}
+    size = log_size(path)
+    end = size if end is None else min(end, size)
+    start = max(0, start)
+    limit = min(end, start + MAX_GREP_BYTES)
+    flags = re.IGNORECASE if ignore_case else 0
+    matcher = re.compile(pattern.encode("utf-8") if regex else re.escape(pattern.encode("utf-8")), flags)
+
+    matches: List[Dict[str, Any]] = []
+    with open_log(path) as f:
+        f.seek(start)
+        if start > 0:
+            # Start on the next full line
+            start += len(f.readline())
+        position = start
+        while position < limit and len(matches) < max_matches:
+            line = f.readline()
+            if not line:
+                break
+            if matcher.search(line):
+                matches.append({
+                    "offset": position,
+                    "line": line.rstrip(b"\r\n").decode("utf-8", errors="replace"),
+                })
+            position += len(line)
+    return {
+        "matches": matches,
+        "exists": True,
+        "scanned_from": start,
+        "scanned_to": position,
+        "next_offset": position if position < end else None,
+        "truncated": len(matches) >= max_matches,
+    }
+
+
+async def read_chunk(path: str, offset: int = 0, max_bytes: int = MAX_CHUNK_BYTES) -> Dict[str, Any]:
+    return await asyncio.to_thread(read_chunk_sync, path, offset, max_bytes)
+
+
+async def tail_lines(path: str, lines: int = 1000, max_bytes: int = MAX_CHUNK_BYTES) -> Dict[str, Any]:
+    return await asyncio.to_thread(tail_lines_sync, path, lines, max_bytes)
+
+
+async def grep(path: str, pattern: str, **kwargs) -> Dict[str, Any]:
+    return await asyncio.to_thread(grep_sync, path, pattern, **kwargs)
+
+
+async def _wait_for_change(path: str, interval: float):
+    """Wait until path is modified, or at most `interval` seconds."""
+    try:
+        from watchfiles import awatch
+    except ImportError:
+        awatch = None
+
+    if awatch is not None and os.path.exists(path):
+        stop = asyncio.Event()
+        asyncio.get_running_loop().call_later(interval, stop.set)
+        async for _ in awatch(path, stop_event=stop, debounce=50, rust_timeout=int(interval * 1000)):
+            return
+        return
+    await asyncio.sleep(interval)
+
+
+async def follow(path: str, offset: int = -MAX_CHUNK_BYTES // 16, poll_interval: float = 0.5,
+                 max_interval: float = 2.0, is_disconnected=None) -> AsyncIterator[Dict[str, Any]]:
+    """Yield new log content as it is written (tail -F).
+
+    Uses inotify through watchfiles when it is installed, stat polling
+    otherwise; the polling interval backs off while the log is idle.
+    Truncation and rotation restart from the beginning of the new file.
+    """
+    interval = poll_interval
+    last_stat = None
+    first = True
+    behind = False
+    while True:
+        if is_disconnected is not None and await is_disconnected():
+            return
+        try:
+            stat = os.stat(path)
+            current = (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+        except FileNotFoundError:
+            current = None
+        if first or behind or current != last_stat:
+            if last_stat is not None and current is not None and current[0] != last_stat[0]:
+                # Replaced by a new file (rotation)
+                offset = 0
+            chunk = await read_chunk(path, offset)
+            offset = chunk["offset"]
+            if chunk["content"] or chunk.get("reset") or first:
+                yield chunk
+                interval = poll_interval
+            first = False
+            last_stat = current
+            # More than one chunk behind: keep reading without waiting
+            behind = not chunk.get("eof", True)
+            if behind:
+                continue
+        else:
+            interval = min(interval * 1.5, max_interval)
+        try:
+            await _wait_for_change(path, interval)
+        except Exception as e:
+            logger.debug(f"Log watch on {path} failed, polling instead: {str(e)}")
+            await asyncio.sleep(interval)
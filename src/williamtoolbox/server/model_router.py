@@ -1,15 +1,16 @@
 from fastapi import APIRouter, HTTPException
 from typing import Optional, Dict, Any, List
 from .request_types import *
-from ..storage.json_file import load_models_from_json, save_models_to_json
+from ..storage.json_file import load_models_from_json, save_models_to_json, update_model_in_json, load_config
 from loguru import logger
 from .auth import verify_token, JWT_SECRET, JWT_ALGORITHM
 from fastapi import Depends
 from ..storage.json_file import *
-import asyncio
 import subprocess
 import traceback
-from autocoder import models as autocoder_models
+from .supervisor import service_supervisor, MODEL
+from .process_manager import process_manager
+from .readiness import readiness, default_health_url
 
 router = APIRouter()
 
@@ -54,7 +55,8 @@ async def list_models():
         ModelInfo(
             name=name, 
             status=info["status"],
-            product_type=info.get("product_type", ProductType.pro)
+            product_type=info.get("product_type", ProductType.pro),
+            tags=info.get("tags", []),
         )
         for name, info in models.items()
     ]
@@ -80,6 +82,7 @@ async def delete_model(model_name: str):
     # 如果是 lite 模式，尝试从 autocoder 中删除
     if product_type == ProductType.lite:
         try:
+            from autocoder import models as autocoder_models
             autocoder_models.delete_model(model_name)
         except Exception as e:
             logger.error(f"Failed to delete model from autocoder: {str(e)}")
@@ -97,6 +100,7 @@ async def add_model(model: AddModelRequest):
     if model.product_type == ProductType.lite:
         # Lite mode: use auto-coder's model management        
         try:
+            from autocoder import models as autocoder_models
             autocoder_models.add_and_activate_models([{
                 "name": model.name,
                 "description": f"Auto created by William Toolbox",
@@ -118,6 +122,7 @@ async def add_model(model: AddModelRequest):
                 "is_reasoning": model.is_reasoning or False,
                 "input_price": model.input_price or 0.0,
                 "output_price": model.output_price or 0.0,
+                "tags": model.tags,
                 "deploy_command": DeployCommand(
                     pretrained_model_type=model.pretrained_model_type,
                     cpus_per_worker=model.cpus_per_worker,
@@ -154,6 +159,7 @@ async def add_model(model: AddModelRequest):
             "is_reasoning": model.is_reasoning or False,
             "input_price": model.input_price or 0.0,
             "output_price": model.output_price or 0.0,
+            "tags": model.tags,
             "deploy_command": DeployCommand(
                 pretrained_model_type=model.pretrained_model_type,
                 cpus_per_worker=model.cpus_per_worker,
@@ -204,6 +210,7 @@ async def update_model(model_name: str, request: AddModelRequest):
     if request.product_type == ProductType.lite:
         # Lite mode: use auto-coder's model management
         try:
+            from autocoder import models as autocoder_models
             autocoder_models.update_model(model_name, {
                 "name": model_name,
                 "description": f"Updated by William Toolbox",
@@ -223,6 +230,7 @@ async def update_model(model_name: str, request: AddModelRequest):
                 "is_reasoning": request.is_reasoning or False,
                 "input_price": request.input_price or 0.0,
                 "output_price": request.output_price or 0.0,
+                "tags": request.tags,
                 "deploy_command": DeployCommand(
                     pretrained_model_type=request.pretrained_model_type,
                     cpus_per_worker=request.cpus_per_worker,
@@ -262,6 +270,7 @@ async def update_model(model_name: str, request: AddModelRequest):
         model_info['is_reasoning'] = request.is_reasoning
         model_info['input_price'] = request.input_price
         model_info['output_price'] = request.output_price
+        model_info['tags'] = request.tags
 
         models[model_name] = model_info
         await save_models_to_json(models)
@@ -300,12 +309,8 @@ async def manage_model(model_name: str, action: str):
     try:
         # Execute the command asynchronously
         logger.info(f"manage model {model_name} with command: {command}")
-        process = await asyncio.create_subprocess_shell(
-            command,
-            stdout=asyncio.subprocess.PIPE,
-            stderr=asyncio.subprocess.PIPE
-        )
-        stdout, stderr = await process.communicate()
+        process = await process_manager.run_command(command)
+        stdout, stderr = process.stdout, process.stderr
 
         # Check if the command was successful
         if process.returncode == 0:
@@ -313,8 +318,22 @@ async def manage_model(model_name: str, action: str):
             model_info["status"] = "running" if action == "start" else "stopped"
             models[model_name] = model_info
 
-            # Save updated models to JSON file
-            await save_models_to_json(models)
+            # Save updated model to JSON file (only this entry, see update_model_in_json)
+            await update_model_in_json(model_name, model_info)
+            await service_supervisor.mark(
+                MODEL, model_name, model_info["status"],
+                success=action == "start", detail=stdout.decode().strip(),
+            )
+            if action == "start":
+                # 部署命令返回后，模型还需出现在 OpenAI 服务的 /v1/models 中才可用
+                openai_server = ((await load_config()).get("openaiServerList") or [{}])[0]
+                await readiness.watch(
+                    MODEL, model_name,
+                    default_health_url(openai_server.get("host"), openai_server.get("port")),
+                    model=model_name,
+                )
+            else:
+                await readiness.forget(MODEL, model_name)
 
             return {
                 "message": f"Model {model_name} {action}ed successfully",
@@ -343,42 +362,13 @@ async def get_model_status(model_name: str):
         raise HTTPException(
             status_code=404, detail=f"Model {model_name} not found")
 
-    try:
-        # Execute the byzerllm stat command
-        command = (
-            models[model_name]["status_command"]
-            if model_name in models
-            and "status_command" in models[model_name]
-            else f"byzerllm stat --model {model_name}"
-        )
-        process = await asyncio.create_subprocess_shell(
-            command,
-            stdout=asyncio.subprocess.PIPE,
-            stderr=asyncio.subprocess.PIPE
-        )
-        stdout, stderr = await process.communicate()
-
-        # Check the result status
-        if process.returncode == 0:
-            status_output = stdout.decode().strip()
-            models[model_name]["status"] = "running"
-            await save_models_to_json(models)
-            return {"model": model_name, "status": status_output, "success": True}
-        else:
-            error_message = f"Command failed with return code {process.returncode}: {stderr.decode().strip()}"
-            models[model_name]["status"] = "stopped"
-            await save_models_to_json(models)
-            return {
-                "model": model_name,
-                "status": "error",
-                "error": error_message,
-                "success": False,
-            }
-    except Exception as e:
-        error_message = f"Failed to get status for model {model_name}: {str(e)}"
-        return {
-            "model": model_name,
-            "status": "error",
-            "error": error_message,
-            "success": False,
-        }
+    # byzerllm stat 由 supervisor 在后台定期执行，这里只读取结果
+    entry = await service_supervisor.get(MODEL, model_name)
+    if entry is not None and entry.get("success"):
+        return {"model": model_name, "status": entry.get("detail", entry["status"]), "success": True}
+    return {
+        "model": model_name,
+        "status": "error",
+        "error": (entry or {}).get("detail") or f"Model {model_name} is {(entry or {}).get('status', 'unknown')}",
+        "success": False,
+    }
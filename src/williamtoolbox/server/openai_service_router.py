@@ -1,13 +1,16 @@
 from fastapi import APIRouter
 import os
 import signal
-import psutil
 from loguru import logger
-import subprocess
 import traceback
 from typing import Dict
 from ..storage.json_file import *
 from .request_types import OpenAIServiceStartRequest
+from .supervisor import service_supervisor, OPENAI_SERVICE, OPENAI_SERVICE_NAME
+from .process_manager import process_manager
+from .readiness import readiness, default_health_url
+from .log_tail import tail_lines
+from .port_allocator import reserve, PortConflict
 router = APIRouter()
 
 @router.post("/openai-compatible-service/start")
@@ -16,32 +19,32 @@ async def start_openai_compatible_service(request: OpenAIServiceStartRequest):
     if "openaiServerList" in config and config["openaiServerList"]:
         return {"message": "OpenAI compatible service is already running"}
 
-    command = f"byzerllm serve --ray_address auto --host {request.host} --port {request.port}"
     try:
-        # Create logs directory if it doesn't exist
-        os.makedirs("logs", exist_ok=True)
-
-        # Open log files for stdout and stderr
-        stdout_log = open(os.path.join("logs", "openai_compatible_service.out"), "w")
-        stderr_log = open(os.path.join("logs", "openai_compatible_service.err"), "w")
+        await reserve(OPENAI_SERVICE, OPENAI_SERVICE_NAME, request.port, request.host)
+    except PortConflict as e:
+        return {"error": str(e)}
 
-        # Use subprocess.Popen to start the process in the background
-        process = subprocess.Popen(
-            command.split(), stdout=stdout_log, stderr=stderr_log
-        )
-        logger.info(f"OpenAI compatible service started with PID: {process.pid}")
+    command = f"byzerllm serve --ray_address auto --host {request.host} --port {request.port}"
+    try:
+        # Start the process in the background; logs go to logs/openai_compatible_service.out/.err
+        pid = await process_manager.start(command.split(), log_name="openai_compatible_service")
+        logger.info(f"OpenAI compatible service started with PID: {pid}")
 
         # Update config.json with the new server information
         if "openaiServerList" not in config:
             config["openaiServerList"] = []
         config["openaiServerList"].append(
-            {"host": request.host, "port": request.port, "pid": process.pid}
+            {"host": request.host, "port": request.port, "pid": pid}
         )
         await save_config(config)
+        await service_supervisor.refresh()
+        await readiness.watch(
+            OPENAI_SERVICE, OPENAI_SERVICE_NAME, default_health_url(request.host, request.port), pid=pid
+        )
 
         return {
             "message": "OpenAI compatible service started successfully",
-            "pid": process.pid,
+            "pid": pid,
         }
     except Exception as e:
         logger.error(f"Failed to start OpenAI compatible service: {str(e)}")
@@ -57,16 +60,13 @@ async def stop_openai_compatible_service():
 
     try:
         for server in config["openaiServerList"]:
-            try:
-                process = psutil.Process(server["pid"])
-                for child in process.children(recursive=True):
-                    child.terminate()
-                process.terminate()
-            except psutil.NoSuchProcess:
-                logger.warning(f"Process with PID {server['pid']} not found")
+            if not await process_manager.stop(server.get("pid")):
+                logger.warning(f"Process with PID {server.get('pid')} not found")
 
         config["openaiServerList"] = []
         await save_config(config)
+        await service_supervisor.refresh()
+        await readiness.forget(OPENAI_SERVICE, OPENAI_SERVICE_NAME)
         return {"message": "OpenAI compatible service stopped successfully"}
     except Exception as e:
         return {"error": f"Failed to stop OpenAI compatible service: {str(e)}"}
@@ -77,21 +77,14 @@ async def get_openai_compatible_service_status():
     config = await load_config()
     is_running = False
     if "openaiServerList" in config and len(config["openaiServerList"]) > 0:
-        # 获取存储的pid
-        server = config["openaiServerList"][0]
-        pid = server.get("pid")
-        if pid:
-            try:
-                # 检查进程是否存在
-                process = psutil.Process(pid)
-                is_running = process.is_running()
-            except psutil.NoSuchProcess:
-                is_running = False
-                # 进程不存在,清理配置
-                config["openaiServerList"] = []
-                await save_config(config)
+        # 进程状态由 supervisor 后台检测（进程退出时也由它清理配置）
+        entry = await service_supervisor.get(OPENAI_SERVICE, OPENAI_SERVICE_NAME)
+        is_running = bool(entry and entry["is_alive"])
     
-    return {"isRunning": is_running}
+    return {
+        "isRunning": is_running,
+        "readiness": await readiness.get(OPENAI_SERVICE, OPENAI_SERVICE_NAME) if is_running else None,
+    }
 
 @router.get("/openai-compatible-service/logs/{log_type}")
 async def get_openai_compatible_service_logs(log_type: str):
@@ -105,10 +98,9 @@ async def get_openai_compatible_service_logs(log_type: str):
         return {"content": ""}
     
     try:
-        with open(log_file, "r") as f:
-            # 读取最后1000行日志
-            lines = f.readlines()[-1000:]
-            return {"content": "".join(lines)}
+        # 读取最后1000行日志（从文件尾部反向查找，不读取整个文件）
+        result = await tail_lines(log_file, 1000)
+        return {"content": result["content"]}
     except Exception as e:
         logger.error(f"Failed to read log file: {str(e)}")
         return {"error": f"Failed to read log file: {str(e)}"}
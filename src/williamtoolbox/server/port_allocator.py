@@ -0,0 +1,177 @@
+import os
+import time
+import errno
+import socket
+import asyncio
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from loguru import logger
+
+from ..storage.json_file import (
+    load_config,
+    load_models_from_json,
+    load_rags_from_json,
+    load_super_analysis_from_json,
+    load_byzer_sql_from_json,
+    with_file_lock,
+)
+from ..storage.shared_state import get_shared_state
+from .supervisor import RAG, SUPER_ANALYSIS, BYZER_SQL, OPENAI_SERVICE, OPENAI_SERVICE_NAME, MODEL, replica_name
+
+# Ports handed out but not yet recorded in a registry (the service is still
+# starting). Kept in shared state so starts in other workers skip them.
+PORT_CLAIMS = "port_claims"
+CLAIM_TTL_SECONDS = 120
+# Serializes check-and-claim across workers
+PORT_LOCK_PATH = "port_claims"
+
+# Auto-assigned ports come from these ranges. "portRanges" in config.json
+# overrides them per kind, e.g. {"rag": "8100-8199", "super_analysis": [9100, 9199]}
+DEFAULT_PORT_RANGES = {
+    RAG: (8000, 8999),
+    OPENAI_SERVICE: (8000, 8999),
+    SUPER_ANALYSIS: (9000, 9199),
+    BYZER_SQL: (9200, 9399),
+    MODEL: (9400, 9599),
+}
+
+KIND_LABELS = {
+    RAG: "RAG",
+    SUPER_ANALYSIS: "Super Analysis",
+    BYZER_SQL: "Byzer SQL",
+    OPENAI_SERVICE: "OpenAI service",
+    MODEL: "model",
+}
+
+
+class PortConflict(ValueError):
+    """The port is reserved by another managed service or bound on this host."""
+
+
+def parse_range(value: Any) -> Tuple[int, int]:
+    """"8000-8999" or [8000, 8999] -> (8000, 8999)."""
+    if isinstance(value, str):
+        value = value.split("-")
+    low, high = (int(v) for v in value)
+    if not 1 <= low <= high <= 65535:
+        raise ValueError(f"Invalid port range: {low}-{high}")
+    return low, high
+
+
+async def port_range(kind: str) -> Tuple[int, int]:
+    configured = ((await load_config()).get("portRanges") or {}).get(kind)
+    if configured:
+        try:
+            return parse_range(configured)
+        except (ValueError, TypeError):
+            logger.warning(f"Ignoring invalid portRanges.{kind} in config.json: {configured}")
+    return DEFAULT_PORT_RANGES.get(kind, DEFAULT_PORT_RANGES[RAG])
+
+
+def bindable(host: Optional[str], port: int) -> bool:
+    """Whether a server could listen on host:port right now."""
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        # Servers set SO_REUSEADDR too, so a port in TIME_WAIT counts as free.
+        # On Windows the option allows binding over a live listener, so not there.
+        if os.name != "nt":
+            s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        try:
+            s.bind((host or "0.0.0.0", port))
+        except OSError as e:
+            # Not an address of this machine: nothing here can be probed
+            return e.errno == errno.EADDRNOTAVAIL
+    return True
+
+
+def _first_bindable(host: Optional[str], ports: Iterable[int]) -> Optional[int]:
+    for port in ports:
+        if bindable(host, port):
+            return port
+    return None
+
+
+async def reservations() -> Dict[int, List[Dict[str, str]]]:
+    """Reservation index: port -> services configured with or claiming it.
+
+    Covers RAGs (and their replicas), Super Analysis, Byzer SQL, the OpenAI
+    service and models that carry a port, plus unexpired claims.
+    """
+    index: Dict[int, List[Dict[str, str]]] = {}
+
+    def add(port: Any, kind: str, name: str):
+        if port:
+            holders = index.setdefault(int(port), [])
+            if {"kind": kind, "name": name} not in holders:
+                holders.append({"kind": kind, "name": name})
+
+    for name, info in (await load_rags_from_json()).items():
+        add(info.get("port"), RAG, name)
+        for replica in info.get("replicas") or []:
+            add(replica.get("port"), RAG, replica_name(name, replica["index"]))
+    for name, info in (await load_super_analysis_from_json()).items():
+        add(info.get("port"), SUPER_ANALYSIS, name)
+    for name, info in (await load_byzer_sql_from_json()).items():
+        add(info.get("port"), BYZER_SQL, name)
+    # Models are deployed into Ray and usually listen on no port of their own
+    for name, info in (await load_models_from_json()).items():
+        add(info.get("port"), MODEL, name)
+    for server in (await load_config()).get("openaiServerList") or []:
+        add(server.get("port"), OPENAI_SERVICE, OPENAI_SERVICE_NAME)
+
+    state = get_shared_state()
+    now = time.time()
+    for port, claim in (await state.items(PORT_CLAIMS)).items():
+        if claim["expires_at"] <= now:
+            await state.delete(PORT_CLAIMS, port)
+            continue
+        add(port, claim["kind"], claim["name"])
+    return index
+
+
+def _others(holders: List[Dict[str, str]], kind: str, name: str) -> List[Dict[str, str]]:
+    return [h for h in holders if (h["kind"], h["name"]) != (kind, name)]
+
+
+async def _claim(kind: str, name: str, port: int) -> None:
+    await get_shared_state().set(PORT_CLAIMS, str(port), {
+        "kind": kind, "name": name, "expires_at": time.time() + CLAIM_TTL_SECONDS,
+    })
+
+
+async def reserve(kind: str, name: str, port: int, host: Optional[str] = None, probe: bool = True) -> int:
+    """Check that port is free for this service and claim it.
+
+    Raises PortConflict when another managed service has the port, or (with
+    probe) when something on the host is already listening on it.
+    """
+    async with with_file_lock(PORT_LOCK_PATH):
+        others = _others((await reservations()).get(port, []), kind, name)
+        if others:
+            holder = others[0]
+            raise PortConflict(
+                f"Port {port} is already in use by {KIND_LABELS.get(holder['kind'], holder['kind'])} {holder['name']}"
+            )
+        if probe and not await asyncio.to_thread(bindable, host, port):
+            raise PortConflict(f"Port {port} is already in use on this host")
+        await _claim(kind, name, port)
+    return port
+
+
+async def allocate(kind: str, name: str, host: Optional[str] = None, preferred: Optional[int] = None) -> int:
+    """Pick and claim a free port for a service: preferred if it is free,
+    else the first free port in the kind's range."""
+    low, high = await port_range(kind)
+    async with with_file_lock(PORT_LOCK_PATH):
+        taken = await reservations()
+        candidates = ([preferred] if preferred else []) + list(range(low, high + 1))
+        port = await asyncio.to_thread(
+            _first_bindable, host, (p for p in candidates if not _others(taken.get(p, []), kind, name))
+        )
+        if port is None:
+            raise PortConflict(f"No free port for {KIND_LABELS.get(kind, kind)} {name} in {low}-{high}")
+        await _claim(kind, name, port)
+    return port
+
+
+async def release(port: int) -> None:
+    """Drop a claim early, e.g. when the service failed to start."""
+    await get_shared_state().delete(PORT_CLAIMS, str(port))
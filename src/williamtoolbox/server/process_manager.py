@@ -0,0 +1,246 @@
+import os
+import signal
+import asyncio
+import subprocess
+from typing import Awaitable, Callable, Dict, List, Optional, Set, Union
+import psutil
+from loguru import logger
+
+from .supervisor import service_supervisor
+from .log_rotation import log_rotator
+
+LOGS_DIR = "logs"
+
+Command = Union[str, List[str]]
+
+
+def log_paths(log_name: str):
+    """stdout/stderr log files of a managed service, e.g. logs/<rag>.out."""
+    return os.path.join(LOGS_DIR, f"{log_name}.out"), os.path.join(LOGS_DIR, f"{log_name}.err")
+
+
+def _is_group_leader(pid: int) -> bool:
+    if not hasattr(os, "killpg"):
+        return False
+    try:
+        return os.getpgid(pid) == pid
+    except OSError:
+        return False
+
+
+def _exited(pid: int) -> bool:
+    try:
+        return psutil.Process(pid).status() == psutil.STATUS_ZOMBIE
+    except psutil.NoSuchProcess:
+        return True
+
+
+class ProcessManager:
+    """Starts and stops the long running services (RAGs, Super Analysis, ...).
+
+    Every service is started in its own session, so the shell wrapper and
+    everything it spawns share one process group that can be signalled at
+    once. The log files are handed to the child and closed in the backend
+    right after the spawn; the child owns them from then on. Nothing here
+    blocks the event loop: waiting for a process to exit is an await on the
+    asyncio process (children of this worker) or a short psutil poll
+    (processes adopted from another worker or a previous run).
+    """
+
+    def __init__(self):
+        self._children: Dict[int, asyncio.subprocess.Process] = {}
+        self._reapers: Set[asyncio.Task] = set()
+
+    async def start(self, command: Command, log_name: str, cwd: Optional[str] = None,
+                    env: Optional[Dict[str, str]] = None) -> int:
+        """Start command in the background with output in logs/<log_name>.out/.err.
+
+        The previous run's output is archived as a rotated segment. The logs
+        are opened for appending so they can be rotated (copytruncate) while
+        the service keeps writing.
+        """
+        os.makedirs(LOGS_DIR, exist_ok=True)
+        await self._archive_logs(log_name)
+        stdout_path, stderr_path = log_paths(log_name)
+        with open(stdout_path, "a") as stdout_log, open(stderr_path, "a") as stderr_log:
+            if isinstance(command, str):
+                process = await asyncio.create_subprocess_shell(
+                    command, stdout=stdout_log, stderr=stderr_log, stdin=subprocess.DEVNULL,
+                    cwd=cwd, env=env, start_new_session=True,
+                )
+            else:
+                process = await asyncio.create_subprocess_exec(
+                    *command, stdout=stdout_log, stderr=stderr_log, stdin=subprocess.DEVNULL,
+                    cwd=cwd, env=env, start_new_session=True,
+                )
+        self._children[process.pid] = process
+        service_supervisor.watch_child(process.pid)
+        reaper = asyncio.create_task(self._reap(process))
+        self._reapers.add(reaper)
+        reaper.add_done_callback(self._reapers.discard)
+        logger.info(f"Started {log_name} with PID {process.pid}: {command}")
+        return process.pid
+
+    async def _archive_logs(self, log_name: str):
+        try:
+            await log_rotator.check(log_name, force=True)
+        except Exception as e:
+            logger.warning(f"Could not archive previous logs of {log_name}: {str(e)}")
+
+    async def _reap(self, process: asyncio.subprocess.Process):
+        return_code = await process.wait()
+        self._children.pop(process.pid, None)
+        service_supervisor.notify_exit(process.pid, return_code)
+
+    def is_running(self, pid: Optional[int]) -> bool:
+        if pid is None:
+            return False
+        process = self._children.get(pid)
+        if process is not None:
+            return process.returncode is None
+        return not _exited(pid)
+
+    def _signal(self, pid: int, sig: int, group: Optional[bool] = None):
+        """Signal the process group when pid leads one, else the process tree."""
+        if group is None:
+            group = _is_group_leader(pid)
+        if group:
+            try:
+                os.killpg(pid, sig)
+            except ProcessLookupError:
+                pass
+            return
+        try:
+            parent = psutil.Process(pid)
+            targets = parent.children(recursive=True) + [parent]
+        except psutil.NoSuchProcess:
+            return
+        for proc in targets:
+            try:
+                proc.send_signal(sig)
+            except (psutil.NoSuchProcess, psutil.AccessDenied):
+                pass
+
+    async def wait(self, pid: int, timeout: Optional[float] = None) -> bool:
+        """Wait until pid exits; False on timeout."""
+        process = self._children.get(pid)
+        try:
+            if process is not None:
+                await asyncio.wait_for(process.wait(), timeout)
+            else:
+                await asyncio.wait_for(self._poll_exit(pid), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    async def _poll_exit(self, pid: int, interval: float = 0.1):
+        while not _exited(pid):
+            await asyncio.sleep(interval)
+
+    async def stop(self, pid: Optional[int], timeout: float = 10.0) -> bool:
+        """SIGTERM the service's process group, SIGKILL it after timeout seconds.
+
+        Returns False if the process was not running.
+        """
+        if pid is None or not self.is_running(pid):
+            return False
+        kill_signal = getattr(signal, "SIGKILL", signal.SIGTERM)
+        # Children are listed before the leader dies; afterwards they are reparented
+        leader = _is_group_leader(pid)
+        try:
+            stragglers = [] if leader else psutil.Process(pid).children(recursive=True)
+        except psutil.NoSuchProcess:
+            stragglers = []
+
+        self._signal(pid, signal.SIGTERM, leader)
+        if not await self.wait(pid, timeout):
+            logger.warning(f"Process {pid} didn't terminate in {timeout}s, force killing")
+            self._signal(pid, kill_signal, leader)
+            await self.wait(pid, 5)
+        if leader:
+            # Members that ignored SIGTERM outlive the leader
+            self._signal(pid, kill_signal, True)
+        for proc in stragglers:
+            try:
+                proc.kill()
+            except (psutil.NoSuchProcess, psutil.AccessDenied):
+                pass
+        logger.info(f"Stopped process {pid}")
+        return True
+
+    async def wait_ready(self, check: Callable[[], Union[bool, Awaitable[bool]]], timeout: float,
+                         pid: Optional[int] = None, interval: float = 0.5) -> bool:
+        """Poll check() until it is true; gives up early if pid exits."""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while True:
+            result = check()
+            if asyncio.iscoroutine(result):
+                result = await result
+            if result:
+                return True
+            if pid is not None and not self.is_running(pid):
+                return False
+            if loop.time() >= deadline:
+                return False
+            await asyncio.sleep(interval)
+
+    async def run_command(self, command: Command, cwd: Optional[str] = None, log_name: Optional[str] = None,
+                          timeout: Optional[float] = None, check: bool = False) -> subprocess.CompletedProcess:
+        """Async counterpart of subprocess.run for short commands (byzer.sh start, undeploy, ...).
+
+        Output goes to logs/<log_name>.out/.err when log_name is given and is
+        captured otherwise. On timeout the whole process group is killed.
+        """
+        if log_name is not None:
+            os.makedirs(LOGS_DIR, exist_ok=True)
+            await self._archive_logs(log_name)
+            stdout_path, stderr_path = log_paths(log_name)
+            stdout, stderr = open(stdout_path, "a"), open(stderr_path, "a")
+        else:
+            stdout = stderr = asyncio.subprocess.PIPE
+        try:
+            if isinstance(command, str):
+                process = await asyncio.create_subprocess_shell(
+                    command, stdout=stdout, stderr=stderr, stdin=subprocess.DEVNULL,
+                    cwd=cwd, start_new_session=True,
+                )
+            else:
+                process = await asyncio.create_subprocess_exec(
+                    *command, stdout=stdout, stderr=stderr, stdin=subprocess.DEVNULL,
+                    cwd=cwd, start_new_session=True,
+                )
+        finally:
+            if log_name is not None:
+                stdout.close()
+                stderr.close()
+
+        try:
+            out, err = await asyncio.wait_for(process.communicate(), timeout)
+        except asyncio.TimeoutError:
+            self._signal(process.pid, getattr(signal, "SIGKILL", signal.SIGTERM), True)
+            await process.wait()
+            raise
+        result = subprocess.CompletedProcess(command, process.returncode, out, err)
+        if check:
+            result.check_returncode()
+        return result
+
+
+async def port_open(host: str, port: int, timeout: float = 1.0) -> bool:
+    """Readiness check: something accepts TCP connections on host:port."""
+    if host in ("0.0.0.0", "::", ""):
+        host = "127.0.0.1"
+    try:
+        _, writer = await asyncio.wait_for(asyncio.open_connection(host, port), timeout)
+    except (OSError, asyncio.TimeoutError):
+        return False
+    writer.close()
+    try:
+        await writer.wait_closed()
+    except OSError:
+        pass
+    return True
+
+
+process_manager = ProcessManager()
@@ -0,0 +1,296 @@
+import os
+import re
+import sys
+import json
+import time
+import uuid
+import random
+import asyncio
+import threading
+from collections import Counter
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.security import HTTPAuthorizationCredentials
+from loguru import logger
+
+from .auth import verify_token
+from .openapi_router import verify_admin
+from .file_serving import file_response
+
+router = APIRouter()
+
+PROFILES_DIR = "profiles"
+PROFILE_HEADER = "x-profile"
+PROFILE_QUERY_PARAM = "__profile"
+PROFILE_SAMPLE_RATE_ENV = "WILLIAM_TOOLBOX_PROFILE_SAMPLE_RATE"
+PROFILE_INTERVAL_ENV = "WILLIAM_TOOLBOX_PROFILE_INTERVAL_MS"
+# Oldest profiles are deleted beyond this count
+MAX_PROFILES = 200
+
+WAITING_FRAME = "(waiting)"
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({code.co_filename}:{code.co_firstlineno})"
+
+
+def _stack_labels(frame) -> List[str]:
+    labels = []
+    while frame is not None:
+        labels.append(_frame_label(frame))
+        frame = frame.f_back
+    labels.reverse()
+    return labels
+
+
+class RequestProfile:
+    """Stack samples collected while one request's task was running."""
+
+    def __init__(self, method: str, path: str):
+        self.method = method
+        self.path = path
+        self.started_at = time.time()
+        self.start = time.perf_counter()
+        self.duration = 0.0
+        self.samples: "Counter[Tuple[str, ...]]" = Counter()
+        self.weights: Dict[Tuple[str, ...], float] = {}
+        slug = re.sub(r"[^A-Za-z0-9]+", "_", path).strip("_")[:60] or "root"
+        stamp = datetime.fromtimestamp(self.started_at).strftime("%Y%m%d-%H%M%S")
+        self.name = f"{stamp}-{method}-{slug}-{uuid.uuid4().hex[:6]}"
+
+    def add(self, stack: Tuple[str, ...], weight: float):
+        self.samples[stack] += 1
+        self.weights[stack] = self.weights.get(stack, 0.0) + weight
+
+    def collapsed(self) -> str:
+        """Brendan Gregg's collapsed-stack format (flamegraph.pl, speedscope, ...)."""
+        return "".join(f"{';'.join(stack)} {count}\n" for stack, count in self.samples.most_common())
+
+    def speedscope(self) -> Dict:
+        frame_index: Dict[str, int] = {}
+        frames = []
+        samples = []
+        weights = []
+        for stack, weight in self.weights.items():
+            indices = []
+            for label in stack:
+                if label not in frame_index:
+                    frame_index[label] = len(frames)
+                    func, _, location = label.partition(" (")
+                    file, _, line = location.rstrip(")").rpartition(":")
+                    frames.append({"name": func, "file": file, "line": int(line) if line.isdigit() else 0})
+                indices.append(frame_index[label])
+            samples.append(indices)
+            weights.append(weight)
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "name": self.name,
+            "exporter": "william-toolbox",
+            "shared": {"frames": frames},
+            "profiles": [
+                {
+                    "type": "sampled",
+                    "name": f"{self.method} {self.path}",
+                    "unit": "seconds",
+                    "startValue": 0,
+                    "endValue": self.duration,
+                    "samples": samples,
+                    "weights": weights,
+                }
+            ],
+        }
+
+
+class SamplingProfiler:
+    """Samples the event loop thread's stack for the requests being profiled.
+
+    A single background thread wakes every `interval` seconds while at least
+    one request is profiled. The sample is attributed to the request whose
+    task is currently running on the loop; when none of them is running the
+    time is counted as "(waiting)" for every profiled request, so the
+    flamegraph shows both on-loop CPU time and time spent awaiting I/O.
+    Work handed to thread pools is not sampled.
+    """
+
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self._active: Dict[asyncio.Task, RequestProfile] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread_id: Optional[int] = None
+        self._wake = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _run(self):
+        last = time.perf_counter()
+        while True:
+            if not self._active:
+                self._wake.clear()
+                self._wake.wait()
+                last = time.perf_counter()
+            time.sleep(self.interval)
+            now = time.perf_counter()
+            weight, last = now - last, now
+            frame = sys._current_frames().get(self._loop_thread_id)
+            current = asyncio.current_task(self._loop) if frame is not None else None
+            profile = self._active.get(current)
+            if profile is not None:
+                profile.add(tuple(_stack_labels(frame)), weight)
+            else:
+                for profile in list(self._active.values()):
+                    profile.add((WAITING_FRAME,), weight)
+
+    def begin(self, method: str, path: str) -> RequestProfile:
+        task = asyncio.current_task()
+        if self._loop is None:
+            self._loop = asyncio.get_running_loop()
+            self._loop_thread_id = threading.get_ident()
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+            self._thread.start()
+        profile = RequestProfile(method, path)
+        self._active[task] = profile
+        self._wake.set()
+        return profile
+
+    def end(self, profile: RequestProfile):
+        for task, active in list(self._active.items()):
+            if active is profile:
+                del self._active[task]
+        profile.duration = time.perf_counter() - profile.start
+
+
+def _write_profile(profile: RequestProfile):
+    os.makedirs(PROFILES_DIR, exist_ok=True)
+    with open(os.path.join(PROFILES_DIR, f"{profile.name}.collapsed"), "w") as f:
+        f.write(profile.collapsed())
+    with open(os.path.join(PROFILES_DIR, f"{profile.name}.speedscope.json"), "w") as f:
+        json.dump(profile.speedscope(), f)
+
+    profiles = sorted(
+        (entry for entry in os.scandir(PROFILES_DIR) if entry.name.endswith(".collapsed")),
+        key=lambda entry: entry.stat().st_mtime,
+    )
+    for entry in profiles[:-MAX_PROFILES]:
+        base = entry.path[: -len(".collapsed")]
+        for path in (entry.path, f"{base}.speedscope.json"):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+
+def profile_sample_rate() -> float:
+    try:
+        return min(1.0, max(0.0, float(os.environ.get(PROFILE_SAMPLE_RATE_ENV, "0"))))
+    except ValueError:
+        return 0.0
+
+
+def profile_interval() -> float:
+    try:
+        return max(1.0, float(os.environ.get(PROFILE_INTERVAL_ENV, "5"))) / 1000
+    except ValueError:
+        return 0.005
+
+
+async def _is_admin(authorization: str) -> bool:
+    scheme, _, token = authorization.partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        return False
+    try:
+        payload = verify_token(HTTPAuthorizationCredentials(scheme=scheme, credentials=token))
+        await verify_admin(payload)
+    except HTTPException:
+        return False
+    return True
+
+
+class ProfilerMiddleware:
+    """Profiles requests on demand.
+
+    A request is profiled when it carries `X-Profile: 1` (or `?__profile=1`)
+    together with an admin token, or at random with the configured sample
+    rate. The profile name is returned in the `X-Profile-Id` header.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.profiler = SamplingProfiler(profile_interval())
+        self.sample_rate = profile_sample_rate()
+
+    async def _should_profile(self, scope) -> bool:
+        headers = {name: value for name, value in scope.get("headers", [])}
+        requested = headers.get(PROFILE_HEADER.encode()) in (b"1", b"true")
+        if not requested and scope.get("query_string"):
+            requested = f"{PROFILE_QUERY_PARAM}=1".encode() in scope["query_string"].split(b"&")
+        if requested:
+            return await _is_admin(headers.get(b"authorization", b"").decode("latin-1"))
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"].startswith("/diagnostics/profiles"):
+            await self.app(scope, receive, send)
+            return
+        if not await self._should_profile(scope):
+            await self.app(scope, receive, send)
+            return
+
+        profile = self.profiler.begin(scope["method"], scope["path"])
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", [])) + [(b"x-profile-id", profile.name.encode())]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            self.profiler.end(profile)
+            try:
+                await asyncio.to_thread(_write_profile, profile)
+                logger.info(f"Profiled {profile.method} {profile.path} in {profile.duration:.3f}s -> {profile.name}")
+            except OSError as e:
+                logger.error(f"Failed to write profile {profile.name}: {str(e)}")
+
+
+@router.get("/diagnostics/profiles")
+async def list_profiles(_: dict = Depends(verify_admin)):
+    """Stored request profiles, newest first."""
+
+    def scan():
+        if not os.path.isdir(PROFILES_DIR):
+            return []
+        profiles = []
+        for entry in os.scandir(PROFILES_DIR):
+            if not entry.name.endswith(".collapsed"):
+                continue
+            stat = entry.stat()
+            profiles.append({
+                "name": entry.name[: -len(".collapsed")],
+                "created_at": datetime.fromtimestamp(stat.st_mtime).isoformat(),
+                "size": stat.st_size,
+            })
+        return sorted(profiles, key=lambda profile: profile["created_at"], reverse=True)
+
+    return {"profiles": await asyncio.to_thread(scan)}
+
+
+@router.get("/diagnostics/profiles/{name}")
+async def download_profile(name: str, request: Request, format: str = "speedscope",
+                           _: dict = Depends(verify_admin)):
+    """Download a profile as speedscope JSON or collapsed stacks (format=collapsed)."""
+    if not re.fullmatch(r"[A-Za-z0-9_.-]+", name):
+        raise HTTPException(status_code=400, detail="Invalid profile name")
+    if format not in ("speedscope", "collapsed"):
+        raise HTTPException(status_code=400, detail="format must be speedscope or collapsed")
+    suffix, media_type = (
+        (".speedscope.json", "application/json") if format == "speedscope" else (".collapsed", "text/plain")
+    )
+    try:
+        return await file_response(
+            request, os.path.join(PROFILES_DIR, name + suffix), cache_control="no-cache", media_type=media_type
+        )
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail=f"Profile {name} not found")
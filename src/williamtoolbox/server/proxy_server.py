@@ -10,6 +10,7 @@ import os
 import argparse
 import aiofiles
 import pkg_resources
+from .response_cache import ResponseCache, parse_cache_rules
 
 app = FastAPI()
 
@@ -25,7 +26,6 @@ app.add_middleware(
 index_html_path = pkg_resources.resource_filename("williamtoolbox", "web/index.html")
 resource_dir = os.path.dirname(index_html_path)
 static_dir = os.path.join(resource_dir, "static")
-app.mount("/static", StaticFiles(directory=static_dir), name="static")
 
 # Backend and File Upload URLs
 global BACKEND_URL
@@ -34,13 +34,15 @@ BACKEND_URL = "http://localhost:8005"  # Default backend URL
 # Use a session-wide HTTP client
 app.state.client = httpx.AsyncClient()
 
+# Optional micro-cache for hot idempotent GETs, enabled with --enable_response_cache
+app.state.response_cache = None
+
 
 @app.on_event("shutdown")
 async def shutdown_event():
     await app.state.client.aclose()
 
 
-@app.get("/", response_class=HTMLResponse)
 async def read_root():
     index_path = index_html_path
     if os.path.exists(index_path):
@@ -51,11 +53,31 @@ async def read_root():
         return HTMLResponse(content="<h1>Welcome to Proxy Server</h1>")
 
 
+def mount_frontend(target_app: FastAPI):
+    """Serve the web UI (index page and static assets) from target_app.
+
+    Must be called before any catch-all route is registered on target_app.
+    """
+    target_app.mount("/static", StaticFiles(directory=static_dir), name="static")
+    target_app.add_api_route("/", read_root, methods=["GET"], response_class=HTMLResponse)
+
+
+mount_frontend(app)
+
+
 @app.get("/get_backend_url")
 async def get_backend_url():
     return {"backend_url": BACKEND_URL}
 
 
+@app.get("/get_response_cache_stats")
+async def get_response_cache_stats():
+    cache = app.state.response_cache
+    if cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **cache.snapshot()}
+
+
 @app.api_route(
     "/{path:path}", methods=["GET", "POST", "PUT", "DELETE", "PATCH", "HEAD", "OPTIONS"]
 )
@@ -117,16 +139,37 @@ async def proxy(request: Request, path: str):
             )
         else:
             # 普通请求处理
-            response = await app.state.client.request(
-                method, url, headers=headers, params=params, content=body, timeout=3000
-            )
-            print(f"Response Status Code: {response.status_code}")
-            print(f"Response Headers: {response.headers}")
-            print(f"Response Content: {response.content}")
+            async def fetch():
+                response = await app.state.client.request(
+                    method, url, headers=headers, params=params, content=body, timeout=3000
+                )
+                print(f"Response Status Code: {response.status_code}")
+                print(f"Response Headers: {response.headers}")
+                print(f"Response Content: {response.content}")
+                return response.content, response.status_code, dict(response.headers)
+
+            cache = app.state.response_cache
+            if cache is None:
+                content, status_code, response_headers = await fetch()
+            elif method == "GET":
+                content, status_code, response_headers, cache_state = await cache.get_or_fetch(
+                    f"/{path}",
+                    request.url.query,
+                    request.headers.get("authorization", ""),
+                    fetch,
+                )
+                response_headers = {**response_headers, "X-Proxy-Cache": cache_state}
+            else:
+                try:
+                    content, status_code, response_headers = await fetch()
+                finally:
+                    if method not in ("HEAD", "OPTIONS"):
+                        cache.invalidate(f"/{path}")
+
             return Response(
-                content=response.content,
-                status_code=response.status_code,
-                headers=dict(response.headers),
+                content=content,
+                status_code=status_code,
+                headers=response_headers,
             )
     except httpx.RequestError as exc:
         import traceback
@@ -161,9 +204,25 @@ def main():
         default="0.0.0.0",
         help="Host to run the proxy server on (default: 0.0.0.0)",
     )
+    parser.add_argument(
+        "--enable_response_cache",
+        action="store_true",
+        help="Cache hot idempotent GETs (model/RAG lists, config, status) for a few seconds",
+    )
+    parser.add_argument(
+        "--response_cache_ttl",
+        type=str,
+        action="append",
+        default=None,
+        metavar="PATTERN=SECONDS",
+        help="Override the cache TTL for paths matching PATTERN (regex); 0 disables caching. Can be repeated.",
+    )
     args = parser.parse_args()
 
     BACKEND_URL = args.backend_url
+    if args.enable_response_cache:
+        app.state.response_cache = ResponseCache(parse_cache_rules(args.response_cache_ttl))
+        print("Response cache enabled")
 
     print(f"Starting proxy server with backend URL: {BACKEND_URL}")
     uvicorn.run(app, host=args.host, port=args.port)
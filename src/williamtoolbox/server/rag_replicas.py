@@ -0,0 +1,226 @@
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+from loguru import logger
+
+from ..metrics import Counter
+from ..storage.shared_state import get_shared_state
+from .supervisor import SERVICE_STATUS, RAG, service_key, replica_name
+from .process_manager import process_manager
+from .readiness import readiness, default_health_url, READY
+from .port_allocator import allocate
+
+# Replicas are extra auto-coder.rag processes serving the same doc_dir and
+# index on their own ports. A RAG entry keeps them in "replicas"
+# ([{"index", "port", "process_id"}], index 1..replica_count-1); the process
+# configured in the entry itself is replica 0. Each replica is a separate
+# service ("<rag>@<index>") for the supervisor, readiness probes and logs.
+MAX_REPLICAS = 16
+
+RAG_ROUTED = Counter("rag_replica_requests_total", "Requests routed to a RAG replica.", ["replica"])
+
+
+def build_rag_command(rag_info: Dict[str, Any], port: int) -> str:
+    """auto-coder.rag serve command line for a RAG entry listening on port."""
+    product_type = rag_info.get("product_type", "lite")
+    rag_doc_filter_relevance = int(rag_info["rag_doc_filter_relevance"])
+    command = "auto-coder.rag serve"
+    command += " --quick"
+    command += f" --model {rag_info['model']}"
+
+    # 添加新的模型参数（如果有指定）
+    if rag_info.get("recall_model"):
+        command += f" --recall_model {rag_info['recall_model']}"
+
+    if rag_info.get("chunk_model"):
+        command += f" --chunk_model {rag_info['chunk_model']}"
+
+    if rag_info.get("qa_model"):
+        command += f" --qa_model {rag_info['qa_model']}"
+
+    # 只在tokenizer_path有值时添加该参数
+    if rag_info.get("tokenizer_path"):
+        command += f" --tokenizer_path {rag_info['tokenizer_path']}"
+
+    command += f" --doc_dir {rag_info['doc_dir']}"
+    command += f" --rag_doc_filter_relevance {rag_doc_filter_relevance}"
+    command += f" --host {rag_info['host'] or '0.0.0.0'}"
+    command += f" --port {port}"
+
+    # 根据产品类型添加相应的参数
+    if product_type == "lite":
+        command += " --lite"
+    else:
+        command += " --pro"
+
+    if rag_info["required_exts"]:
+        command += f" --required_exts {rag_info['required_exts']}"
+    if rag_info["disable_inference_enhance"]:
+        command += " --disable_inference_enhance"
+    if rag_info["inference_deep_thought"]:
+        command += " --inference_deep_thought"
+
+    if rag_info["without_contexts"]:
+        command += " --without_contexts"
+
+    if "enable_hybrid_index" in rag_info and rag_info["enable_hybrid_index"]:
+        command += " --enable_hybrid_index"
+
+        if "emb_model" in rag_info:
+            command += f" --emb_model {rag_info['emb_model']}"
+
+        if "hybrid_index_max_output_tokens" in rag_info:
+            command += f" --hybrid_index_max_output_tokens {rag_info['hybrid_index_max_output_tokens']}"
+
+    # 添加本地图片托管参数
+    if "enable_local_image_host" in rag_info and rag_info["enable_local_image_host"]:
+        command += " --enable_local_image_host"
+
+    if "infer_params" in rag_info:
+        for key, value in rag_info["infer_params"].items():
+            if value in ["true", "True"]:
+                command += f" --{key}"
+            elif value in ["false", "False"]:
+                continue
+            else:
+                command += f" --{key} {value}"
+    return command
+
+
+def _client_host(rag_info: Dict[str, Any]) -> str:
+    host = rag_info.get("host", "localhost")
+    return "127.0.0.1" if host == "0.0.0.0" else host
+
+
+async def start_replicas(rag_name: str, rag_info: Dict[str, Any]) -> None:
+    """Start the replicas (1..replica_count-1) of a RAG that are not running.
+
+    A replica gets its previous port back when that is still free, else the
+    next free port of the RAG port range. Updates rag_info["replicas"]; the
+    caller saves the entry.
+    """
+    count = int(rag_info.get("replica_count") or 1)
+    replicas = {r["index"]: r for r in rag_info.get("replicas") or []}
+    host = rag_info.get("host") or "0.0.0.0"
+    try:
+        for index in range(1, count):
+            replica = replicas.setdefault(index, {"index": index})
+            if replica.get("process_id") and process_manager.is_running(replica["process_id"]):
+                continue
+            name = replica_name(rag_name, index)
+            port = await allocate(RAG, name, host, preferred=replica.get("port"))
+            process_id = await process_manager.start(build_rag_command(rag_info, port), log_name=name)
+            replica.update(port=port, process_id=process_id)
+            await readiness.watch(RAG, name, default_health_url(rag_info.get("host"), port), pid=process_id)
+            logger.info(f"Started replica {name} on port {port}")
+    finally:
+        # Also on failure: replicas started so far must stay reachable for stop
+        rag_info["replicas"] = [replicas[i] for i in sorted(replicas) if i < count or replicas[i].get("process_id")]
+
+
+async def stop_replicas(rag_name: str, rag_info: Dict[str, Any], keep: int = 1) -> None:
+    """Stop replicas with index >= keep (keep=1: all of them).
+
+    Stopped replicas within replica_count keep their entry (and port) for
+    the next start; the others are removed.
+    """
+    count = int(rag_info.get("replica_count") or 1)
+    remaining = []
+    for replica in rag_info.get("replicas") or []:
+        if replica["index"] >= keep:
+            if replica.get("process_id"):
+                await process_manager.stop(replica["process_id"])
+            replica.pop("process_id", None)
+            await readiness.forget(RAG, replica_name(rag_name, replica["index"]))
+        if replica["index"] < count:
+            remaining.append(replica)
+    rag_info["replicas"] = remaining
+
+
+class RagBalancer:
+    """Routes RAG requests to the healthy replica with the fewest requests in flight.
+
+    Outstanding requests are counted per backend worker, which is where the
+    requests are proxied from; ties rotate. A replica is healthy when the
+    supervisor sees its process running and its readiness probe passed.
+    """
+
+    def __init__(self):
+        self._outstanding: Dict[str, int] = {}
+        self._turn = 0
+
+    def _candidates(self, rag_name: str, rag_info: Dict[str, Any]) -> List[Tuple[str, int]]:
+        candidates = [(rag_name, rag_info.get("port") or 8000)]
+        for replica in rag_info.get("replicas") or []:
+            if replica.get("process_id"):
+                candidates.append((replica_name(rag_name, replica["index"]), replica["port"]))
+        return candidates
+
+    async def _healthy(self, candidates: List[Tuple[str, int]]) -> List[Tuple[str, int]]:
+        state = get_shared_state()
+        healthy = []
+        for name, port in candidates:
+            status = await state.get(SERVICE_STATUS, service_key(RAG, name))
+            if status is not None and status["status"] != "running":
+                continue
+            entry = await readiness.get(RAG, name)
+            if entry is not None and entry["state"] != READY:
+                continue
+            healthy.append((name, port))
+        return healthy
+
+    async def acquire(self, rag_name: str, rag_info: Dict[str, Any]) -> Tuple[str, str]:
+        """Pick a replica; returns (replica, base_url). Pair with release()."""
+        candidates = self._candidates(rag_name, rag_info)
+        healthy = await self._healthy(candidates) if len(candidates) > 1 else []
+        if not healthy:
+            # Single process, or no replica ready: wait for / fail on the RAG itself
+            await readiness.ensure_ready(RAG, rag_name)
+            healthy = candidates[:1]
+        self._turn += 1
+        n = len(healthy)
+        _, (name, port) = min(
+            enumerate(healthy),
+            key=lambda item: (self._outstanding.get(item[1][0], 0), (item[0] - self._turn) % n),
+        )
+        self._outstanding[name] = self._outstanding.get(name, 0) + 1
+        RAG_ROUTED.inc(replica=name)
+        return name, f"http://{_client_host(rag_info)}:{port}/v1"
+
+    def release(self, lease: Optional[Tuple[str, str]]) -> None:
+        if lease is None:
+            return
+        name = lease[0]
+        self._outstanding[name] = max(0, self._outstanding.get(name, 0) - 1)
+
+    @asynccontextmanager
+    async def route(self, rag_name: str, rag_info: Dict[str, Any]) -> AsyncIterator[str]:
+        """base_url of a replica for the duration of one request."""
+        lease = await self.acquire(rag_name, rag_info)
+        try:
+            yield lease[1]
+        finally:
+            self.release(lease)
+
+    async def table(self, rag_name: str, rag_info: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Every replica of a RAG with its port, process, health and load."""
+        state = get_shared_state()
+        rows = []
+        members = [{"index": 0, "port": rag_info.get("port"), "process_id": rag_info.get("process_id")}]
+        members += rag_info.get("replicas") or []
+        for member in members:
+            name = rag_name if member["index"] == 0 else replica_name(rag_name, member["index"])
+            status = await state.get(SERVICE_STATUS, service_key(RAG, name))
+            entry = await readiness.get(RAG, name)
+            rows.append({
+                "replica": name,
+                "index": member["index"],
+                "port": member.get("port"),
+                "process_id": member.get("process_id"),
+                "status": status["status"] if status else "unknown",
+                "readiness": entry["state"] if entry else None,
+                "outstanding": self._outstanding.get(name, 0),
+            })
+        return rows
+
+
+rag_balancer = RagBalancer()
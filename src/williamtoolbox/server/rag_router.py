@@ -1,45 +1,48 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Request
+from sse_starlette.sse import EventSourceResponse
 import os
+import json
 import aiofiles
 from loguru import logger
 import traceback
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional
 from pathlib import Path
-from ..storage.json_file import load_rags_from_json, save_rags_to_json
-from .request_types import AddRAGRequest
+from ..storage.json_file import load_rags_from_json, save_rags_to_json, update_rag_in_json, set_rag_fields
+from .supervisor import service_supervisor, RAG, replica_name
+from .process_manager import process_manager
+from .readiness import readiness, default_health_url
+from .log_tail import read_chunk
+from .log_rotation import log_rotator
+from .doc_manifest import delete_manifest
+from .build_queue import build_queue, QUEUED, RUNNING, SUCCEEDED, FINISHED
+from .doc_watcher import doc_watcher
+from .request_types import AddRAGRequest, ScaleRAGRequest
+from .port_allocator import reserve, allocate, PortConflict
+from .rag_replicas import build_rag_command, start_replicas, stop_replicas, rag_balancer, MAX_REPLICAS
 import subprocess
 import signal
-import psutil
 import asyncio
 import tempfile
-import uuid
 import time
 
 router = APIRouter()
 
-# 存储构建缓存任务的状态和日志
-cache_build_tasks = {}
-
 @router.get("/rags", response_model=List[Dict[str, Any]])
 async def list_rags():
     """List all RAGs and their current status."""
     rags = await load_rags_from_json()
     
-    # Check and update status for each RAG
+    # 进程状态由 supervisor 后台统一检测，这里只读取状态表
+    statuses = await service_supervisor.table(RAG)
+    readiness_table = await readiness.table(RAG)
     for rag_name, rag_info in rags.items():
-        process_id = rag_info.get("process_id")
-        if process_id is not None:
-            try:
-                process = psutil.Process(process_id)
-                if not process.is_running():
-                    rag_info["status"] = "stopped"
-                    del rag_info["process_id"]
-            except psutil.NoSuchProcess:
-                rag_info["status"] = "stopped"
-                if "process_id" in rag_info:
-                    del rag_info["process_id"]
+        entry = statuses.get(rag_name)
+        if entry is not None:
+            rag_info["status"] = entry["status"]
+        # starting / ready / unhealthy，只对运行中的 RAG 有意义
+        if rag_info.get("status") == "running" and rag_name in readiness_table:
+            rag_info["readiness"] = readiness_table[rag_name]["state"]
     
-    await save_rags_to_json(rags)
     return [{"name": name, **info} for name, info in rags.items()]
 
 
@@ -64,13 +67,12 @@ async def delete_rag(rag_name: str):
     # Delete the RAG
     del rags[rag_name]
     await save_rags_to_json(rags)
+    await delete_manifest(rag_name)
 
-    # Try to delete log files if they exist
+    # Try to delete log files (with rotated segments and replica logs) if they exist
     try:
-        log_files = [f"logs/{rag_name}.out", f"logs/{rag_name}.err"]
-        for log_file in log_files:
-            if os.path.exists(log_file):
-                os.remove(log_file)
+        for log_name in [rag_name] + [replica_name(rag_name, index) for index in range(1, MAX_REPLICAS)]:
+            await log_rotator.delete(log_name)
     except Exception as e:
         logger.warning(
             f"Failed to delete log files for RAG {rag_name}: {str(e)}")
@@ -88,19 +90,9 @@ async def get_rag(rag_name: str):
             status_code=404, detail=f"RAG {rag_name} not found")
 
     rag_info = rags[rag_name]
-    process_id = rag_info.get("process_id")
-    if process_id is not None:
-        try:
-            process = psutil.Process(process_id)
-            if not process.is_running():
-                rag_info["status"] = "stopped"
-                del rag_info["process_id"]
-        except psutil.NoSuchProcess:
-            rag_info["status"] = "stopped"
-            if "process_id" in rag_info:
-                del rag_info["process_id"]
-    
-    await save_rags_to_json(rags)
+    entry = await service_supervisor.get(RAG, rag_name)
+    if entry is not None:
+        rag_info["status"] = entry["status"]
     return rag_info
 
 
@@ -120,8 +112,15 @@ async def update_rag(rag_name: str, request: AddRAGRequest):
             detail="Cannot update a running RAG. Please stop it first."
         )
 
-    # Update the RAG configuration
-    rag_info.update(request.model_dump())
+    # Update the RAG configuration; fields the client did not send keep
+    # their stored values instead of being reset to the request defaults
+    rag_info.update(request.model_dump(exclude_unset=True))
+    # 新端口同样不能与其他受管服务冲突
+    if rag_info.get("port"):
+        try:
+            await reserve(RAG, rag_name, rag_info["port"], rag_info.get("host"), probe=False)
+        except PortConflict as e:
+            raise HTTPException(status_code=400, detail=str(e))
     rags[rag_name] = rag_info
     logger.info(f"RAG {rag_name} updated: {rag_info}")
     await save_rags_to_json(rags)
@@ -132,7 +131,7 @@ async def update_rag(rag_name: str, request: AddRAGRequest):
 @router.get("/rags/{rag_name}/logs/{log_type}/{offset}")
 async def get_rag_logs(rag_name: str, log_type: str, offset: int = 0) -> Dict[str, Any]:
     """Get the logs for a specific RAG with offset support.
-    If offset is negative, returns the last |offset| characters from the end of file.
+    If offset is negative, returns the last |offset| bytes from the end of file.
     """
     if log_type not in ["out", "err"]:
         raise HTTPException(status_code=400, detail="Invalid log type")
@@ -140,39 +139,8 @@ async def get_rag_logs(rag_name: str, log_type: str, offset: int = 0) -> Dict[st
     log_file = f"logs/{rag_name}.{log_type}"
 
     try:
-        if not os.path.exists(log_file):
-            return {"content": "", "exists": False, "offset": 0}
-
-        file_size = os.path.getsize(log_file)
-
-        if offset < 0:
-            # For negative offset, read the last |offset| characters
-            read_size = min(abs(offset), file_size)
-            async with aiofiles.open(log_file, mode='r') as f:
-                if read_size < file_size:
-                    await f.seek(file_size - read_size)
-                content = await f.read(read_size)
-                current_offset = file_size
-            return {
-                "content": content,
-                "exists": True,
-                "offset": current_offset
-            }
-        else:
-            # For positive offset, read from the specified position to end
-            if offset > file_size:
-                return {"content": "", "exists": True, "offset": file_size}
-
-            async with aiofiles.open(log_file, mode='r') as f:
-                await f.seek(offset)
-                content = await f.read()
-                current_offset = await f.tell()
-            return {
-                "content": content,
-                "exists": True,
-                "offset": current_offset
-            }
-
+        # 每次最多读取 MAX_CHUNK_BYTES，前端从返回的 offset 继续轮询
+        return await read_chunk(log_file, offset)
     except Exception as e:
         logger.error(f"Error reading log file: {str(e)}")
         logger.error(traceback.format_exc())
@@ -188,13 +156,14 @@ async def add_rag(rag: AddRAGRequest):
         raise HTTPException(
             status_code=400, detail=f"RAG {rag.name} already exists")
 
-    # Check if the port is already in use by another RAG
-    for other_rag in rags.values():
-        if other_rag["port"] == rag.port:
-            raise HTTPException(
-                status_code=400,
-                detail=f"Port {rag.port} is already in use by RAG {other_rag['name']}",
-            )
+    # 端口冲突检查覆盖所有受管服务（模型、RAG、Super Analysis、Byzer SQL、OpenAI 服务）
+    try:
+        if rag.port:
+            await reserve(RAG, rag.name, rag.port, rag.host, probe=False)
+        else:
+            rag.port = await allocate(RAG, rag.name, rag.host)
+    except PortConflict as e:
+        raise HTTPException(status_code=400, detail=str(e))
             
     # 确保设置默认的product_type
     rag_data = rag.model_dump()
@@ -204,7 +173,7 @@ async def add_rag(rag: AddRAGRequest):
     new_rag = {"status": "stopped", **rag_data}
     rags[rag.name] = new_rag
     await save_rags_to_json(rags)
-    return {"message": f"RAG {rag.name} added successfully"}
+    return {"message": f"RAG {rag.name} added successfully", "port": rag.port}
 
 
 @router.post("/rags/{rag_name}/{action}")
@@ -229,229 +198,113 @@ async def manage_rag(rag_name: str, action: str):
     # 例如，如果有某些操作只允许Pro版本执行
 
     if action == "start":
-        # Check if the port is already in use by another RAG
-        port = rag_info["port"] or 8000
-        for other_rag in rags.values():
-            if other_rag["name"] != rag_name and other_rag["port"] == port:
-                raise HTTPException(
-                    status_code=400,
-                    detail=f"Port {port} is already in use by RAG {other_rag['name']}",
-                )
-
-        rag_doc_filter_relevance = int(rag_info["rag_doc_filter_relevance"])
-        command = "auto-coder.rag serve"
-        command += f" --quick"
-        command += f" --model {rag_info['model']}"
-        
-        # 添加新的模型参数（如果有指定）
-        if rag_info.get("recall_model"):
-            command += f" --recall_model {rag_info['recall_model']}"
-            
-        if rag_info.get("chunk_model"):
-            command += f" --chunk_model {rag_info['chunk_model']}"
-            
-        if rag_info.get("qa_model"):
-            command += f" --qa_model {rag_info['qa_model']}"
-        
-        # 只在tokenizer_path有值时添加该参数
-        if rag_info.get("tokenizer_path"):
-            command += f" --tokenizer_path {rag_info['tokenizer_path']}"
-            
-        command += f" --doc_dir {rag_info['doc_dir']}"
-        command += f" --rag_doc_filter_relevance {rag_doc_filter_relevance}"
-        command += f" --host {rag_info['host'] or '0.0.0.0'}"
-        command += f" --port {port}"
-
-        # 根据产品类型添加相应的参数
-        if product_type == "lite":
-            command += f" --lite"
-        else:
-            command += f" --pro"
-
-        if rag_info["required_exts"]:
-            command += f" --required_exts {rag_info['required_exts']}"
-        if rag_info["disable_inference_enhance"]:
-            command += f" --disable_inference_enhance"
-        if rag_info["inference_deep_thought"]:
-            command += f" --inference_deep_thought"
-
-        if rag_info["without_contexts"]:
-            command += f" --without_contexts"
-            
-        if "enable_hybrid_index" in rag_info and rag_info["enable_hybrid_index"]:
-            command += f" --enable_hybrid_index"
-            
-            if "emb_model" in rag_info:
-                command += f" --emb_model {rag_info['emb_model']}"
+        # The port must be free of other services and unbound on this host;
+        # a RAG without one gets the next free port of the range
+        try:
+            if rag_info.get("port"):
+                port = await reserve(RAG, rag_name, rag_info["port"], rag_info.get("host"))
+            else:
+                port = rag_info["port"] = await allocate(RAG, rag_name, rag_info.get("host"))
+        except PortConflict as e:
+            raise HTTPException(status_code=400, detail=str(e))
 
-            if "hybrid_index_max_output_tokens" in rag_info:
-                command += f" --hybrid_index_max_output_tokens {rag_info['hybrid_index_max_output_tokens']}"
-        
-        # 添加本地图片托管参数
-        if "enable_local_image_host" in rag_info and rag_info["enable_local_image_host"]:
-            command += f" --enable_local_image_host"
-
-        if "infer_params" in rag_info:
-            for key, value in rag_info["infer_params"].items():
-                if value in ["true", "True"]:
-                    command += f" --{key}"
-                elif value in ["false", "False"]:
-                    continue
-                else:
-                    command += f" --{key} {value}"
+        command = build_rag_command(rag_info, port)
 
         logger.info(f"manage rag {rag_name} with command: {command}")
         try:
-            # Create logs directory if it doesn't exist
-            os.makedirs("logs", exist_ok=True)
-
-            # Open log files for stdout and stderr
-            stdout_log_path = os.path.join("logs", f"{rag_info['name']}.out")
-            stderr_log_path = os.path.join("logs", f"{rag_info['name']}.err")
-            
-            stdout_log = open(stdout_log_path, "w")
-            stderr_log = open(stderr_log_path, "w")
-            
-            # Store file descriptors in rag_info for later cleanup
-            rag_info["stdout_fd"] = stdout_log.fileno()
-            rag_info["stderr_fd"] = stderr_log.fileno() 
-            
-            # 使用修改后的环境变量启动进程
-            process = await asyncio.create_subprocess_shell(
-                command,
-                stdout=stdout_log,
-                stderr=stderr_log                
-            )
-            
-            # 保存更多信息以便后续终止
+            # 日志文件由子进程持有，后端启动后即关闭自己的句柄
+            process_id = await process_manager.start(command, log_name=rag_info["name"])
             rag_info["status"] = "running"
-            rag_info["process_id"] = process.pid                                
+            rag_info["process_id"] = process_id
+            await readiness.watch(
+                RAG, rag_name,
+                rag_info.get("health_check_url") or default_health_url(rag_info.get("host"), port),
+                pid=process_id,
+            )
+            # 额外的副本（replica_count > 1）共享同一 doc_dir 和索引，端口自动分配
+            await start_replicas(rag_name, rag_info)
         except Exception as e:
-            # Clean up file handles in case of error
-            if 'stdout_fd' in rag_info:
-                try:
-                    os.close(rag_info['stdout_fd'])
-                    del rag_info['stdout_fd']
-                except:
-                    pass
-                    
-            if 'stderr_fd' in rag_info:
-                try:
-                    os.close(rag_info['stderr_fd'])
-                    del rag_info['stderr_fd']
-                except:
-                    pass
-                    
             logger.error(f"Failed to start RAG: {str(e)}")
             traceback.print_exc()
+            # Record what did start (the RAG and any replicas) so stop can reach it
+            await update_rag_in_json(rag_name, rag_info)
+            await service_supervisor.refresh()
             raise HTTPException(
                 status_code=500, detail=f"Failed to start RAG: {str(e)}"
             )
     else:  # action == "stop"
-        if "process_id" in rag_info:
-            try:
-                process_id = rag_info["process_id"]
-                # Get the process object
-                process = psutil.Process(process_id)
-                
-                # Kill any child processes first
-                try:
-                    children = process.children(recursive=True)
-                    for child in children:
-                        child.kill()
-                except:
-                    pass
-                
-                # Then try to terminate gracefully (SIGTERM)
-                process.terminate()
-                
-                # Wait up to 5 seconds for graceful termination
-                try:
-                    process.wait(timeout=5)
-                except psutil.TimeoutExpired:
-                    # If process doesn't terminate in time, force kill it
-                    logger.warning(f"Process {process_id} didn't terminate gracefully, force killing")
-                    process.kill()
-                                                    
-                logger.info(f"Successfully stopped RAG process {process_id}")
-                
-                # Close any open file descriptors
-                if 'stdout_fd' in rag_info:
-                    try:
-                        os.close(rag_info['stdout_fd'])
-                    except OSError:
-                        pass  # Already closed
-                    del rag_info['stdout_fd']
-                
-                if 'stderr_fd' in rag_info:
-                    try:
-                        os.close(rag_info['stderr_fd'])
-                    except OSError:
-                        pass  # Already closed
-                    del rag_info['stderr_fd']
-                                
-                rag_info["status"] = "stopped"
-                for key in ["process_id", "pgid", "service_id"]:
-                    if key in rag_info:
-                        del rag_info[key]
-                
-            except psutil.NoSuchProcess:
-                # Process already not running, just update status and clean up file handles
+        try:
+            # SIGTERM 整个进程组，超时后 SIGKILL；等待过程不阻塞事件循环
+            if not await process_manager.stop(rag_info.get("process_id")):
                 logger.info(f"Process {rag_info.get('process_id')} already not running")
-                
-                # Close any open file descriptors
-                if 'stdout_fd' in rag_info:
-                    try:
-                        os.close(rag_info['stdout_fd'])
-                    except OSError:
-                        pass  # Already closed
-                    del rag_info['stdout_fd']
-                
-                if 'stderr_fd' in rag_info:
-                    try:
-                        os.close(rag_info['stderr_fd'])
-                    except OSError:
-                        pass  # Already closed
-                    del rag_info['stderr_fd']
-                    
-                rag_info["status"] = "stopped"
-                for key in ["process_id", "pgid", "service_id"]:
-                    if key in rag_info:
-                        del rag_info[key]
-            except Exception as e:
-                logger.error(f"Failed to stop RAG: {str(e)}")
-                traceback.print_exc()
-                raise HTTPException(
-                    status_code=500, detail=f"Failed to stop RAG: {str(e)}"
-                )
-        else:
-            rag_info["status"] = "stopped"
-            
-            # Clean up any lingering file descriptors
-            if 'stdout_fd' in rag_info:
-                try:
-                    os.close(rag_info['stdout_fd'])
-                except OSError:
-                    pass  # Already closed
-                del rag_info['stdout_fd']
-            
-            if 'stderr_fd' in rag_info:
-                try:
-                    os.close(rag_info['stderr_fd'])
-                except OSError:
-                    pass  # Already closed
-                del rag_info['stderr_fd']
+            await stop_replicas(rag_name, rag_info)
+        except Exception as e:
+            logger.error(f"Failed to stop RAG: {str(e)}")
+            traceback.print_exc()
+            raise HTTPException(
+                status_code=500, detail=f"Failed to stop RAG: {str(e)}"
+            )
+        rag_info["status"] = "stopped"
+        await readiness.forget(RAG, rag_name)
+        # stdout_fd/stderr_fd were recorded by older versions; the numbers are meaningless now
+        for key in ["process_id", "pgid", "service_id", "stdout_fd", "stderr_fd"]:
+            rag_info.pop(key, None)
 
     # 确保保存product_type
     if "product_type" not in rag_info:
         rag_info["product_type"] = product_type
         
-    rags[rag_name] = rag_info
-    await save_rags_to_json(rags)
+    # 只更新当前 RAG 的记录，并发启停其他 RAG 时不会互相覆盖
+    await update_rag_in_json(rag_name, rag_info)
+    await service_supervisor.refresh()
 
     return {"message": f"RAG {rag_name} {action}ed successfully"}
 
 
+@router.get("/rags/{rag_name}/replicas")
+async def get_rag_replicas(rag_name: str):
+    """Replicas of a RAG with their port, process, readiness and requests in flight."""
+    rags = await load_rags_from_json()
+    if rag_name not in rags:
+        raise HTTPException(status_code=404, detail=f"RAG {rag_name} not found")
+    rag_info = rags[rag_name]
+    return {
+        "replica_count": int(rag_info.get("replica_count") or 1),
+        "replicas": await rag_balancer.table(rag_name, rag_info),
+    }
+
+
+@router.put("/rags/{rag_name}/replicas")
+async def scale_rag(rag_name: str, request: ScaleRAGRequest):
+    """Set the number of processes serving a RAG.
+
+    For a running RAG missing replicas are started (which also replaces
+    replicas that died) and surplus ones stopped; a stopped RAG starts with
+    this many.
+    """
+    rags = await load_rags_from_json()
+    if rag_name not in rags:
+        raise HTTPException(status_code=404, detail=f"RAG {rag_name} not found")
+    rag_info = rags[rag_name]
+    rag_info["replica_count"] = request.replicas
+    try:
+        await stop_replicas(rag_name, rag_info, keep=request.replicas)
+        if rag_info.get("status") == "running":
+            await start_replicas(rag_name, rag_info)
+    except Exception as e:
+        logger.error(f"Failed to scale RAG {rag_name}: {str(e)}")
+        traceback.print_exc()
+        raise HTTPException(status_code=500, detail=f"Failed to scale RAG: {str(e)}")
+    finally:
+        # Record whatever was started, even if a later replica failed
+        await update_rag_in_json(rag_name, rag_info)
+        await service_supervisor.refresh()
+    return {
+        "message": f"RAG {rag_name} scaled to {request.replicas} replica(s)",
+        "replicas": await rag_balancer.table(rag_name, rag_info),
+    }
+
+
 @router.get("/rags/{rag_name}/status")
 async def get_rag_status(rag_name: str) -> Dict[str, Any]:
     """
@@ -462,34 +315,24 @@ async def get_rag_status(rag_name: str) -> Dict[str, Any]:
         raise HTTPException(status_code=404, detail=f"RAG {rag_name} not found")
 
     rag_info = rags[rag_name]
-    process_id = rag_info.get("process_id")
-
-    if process_id is None:
-        rag_info["status"] = "stopped"
-        return rag_info
-
-    try:
-        # Use psutil to check process status asynchronously
-        process = psutil.Process(process_id)
-        if process.is_running():
-            rag_info["status"] = "running"
-        else:
-            rag_info["status"] = "stopped"
-            rag_info["process_id"] = None
-    except psutil.NoSuchProcess:
-        rag_info["status"] = "stopped"
-        rag_info["process_id"] = None
-    except Exception as e:
-        logger.error(f"Error checking RAG status: {str(e)}")
+    entry = await service_supervisor.get(RAG, rag_name)
+    if entry is None:
         rag_info["status"] = "unknown"
-
-    # Save updated status
-    await save_rags_to_json(rags)
+    else:
+        rag_info["status"] = entry["status"]
+        rag_info["process_id"] = entry["process_id"]
+    rag_info["readiness"] = await readiness.get(RAG, rag_name)
     return rag_info
 
 @router.post("/rags/cache/build/{rag_name}")
-async def build_cache(rag_name: str):
-    """Start building cache (hybrid index) for a RAG service."""
+async def build_cache(rag_name: str, full: bool = False, priority: int = 0):
+    """Queue a cache (hybrid index) build for a RAG service.
+
+    Builds run in the background, a limited number at a time, highest
+    priority first. doc_dir is compared with the manifest of the last
+    successful build; if no file was added, changed or removed the build is
+    skipped. full=true ignores the manifest.
+    """
     rags = await load_rags_from_json()
     if rag_name not in rags:
         raise HTTPException(status_code=404, detail=f"RAG {rag_name} not found")
@@ -503,114 +346,88 @@ async def build_cache(rag_name: str):
             detail="Only Pro version RAGs with hybrid index enabled can build cache"
         )
     
-    # 创建临时日志文件
-    log_file = os.path.join("logs", f"cache_build_{rag_name}_{uuid.uuid4()}.log")
-    os.makedirs("logs", exist_ok=True)
-    
-    # 构建命令
-    command = f"auto-coder.rag build_hybrid_index"
-    command += f" --model {rag_info['model']}"
-    command += f" --doc_dir {rag_info['doc_dir']}"
-    
-    if "emb_model" in rag_info:
-        command += f" --emb_model {rag_info['emb_model']}"
-    
-    if rag_info.get("required_exts"):
-        command += f" --required_exts {rag_info['required_exts']}"
-    
-    command += f" --enable_hybrid_index"        
-    
-    logger.info(f"Starting cache build for {rag_name} with command: {command}")
-    
     try:
-        # 开始后台任务
-        with open(log_file, "w") as f:
-            f.write(f"Starting cache build for {rag_name}\n")
-            f.write(f"Command: {command}\n\n")
-        
-        task_id = str(uuid.uuid4())
-        cache_build_tasks[task_id] = {
-            "rag_name": rag_name,
-            "command": command,
-            "log_file": log_file,
-            "start_time": time.time(),
-            "completed": False,
-            "success": None,
-            "process": None
-        }
-        
-        # 启动异步任务
-        asyncio.create_task(run_build_task(task_id, command, log_file))
+        job, created = await build_queue.enqueue(rag_name, full=full, priority=priority)
         
         # 将任务ID存储在RAG配置中
-        rag_info["cache_build_task_id"] = task_id
-        rags[rag_name] = rag_info
-        await save_rags_to_json(rags)
+        await set_rag_fields(rag_name, cache_build_task_id=job["job_id"])
         
         return {
             "success": True,
-            "message": "Cache build started",
-            "task_id": task_id
+            "message": "Cache build queued" if created else "Cache build already queued",
+            "task_id": job["job_id"],
+            "job": job,
         }
     except Exception as e:
-        logger.error(f"Failed to start cache build: {str(e)}")
+        logger.error(f"Failed to queue cache build: {str(e)}")
         traceback.print_exc()
-        raise HTTPException(status_code=500, detail=f"Failed to start cache build: {str(e)}")
-
-async def run_build_task(task_id, command, log_file):
-    """Run the build task in background."""
-    task_info = cache_build_tasks[task_id]
-    
-    try:
-        with open(log_file, "a") as f:
-            process = await asyncio.create_subprocess_shell(
-                command,
-                stdout=asyncio.subprocess.PIPE,
-                stderr=asyncio.subprocess.PIPE
-            )
-            
-            task_info["process"] = process
-            
-            # 实时处理输出并写入日志
-            async def read_stream(stream, f):
-                while True:
-                    line = await stream.readline()
-                    if not line:
-                        break
-                    line_str = line.decode('utf-8') if isinstance(line, bytes) else line
-                    f.write(line_str)
-                    f.flush()
-            
-            # 同时处理stdout和stderr
-            await asyncio.gather(
-                read_stream(process.stdout, f),
-                read_stream(process.stderr, f)
-            )
-            
-            # 等待进程完成
-            return_code = await process.wait()
-            
-            # 更新任务状态
-            task_info["completed"] = True
-            task_info["success"] = return_code == 0
-            task_info["return_code"] = return_code
-            
-            # 添加完成信息到日志
-            f.write(f"\nBuild process completed with return code: {return_code}\n")
-            if return_code == 0:
-                f.write("Cache build completed successfully!\n")
-            else:
-                f.write("Cache build failed. See above for errors.\n")
-            
-    except Exception as e:
-        logger.error(f"Error running build task: {str(e)}")
-        with open(log_file, "a") as f:
-            f.write(f"\nError running build task: {str(e)}\n")
-            f.write(traceback.format_exc())
-        
-        task_info["completed"] = True
-        task_info["success"] = False
-        task_info["error"] = str(e)
+        raise HTTPException(status_code=500, detail=f"Failed to queue cache build: {str(e)}")
+
+@router.get("/rags/cache/jobs")
+async def list_build_jobs(rag_name: Optional[str] = None):
+    """Cache build jobs: running and queued ones in scheduling order, then finished ones."""
+    jobs = await build_queue.list(rag_name)
+    return {
+        "concurrency": build_queue.concurrency,
+        "queued": sum(1 for job in jobs if job["state"] == QUEUED),
+        "running": sum(1 for job in jobs if job["state"] == RUNNING),
+        "jobs": jobs,
+    }
+
+@router.get("/rags/cache/watchers")
+async def list_doc_watchers():
+    """doc_dir watch status of the RAGs with auto_build enabled."""
+    return await doc_watcher.table()
+
+@router.get("/rags/cache/jobs/{job_id}")
+async def get_build_job(job_id: str):
+    """A build job with its progress: files processed/total, chunks, tokens, elapsed and ETA."""
+    job = await build_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Build job {job_id} not found")
+    return job
+
+@router.get("/rags/cache/jobs/{job_id}/events")
+async def stream_build_job(request: Request, job_id: str, interval: float = 1.0):
+    """Stream a build job's state and progress (SSE) until it finishes."""
+    if await build_queue.get(job_id) is None:
+        raise HTTPException(status_code=404, detail=f"Build job {job_id} not found")
+
+    async def event_generator():
+        last = None
+        while not await request.is_disconnected():
+            job = await build_queue.get(job_id)
+            if job is None:
+                break
+            event = {"job_id": job_id, "state": job["state"], "progress": job.get("progress")}
+            if event != last:
+                yield {"event": "message", "data": json.dumps(event, ensure_ascii=False)}
+                last = event
+            if job["state"] in FINISHED:
+                break
+            await asyncio.sleep(max(0.2, interval))
+
+    return EventSourceResponse(event_generator())
+
+@router.get("/rags/cache/jobs/{job_id}/timings")
+async def get_build_job_timings(job_id: str, limit: int = 100):
+    """Per-file processing times of a finished build, slowest first."""
+    job = await build_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Build job {job_id} not found")
+    timings_file = job.get("timings_file")
+    if not timings_file or not os.path.exists(timings_file):
+        # Still running (or skipped): what the progress snapshot has so far
+        return (job.get("progress") or {}).get("slowest_files", [])
+    async with aiofiles.open(timings_file, mode="r") as f:
+        return json.loads(await f.read())[:max(1, limit)]
+
+@router.post("/rags/cache/jobs/{job_id}/cancel")
+async def cancel_build_job(job_id: str):
+    job = await build_queue.cancel(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Build job {job_id} not found")
+    return {"message": f"Build job {job_id} cancelled", "job": job}
 
 @router.get("/rags/cache/logs/{rag_name}")
 async def get_build_cache_logs(rag_name: str):
@@ -622,11 +439,13 @@ async def get_build_cache_logs(rag_name: str):
     rag_info = rags[rag_name]
     task_id = rag_info.get("cache_build_task_id")
     
-    if not task_id or task_id not in cache_build_tasks:
+    task_info = await build_queue.get(task_id) if task_id else None
+    if not task_info:
         raise HTTPException(status_code=404, detail="No active cache build task found")
     
-    task_info = cache_build_tasks[task_id]
     log_file = task_info["log_file"]
+    completed = task_info["state"] in FINISHED
+    start_time = task_info["started_at"] or task_info["enqueued_at"]
     
     try:
         if os.path.exists(log_file):
@@ -637,10 +456,14 @@ async def get_build_cache_logs(rag_name: str):
         
         return {
             "logs": logs,
-            "completed": task_info["completed"],
-            "success": task_info["success"],
-            "start_time": task_info["start_time"],
-            "elapsed_time": time.time() - task_info["start_time"]
+            "state": task_info["state"],
+            "completed": completed,
+            "success": task_info["state"] == SUCCEEDED if completed else None,
+            "files": task_info.get("files"),
+            "progress": task_info.get("progress"),
+            "skipped": task_info.get("skipped", False),
+            "start_time": start_time,
+            "elapsed_time": (task_info["finished_at"] or time.time()) - start_time
         }
     except Exception as e:
         logger.error(f"Error reading build logs: {str(e)}")
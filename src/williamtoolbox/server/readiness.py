@@ -0,0 +1,196 @@
+import time
+import asyncio
+from typing import Any, Dict, Optional
+import httpx
+from loguru import logger
+
+from ..metrics import Histogram, Counter
+from ..storage.shared_state import get_shared_state
+from .supervisor import service_key
+
+# Shared-state namespace with one readiness entry per started service,
+# keyed like the supervisor's status table ("<kind>/<name>").
+SERVICE_READINESS = "service_readiness"
+
+STARTING = "starting"
+READY = "ready"
+UNHEALTHY = "unhealthy"
+
+# How long a cold start may take before the service is declared unhealthy
+DEFAULT_STARTUP_TIMEOUT = 600.0
+# How long a chat request waits for a service that is still starting
+DEFAULT_CHAT_WAIT = 10.0
+
+SERVICE_COLD_START = Histogram(
+    "service_cold_start_seconds", "Time from spawning a service until its readiness probe passed.", ["kind"],
+    buckets=(1, 2, 5, 10, 20, 30, 60, 120, 300, 600),
+)
+SERVICE_NOT_READY = Counter(
+    "service_not_ready_total", "Chat requests rejected because the target service was not ready.", ["kind", "state"]
+)
+
+
+class ServiceNotReady(Exception):
+    """Raised to fail a chat request fast when its service is not ready."""
+
+
+def default_health_url(host: Optional[str], port: Optional[int]) -> str:
+    if not host or host == "0.0.0.0":
+        host = "127.0.0.1"
+    return f"http://{host}:{port or 8000}/v1/models"
+
+
+async def probe(url: str, model: Optional[str] = None, timeout: float = 2.0) -> Optional[str]:
+    """One readiness check. Returns None when healthy, else the reason.
+
+    With model set the /v1/models listing must also contain that model
+    (used for models deployed behind the OpenAI compatible service).
+    """
+    try:
+        async with httpx.AsyncClient(timeout=timeout) as client:
+            response = await client.get(url)
+    except httpx.HTTPError as e:
+        return f"{type(e).__name__}: {str(e) or url}"
+    if response.status_code != 200:
+        return f"{url} returned HTTP {response.status_code}"
+    if model is not None:
+        try:
+            served = {item.get("id") for item in response.json().get("data", [])}
+        except (ValueError, AttributeError):
+            return f"{url} did not return a model list"
+        if model not in served:
+            return f"Model {model} is not served yet"
+    return None
+
+
+class ReadinessProbe:
+    """Polls a freshly started service until it answers, with backoff.
+
+    The state is kept in the shared state store, so chat requests served by
+    any worker can see whether a RAG or Super Analysis is still loading.
+    The probe task itself lives in the worker that started the service.
+    """
+
+    def __init__(self, initial_delay: float = 0.2, max_delay: float = 5.0):
+        self.initial_delay = initial_delay
+        self.max_delay = max_delay
+        self._tasks: Dict[str, asyncio.Task] = {}
+
+    async def _set(self, key: str, **fields) -> Dict[str, Any]:
+        state = get_shared_state()
+        entry = {**(await state.get(SERVICE_READINESS, key) or {}), **fields, "checked_at": time.time()}
+        await state.set(SERVICE_READINESS, key, entry)
+        return entry
+
+    async def watch(self, kind: str, name: str, url: str, pid: Optional[int] = None,
+                    model: Optional[str] = None, timeout: float = DEFAULT_STARTUP_TIMEOUT) -> None:
+        """Start probing a service that was just spawned (state: starting)."""
+        key = service_key(kind, name)
+        self.cancel(kind, name)
+        await get_shared_state().set(SERVICE_READINESS, key, {
+            "state": STARTING,
+            "url": url,
+            "model": model,
+            "started_at": time.time(),
+            "ready_at": None,
+            "cold_start_seconds": None,
+            "attempts": 0,
+            "last_error": None,
+            "checked_at": time.time(),
+        })
+        task = asyncio.create_task(self._run(kind, key, url, pid, model, timeout))
+        self._tasks[key] = task
+
+        def discard(done: asyncio.Task):
+            if self._tasks.get(key) is done:
+                del self._tasks[key]
+
+        task.add_done_callback(discard)
+
+    async def _run(self, kind: str, key: str, url: str, pid: Optional[int], model: Optional[str], timeout: float):
+        # Imported here: process_manager depends on the supervisor, not on us
+        from .process_manager import process_manager
+
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        delay = self.initial_delay
+        attempts = 0
+        while True:
+            attempts += 1
+            error = await probe(url, model)
+            if error is None:
+                elapsed = loop.time() - start
+                SERVICE_COLD_START.observe(elapsed, kind=kind)
+                await self._set(key, state=READY, ready_at=time.time(), cold_start_seconds=round(elapsed, 3),
+                                attempts=attempts, last_error=None)
+                logger.info(f"{key} is ready after {elapsed:.1f}s ({attempts} probes)")
+                return
+            if pid is not None and not process_manager.is_running(pid):
+                await self._set(key, state=UNHEALTHY, attempts=attempts,
+                                last_error=f"Process {pid} exited before becoming ready")
+                logger.warning(f"{key} exited before becoming ready")
+                return
+            if loop.time() - start >= timeout:
+                await self._set(key, state=UNHEALTHY, attempts=attempts,
+                                last_error=f"Not ready after {timeout:.0f}s: {error}")
+                logger.warning(f"{key} not ready after {timeout:.0f}s: {error}")
+                return
+            if attempts % 10 == 0:
+                await self._set(key, attempts=attempts, last_error=error)
+            await asyncio.sleep(delay)
+            delay = min(delay * 1.5, self.max_delay)
+
+    def cancel(self, kind: str, name: str) -> None:
+        task = self._tasks.pop(service_key(kind, name), None)
+        if task is not None:
+            task.cancel()
+
+    async def forget(self, kind: str, name: str) -> None:
+        """The service was stopped: drop its probe and readiness entry."""
+        self.cancel(kind, name)
+        await get_shared_state().delete(SERVICE_READINESS, service_key(kind, name))
+
+    async def get(self, kind: str, name: str) -> Optional[Dict[str, Any]]:
+        return await get_shared_state().get(SERVICE_READINESS, service_key(kind, name))
+
+    async def table(self, kind: Optional[str] = None) -> Dict[str, Dict[str, Any]]:
+        entries = await get_shared_state().items(SERVICE_READINESS)
+        if kind is None:
+            return entries
+        prefix = f"{kind}/"
+        return {key[len(prefix):]: entry for key, entry in entries.items() if key.startswith(prefix)}
+
+    async def ensure_ready(self, kind: str, name: str, wait: float = DEFAULT_CHAT_WAIT) -> None:
+        """Gate for chat routing: wait up to `wait` seconds for a starting
+        service, raise ServiceNotReady at once for an unhealthy one.
+
+        Services without an entry (started before readiness tracking, or
+        lite models) pass through unchanged.
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + wait
+        while True:
+            entry = await self.get(kind, name)
+            if entry is None or entry["state"] == READY:
+                return
+            if entry["state"] == UNHEALTHY:
+                # Fail fast, but let a service that recovered since pass
+                if await probe(entry["url"], entry.get("model")) is None:
+                    await self._set(service_key(kind, name), state=READY, ready_at=time.time(), last_error=None)
+                    return
+                SERVICE_NOT_READY.inc(kind=kind, state=UNHEALTHY)
+                raise ServiceNotReady(f"{name} is unhealthy: {entry.get('last_error')}")
+            if loop.time() >= deadline:
+                break
+            await asyncio.sleep(0.25)
+
+        # The worker running the probe may be gone; ask the service directly
+        if await probe(entry["url"], entry.get("model")) is None:
+            await self._set(service_key(kind, name), state=READY, ready_at=time.time(), last_error=None)
+            return
+        SERVICE_NOT_READY.inc(kind=kind, state=STARTING)
+        started = time.time() - entry["started_at"]
+        raise ServiceNotReady(f"{name} is still starting ({started:.0f}s so far), please retry shortly")
+
+
+readiness = ReadinessProbe()
@@ -64,6 +64,7 @@ class AddModelRequest(BaseModel):
     is_reasoning: Optional[bool] = Field(default=None)
     input_price: Optional[float] = Field(default=None)
     output_price: Optional[float] = Field(default=None)
+    tags: List[str] = Field(default_factory=list)
 
 
 class AddRAGRequest(BaseModel):
@@ -78,7 +79,8 @@ class AddRAGRequest(BaseModel):
     doc_dir: str
     rag_doc_filter_relevance: float = Field(default=2.0)
     host: str = Field(default="0.0.0.0")
-    port: int = Field(default=8000)
+    # None: assigned from the RAG port range
+    port: Optional[int] = Field(default=None, ge=1, le=65535)
     required_exts: str = Field(default="")
     disable_inference_enhance: bool = Field(default=False)
     inference_deep_thought: bool = Field(default=False)
@@ -87,6 +89,15 @@ class AddRAGRequest(BaseModel):
     without_contexts: bool = Field(default=False)
     product_type: ProductType = Field(default=ProductType.lite)
     infer_params: Optional[Dict[str, Any]] = Field(default_factory=dict)
+    # Readiness probe URL; defaults to http://host:port/v1/models
+    health_check_url: str = Field(default="")
+    tags: List[str] = Field(default_factory=list)
+    # Watch doc_dir and queue an incremental cache build after changes settle
+    auto_build: bool = Field(default=False)
+    auto_build_quiet_seconds: float = Field(default=10.0, ge=1)
+    auto_build_min_interval_seconds: float = Field(default=300.0, ge=0)
+    # Processes serving this RAG; extra ones get ports assigned automatically
+    replica_count: int = Field(default=1, ge=1, le=16)
     model_config = {"protected_namespaces": ()}  
 
 
@@ -114,6 +125,7 @@ class ModelInfo(BaseModel):
     name: str
     status: str
     product_type: ProductType = Field(default=ProductType.pro)
+    tags: List[str] = Field(default_factory=list)
 
 class CreateConversationRequest(BaseModel):
     title: str
@@ -124,11 +136,12 @@ class UpdateTitleRequest(BaseModel):
 class AddSuperAnalysisRequest(BaseModel):
     name: str
     served_model_name: str
-    port: int = Field(default=8000)
+    port: Optional[int] = Field(default=None, ge=1, le=65535)
     schema_rag_base_url: str
     context_rag_base_url: str
     byzer_sql_url: str = Field(default="http://127.0.0.1:9003/run/script")
     host: str = Field(default="0.0.0.0")
+    health_check_url: str = Field(default="")
 class RunSQLRequest(BaseModel):
     sql: str
     engine_url: str
@@ -140,3 +153,39 @@ class AddByzerSQLRequest(BaseModel):
     host: str
     port: int
 
+
+class BulkSelector(BaseModel):
+    all: bool = Field(default=False)
+    product_type: Optional[str] = Field(default=None)
+    tags: List[str] = Field(default_factory=list)
+
+class BulkActionRequest(BaseModel):
+    names: List[str] = Field(default_factory=list)
+    selector: Optional[BulkSelector] = Field(default=None)
+    parallelism: int = Field(default=4, ge=1, le=32)
+
+class SaveBootProfileRequest(BaseModel):
+    name: str
+    # None: snapshot of what is running now
+    rags: Optional[List[str]] = Field(default=None)
+    models: Optional[List[str]] = Field(default=None)
+    restore_on_boot: bool = Field(default=True)
+
+class LogPolicyRequest(BaseModel):
+    # Unset fields keep the inherited value (service -> default -> built-in)
+    max_bytes: Optional[int] = Field(default=None, ge=1024)
+    max_age_hours: Optional[float] = Field(default=None, ge=0)
+    keep: Optional[int] = Field(default=None, ge=0)
+    max_total_bytes: Optional[int] = Field(default=None, ge=0)
+    compression: Optional[str] = Field(default=None, pattern="^(gzip|zstd|none)$")
+
+class ScaleRAGRequest(BaseModel):
+    replicas: int = Field(ge=1, le=16)
+
+class UploadInitRequest(BaseModel):
+    filename: str
+    size: int = Field(ge=0)
+    # None: server default (8 MiB)
+    chunk_size: Optional[int] = Field(default=None, ge=64 * 1024, le=64 * 1024 * 1024)
+    # sha256 of the whole file, checked when the upload is completed
+    sha256: Optional[str] = Field(default=None, pattern="^[0-9a-fA-F]{64}$")
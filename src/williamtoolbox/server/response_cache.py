@@ -0,0 +1,175 @@
+import asyncio
+import re
+import time
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from loguru import logger
+
+
+# Default TTLs (seconds) for the GET endpoints the UI polls from every open tab.
+# Patterns are matched against the request path (without query string).
+DEFAULT_CACHE_RULES: List[Tuple[str, float]] = [
+    (r"^/models$", 2.0),
+    (r"^/models/[^/]+/status$", 2.0),
+    (r"^/rags$", 2.0),
+    (r"^/rags/[^/]+/status$", 2.0),
+    (r"^/super-analysis$", 2.0),
+    (r"^/super-analysis/[^/]+/status$", 2.0),
+    (r"^/byzer-sql$", 2.0),
+    (r"^/byzer-sql/[^/]+/status$", 2.0),
+    (r"^/openai-compatible-service/status$", 2.0),
+    (r"^/config$", 5.0),
+]
+
+# Writes to one resource that change what another resource returns.
+RELATED_PREFIXES: Dict[str, List[str]] = {
+    "/openai-compatible-service": ["/config"],
+    "/config": ["/openai-compatible-service"],
+}
+
+
+@dataclass
+class CachedResponse:
+    content: bytes
+    status_code: int
+    headers: Dict[str, str]
+    expires_at: float
+    prefix: str
+
+
+@dataclass
+class CacheStats:
+    hits: int = 0
+    misses: int = 0
+    coalesced: int = 0
+    invalidations: int = 0
+
+
+def resource_prefix(path: str) -> str:
+    """Return the first path segment, e.g. /rags/foo/start -> /rags."""
+    parts = [p for p in path.split("/") if p]
+    return f"/{parts[0]}" if parts else "/"
+
+
+class ResponseCache:
+    """Short-TTL cache for idempotent GETs with request coalescing.
+
+    Concurrent identical GETs share one upstream call. Entries are keyed on
+    path, query string and the Authorization header, and any non-GET request
+    to the same resource prefix invalidates them.
+    """
+
+    def __init__(self, rules: Optional[List[Tuple[str, float]]] = None):
+        self.rules = [
+            (re.compile(pattern), ttl)
+            for pattern, ttl in (rules if rules is not None else DEFAULT_CACHE_RULES)
+        ]
+        self._entries: Dict[Tuple[str, str, str], CachedResponse] = {}
+        self._inflight: Dict[Tuple[str, str, str], asyncio.Future] = {}
+        # Bumped on every invalidation so a response fetched before a write
+        # is not stored after it.
+        self._generation: Dict[str, int] = {}
+        self.stats = CacheStats()
+
+    def ttl_for(self, path: str) -> Optional[float]:
+        for pattern, ttl in self.rules:
+            if pattern.match(path):
+                return ttl if ttl > 0 else None
+        return None
+
+    @staticmethod
+    def make_key(path: str, query: str, authorization: str) -> Tuple[str, str, str]:
+        return (path, query, authorization)
+
+    async def get_or_fetch(
+        self,
+        path: str,
+        query: str,
+        authorization: str,
+        fetch: Callable[[], Awaitable[Tuple[bytes, int, Dict[str, str]]]],
+    ) -> Tuple[bytes, int, Dict[str, str], str]:
+        """Return (content, status_code, headers, cache_state) for a GET."""
+        ttl = self.ttl_for(path)
+        if ttl is None:
+            content, status_code, headers = await fetch()
+            return content, status_code, headers, "BYPASS"
+
+        key = self.make_key(path, query, authorization)
+        now = time.monotonic()
+        entry = self._entries.get(key)
+        if entry is not None:
+            if entry.expires_at > now:
+                self.stats.hits += 1
+                return entry.content, entry.status_code, entry.headers, "HIT"
+            del self._entries[key]
+
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            self.stats.coalesced += 1
+            content, status_code, headers = await asyncio.shield(inflight)
+            return content, status_code, headers, "COALESCED"
+
+        self.stats.misses += 1
+        prefix = resource_prefix(path)
+        generation = self._generation.get(prefix, 0)
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            content, status_code, headers = await fetch()
+        except BaseException as e:
+            if not future.done():
+                future.set_exception(e)
+                # Mark the exception as retrieved when nobody is waiting.
+                future.exception()
+            raise
+        else:
+            future.set_result((content, status_code, headers))
+            if status_code == 200 and self._generation.get(prefix, 0) == generation:
+                self._entries[key] = CachedResponse(
+                    content=content,
+                    status_code=status_code,
+                    headers=headers,
+                    expires_at=time.monotonic() + ttl,
+                    prefix=prefix,
+                )
+            return content, status_code, headers, "MISS"
+        finally:
+            self._inflight.pop(key, None)
+
+    def invalidate(self, path: str) -> None:
+        """Drop every entry under the resource prefix touched by a write."""
+        prefixes = [resource_prefix(path)]
+        prefixes.extend(RELATED_PREFIXES.get(prefixes[0], []))
+        for prefix in prefixes:
+            self._generation[prefix] = self._generation.get(prefix, 0) + 1
+            stale = [key for key, entry in self._entries.items() if entry.prefix == prefix]
+            for key in stale:
+                del self._entries[key]
+            if stale:
+                self.stats.invalidations += len(stale)
+                logger.debug(f"Invalidated {len(stale)} cached responses under {prefix}")
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "entries": len(self._entries),
+            "inflight": len(self._inflight),
+            "hits": self.stats.hits,
+            "misses": self.stats.misses,
+            "coalesced": self.stats.coalesced,
+            "invalidations": self.stats.invalidations,
+        }
+
+
+def parse_cache_rules(values: Optional[List[str]]) -> List[Tuple[str, float]]:
+    """Parse PATTERN=SECONDS overrides; they take precedence over the defaults."""
+    rules: List[Tuple[str, float]] = []
+    for value in values or []:
+        pattern, sep, ttl = value.rpartition("=")
+        if not sep or not pattern:
+            raise ValueError(f"Invalid cache rule {value!r}, expected PATTERN=SECONDS")
+        rules.append((pattern, float(ttl)))
+    return rules + DEFAULT_CACHE_RULES
@@ -12,8 +12,8 @@ from .request_types import *
 from ..storage.json_file import *
 import aiofiles
 import traceback
-from byzerllm.utils.client import code_utils
-from autocoder.utils.stream_thinking import stream_with_thinking_async, separate_stream_thinking_async
+from ..metrics import ChatStreamRecorder
+from .rag_replicas import rag_balancer
 
 router = APIRouter()
 
@@ -66,22 +66,25 @@ async def process_message_stream(
     request: AddMessageRequest,
     response_message_id: str,
 ):
+    # Imported here so loading the router does not pull in autocoder
+    from autocoder.utils.stream_thinking import separate_stream_thinking_async
+
     file_path = await get_event_file_path(request_id)
     idx = 0
     thoughts = []
+    stream_metrics = ChatStreamRecorder(request.list_type, request.selected_item)
     async with aiofiles.open(file_path, "w") as event_file:
+        # Replica serving a RAG request, released when the stream ends
+        lease = None
         try:            
             if request.list_type == "rags":
                 rags = await load_rags_from_json()
                 rag_info = rags.get(request.selected_item, {})
-                host = rag_info.get("host", "localhost")
-                port = rag_info.get("port", 8000)
-                if host == "0.0.0.0":
-                    host = "127.0.0.1"
-
-                base_url = f"http://{host}:{port}/v1"
+                # 多副本时选择进行中请求最少的健康副本
+                lease = await rag_balancer.acquire(request.selected_item, rag_info)
+                base_url = lease[1]
 
-                logger.info(f"RAG {request.selected_item} is using {base_url}")                
+                logger.info(f"RAG {request.selected_item} is using {base_url} ({lease[0]})")                
                 client = AsyncOpenAI(base_url=base_url, api_key="xxxx")
                                 
 
@@ -111,6 +114,7 @@ async def process_message_stream(
                         await event_file.write(
                             json.dumps(event, ensure_ascii=False) + "\n"
                         )
+                        stream_metrics.record(event)
                         await event_file.flush()
 
                         idx += 1
@@ -125,6 +129,7 @@ async def process_message_stream(
                         await event_file.write(
                             json.dumps(event, ensure_ascii=False) + "\n"
                         )
+                        stream_metrics.record(event)
                         await event_file.flush()
 
                         idx += 1
@@ -140,8 +145,11 @@ async def process_message_stream(
                 "timestamp": datetime.now().isoformat(),
             }
             await event_file.write(json.dumps(error_event, ensure_ascii=False) + "\n")
+            stream_metrics.record(error_event)
             await event_file.flush()
             logger.error(traceback.format_exc())
+        finally:
+            rag_balancer.release(lease)
 
         await event_file.write(
             json.dumps(
@@ -156,6 +164,7 @@ async def process_message_stream(
             + "\n"
         )
         await event_file.flush()
+        stream_metrics.finish()
 
     s = ""
     async with aiofiles.open(file_path, "r") as event_file:
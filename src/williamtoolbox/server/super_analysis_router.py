@@ -1,15 +1,17 @@
 import signal
 from fastapi import APIRouter, HTTPException
 import os
-import aiofiles
 from loguru import logger
 import traceback
 from typing import Dict, Any
 from pathlib import Path
-import subprocess
-import psutil
-from ..storage.json_file import load_super_analysis_from_json, save_super_analysis_to_json
+from ..storage.json_file import load_super_analysis_from_json, save_super_analysis_to_json, update_super_analysis_in_json
 from .request_types import AddSuperAnalysisRequest
+from .supervisor import service_supervisor, SUPER_ANALYSIS
+from .process_manager import process_manager
+from .readiness import readiness, default_health_url
+from .port_allocator import reserve, allocate, PortConflict
+from .log_tail import read_chunk
 
 
 router = APIRouter()
@@ -18,6 +20,13 @@ router = APIRouter()
 async def list_super_analysis():
     """List all Super Analysis services."""
     analyses = await load_super_analysis_from_json()
+    statuses = await service_supervisor.table(SUPER_ANALYSIS)
+    readiness_table = await readiness.table(SUPER_ANALYSIS)
+    for name, info in analyses.items():
+        if name in statuses:
+            info["status"] = statuses[name]["status"]
+        if info.get("status") == "running" and name in readiness_table:
+            info["readiness"] = readiness_table[name]["state"]
     return [{"name": name, **info} for name, info in analyses.items()]
 
 @router.post("/super-analysis/add")
@@ -31,12 +40,14 @@ async def add_super_analysis(request: AddSuperAnalysisRequest):
             detail=f"Super Analysis {request.name} already exists"
         )
         
-    for analysis in analyses.values():
-        if analysis["port"] == request.port:
-            raise HTTPException(
-                status_code=400,
-                detail=f"Port {request.port} is already in use"
-            )
+    # 端口在所有受管服务中唯一；未指定时自动分配
+    try:
+        if request.port:
+            await reserve(SUPER_ANALYSIS, request.name, request.port, request.host, probe=False)
+        else:
+            request.port = await allocate(SUPER_ANALYSIS, request.name, request.host)
+    except PortConflict as e:
+        raise HTTPException(status_code=400, detail=str(e))
             
     new_analysis = {
         "status": "stopped",
@@ -45,7 +56,7 @@ async def add_super_analysis(request: AddSuperAnalysisRequest):
     
     analyses[request.name] = new_analysis
     await save_super_analysis_to_json(analyses)
-    return {"message": f"Super Analysis {request.name} added successfully"}
+    return {"message": f"Super Analysis {request.name} added successfully", "port": request.port}
 
 @router.delete("/super-analysis/{analysis_name}")
 async def delete_super_analysis(analysis_name: str):
@@ -97,11 +108,16 @@ async def update_super_analysis(analysis_name: str, request: AddSuperAnalysisReq
             detail="Cannot update a running analysis. Please stop it first."
         )
     
-    # Update the analysis configuration
-    analysis_info.update(request.model_dump())    
-    analyses[analysis_name] = analysis_info    
+    # Update the analysis configuration, keeping fields the client did not send
+    analysis_info.update(request.model_dump(exclude_unset=True))
+    # 新端口同样不能与其他受管服务冲突
+    if analysis_info.get("port"):
+        try:
+            await reserve(SUPER_ANALYSIS, analysis_name, analysis_info["port"], analysis_info.get("host"), probe=False)
+        except PortConflict as e:
+            raise HTTPException(status_code=400, detail=str(e))
     logger.info(f"Super Analysis {analysis_name} updated: {analysis_info}")
-    await save_super_analysis_to_json(analyses)
+    await update_super_analysis_in_json(analysis_name, analysis_info)
     
     return {"message": f"Super Analysis {analysis_name} updated successfully"}
 
@@ -125,14 +141,14 @@ async def manage_super_analysis(analysis_name: str, action: str):
     analysis_info = analyses[analysis_name]
     
     if action == "start":
-        # Check if port is already in use
-        port = analysis_info["port"]
-        for other_analysis in analyses.values():
-            if other_analysis["name"] != analysis_name and other_analysis["port"] == port:
-                raise HTTPException(
-                    status_code=400,
-                    detail=f"Port {port} is already in use"
-                )
+        # Check the port against every managed service and the host
+        try:
+            if analysis_info.get("port"):
+                port = await reserve(SUPER_ANALYSIS, analysis_name, analysis_info["port"], analysis_info.get("host"))
+            else:
+                port = analysis_info["port"] = await allocate(SUPER_ANALYSIS, analysis_name, analysis_info.get("host"))
+        except PortConflict as e:
+            raise HTTPException(status_code=400, detail=str(e))
                 
         command = "super-analysis.serve"
         command += f" --served-model-name {analysis_info['served_model_name']}"
@@ -143,18 +159,15 @@ async def manage_super_analysis(analysis_name: str, action: str):
         command += f" --host {analysis_info['host']}"
         
         try:
-            os.makedirs("logs", exist_ok=True)
-            stdout_log = open(os.path.join("logs", f"{analysis_info['name']}.out"), "w")
-            stderr_log = open(os.path.join("logs", f"{analysis_info['name']}.err"), "w")
-            
-            process = subprocess.Popen(
-                command, 
-                shell=True,
-                stdout=stdout_log,
-                stderr=stderr_log
-            )
+            process_id = await process_manager.start(command, log_name=analysis_info["name"])
             analysis_info["status"] = "running"
-            analysis_info["process_id"] = process.pid
+            analysis_info["process_id"] = process_id
+            # 进程已启动，但要等 /v1/models 可访问后才算 ready
+            await readiness.watch(
+                SUPER_ANALYSIS, analysis_name,
+                analysis_info.get("health_check_url") or default_health_url(analysis_info.get("host"), port),
+                pid=process_id,
+            )
             
         except Exception as e:
             logger.error(f"Failed to start Super Analysis: {str(e)}")
@@ -164,44 +177,22 @@ async def manage_super_analysis(analysis_name: str, action: str):
                 detail=f"Failed to start Super Analysis: {str(e)}"
             )
     else:  # action == "stop"
-        if "process_id" in analysis_info:
-            try:
-                parent = psutil.Process(analysis_info["process_id"])
-                # Get all child processes
-                children = parent.children(recursive=True)
-                # Send SIGTERM to parent and all children
-                for child in children:
-                    try:
-                        child.terminate()
-                    except (psutil.NoSuchProcess, psutil.AccessDenied):
-                        pass
-                parent.terminate()
-                # Wait for processes to terminate
-                _, alive = psutil.wait_procs(children + [parent], timeout=3)
-                # If any processes are still alive, kill them
-                for proc in alive:
-                    try:
-                        proc.kill()
-                    except (psutil.NoSuchProcess, psutil.AccessDenied):
-                        pass
-                analysis_info["status"] = "stopped"
-                del analysis_info["process_id"]
-            except (ProcessLookupError, psutil.NoSuchProcess):
-                analysis_info["status"] = "stopped"
-                if "process_id" in analysis_info:
-                    del analysis_info["process_id"]
-            except Exception as e:
-                logger.error(f"Failed to stop Super Analysis: {str(e)}")
-                traceback.print_exc()
-                raise HTTPException(
-                    status_code=500,
-                    detail=f"Failed to stop Super Analysis: {str(e)}"
-                )
-        else:
-            analysis_info["status"] = "stopped"
+        try:
+            await process_manager.stop(analysis_info.get("process_id"))
+        except Exception as e:
+            logger.error(f"Failed to stop Super Analysis: {str(e)}")
+            traceback.print_exc()
+            raise HTTPException(
+                status_code=500,
+                detail=f"Failed to stop Super Analysis: {str(e)}"
+            )
+        analysis_info["status"] = "stopped"
+        analysis_info.pop("process_id", None)
+        await readiness.forget(SUPER_ANALYSIS, analysis_name)
             
-    analyses[analysis_name] = analysis_info
-    await save_super_analysis_to_json(analyses)
+    # 只更新当前条目，并发启停其他服务时不会互相覆盖
+    await update_super_analysis_in_json(analysis_name, analysis_info)
+    await service_supervisor.refresh()
     return {"message": f"Super Analysis {analysis_name} {action}ed successfully"}
 
 @router.get("/super-analysis/{analysis_name}/status")
@@ -215,26 +206,14 @@ async def get_super_analysis_status(analysis_name: str):
             detail=f"Super Analysis {analysis_name} not found"
         )
         
-    analysis_info = analyses[analysis_name]
-    
-    is_alive = False
-    if "process_id" in analysis_info:
-        try:
-            process = psutil.Process(analysis_info["process_id"])
-            is_alive = process.is_running()
-        except psutil.NoSuchProcess:
-            is_alive = False
-            
-    status = "running" if is_alive else "stopped"
-    analysis_info["status"] = status
-    analyses[analysis_name] = analysis_info
-    await save_super_analysis_to_json(analyses)
+    entry = await service_supervisor.get(SUPER_ANALYSIS, analysis_name) or {}
     
     return {
         "analysis": analysis_name,
-        "status": status,
-        "process_id": analysis_info.get("process_id"),
-        "is_alive": is_alive,
+        "status": entry.get("status", "stopped"),
+        "process_id": entry.get("process_id"),
+        "is_alive": entry.get("is_alive", False),
+        "readiness": await readiness.get(SUPER_ANALYSIS, analysis_name),
         "success": True
     }
 
@@ -247,37 +226,8 @@ async def get_super_analysis_logs(analysis_name: str, log_type: str, offset: int
     log_file = f"logs/{analysis_name}.{log_type}"
     
     try:
-        if not os.path.exists(log_file):
-            return {"content": "", "exists": False, "offset": 0}
-            
-        file_size = os.path.getsize(log_file)
-        
-        if offset < 0:
-            read_size = min(abs(offset), file_size)
-            async with aiofiles.open(log_file, mode='r') as f:
-                if read_size < file_size:
-                    await f.seek(file_size - read_size)
-                content = await f.read(read_size)
-                current_offset = file_size
-            return {
-                "content": content, 
-                "exists": True, 
-                "offset": current_offset
-            }
-        else:
-            if offset > file_size:
-                return {"content": "", "exists": True, "offset": file_size}
-                
-            async with aiofiles.open(log_file, mode='r') as f:
-                await f.seek(offset)
-                content = await f.read()
-                current_offset = await f.tell()
-            return {
-                "content": content, 
-                "exists": True, 
-                "offset": current_offset
-            }
-            
+        # 每次最多读取 MAX_CHUNK_BYTES，前端从返回的 offset 继续轮询
+        return await read_chunk(log_file, offset)
     except Exception as e:
         logger.error(f"Error reading log file: {str(e)}")
         logger.error(traceback.format_exc())
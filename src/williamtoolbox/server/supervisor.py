@@ -0,0 +1,379 @@
+import os
+import time
+import asyncio
+from typing import Any, Dict, List, Optional, Tuple
+import psutil
+from loguru import logger
+
+from ..storage.json_file import (
+    load_rags_from_json,
+    load_super_analysis_from_json,
+    load_byzer_sql_from_json,
+    load_models_from_json,
+    load_config,
+    modify_json_file,
+    RAGS_JSON_PATH,
+    SUPER_ANALYSIS_JSON_PATH,
+    BYZER_SQL_JSON_PATH,
+    MODELS_JSON_PATH,
+    CONFIG_JSON_PATH,
+)
+from ..storage.shared_state import get_shared_state
+
+# Shared-state namespace holding one status entry per managed service,
+# keyed "<kind>/<name>". Written by the supervisor (owner worker only) and
+# read by every list/status endpoint.
+SERVICE_STATUS = "service_status"
+
+RAG = "rag"
+SUPER_ANALYSIS = "super_analysis"
+BYZER_SQL = "byzer_sql"
+OPENAI_SERVICE = "openai_service"
+MODEL = "model"
+
+OPENAI_SERVICE_NAME = "default"
+
+
+def service_key(kind: str, name: str) -> str:
+    return f"{kind}/{name}"
+
+
+def replica_name(rag_name: str, index: int) -> str:
+    """Service (and log) name of an extra RAG replica; index 0 is the RAG itself."""
+    return f"{rag_name}@{index}"
+
+
+class ServiceSupervisor:
+    """Watches every managed process from one background scan loop.
+
+    Processes started by this worker are registered with watch_child(): a
+    pidfd is added to the event loop so their exit is noticed immediately;
+    reaping is left to whoever owns the process object. Processes found in
+    the registries but started elsewhere (another worker, a previous
+    backend run) are "adopted" and
+    checked with psutil on each scan. Pro models are checked with
+    `byzerllm stat` on a slower interval because it spawns a CLI.
+
+    Status endpoints read the resulting table, so their cost does not
+    depend on how many services exist. The registries are only rewritten
+    when a process is found to have died.
+    """
+
+    def __init__(self, interval: float = 2.0, model_interval: float = 15.0):
+        self.interval = interval
+        self.model_interval = model_interval
+        self._pidfds: Dict[int, int] = {}
+        self._exit_codes: Dict[int, Optional[int]] = {}
+        # pid -> create_time, to tell a restarted pid from the original process
+        self._create_times: Dict[int, float] = {}
+        self._last_model_check = 0.0
+        self._wake: Optional[asyncio.Event] = None
+        self._scan_lock: Optional[asyncio.Lock] = None
+
+    # ---- child processes -------------------------------------------------
+
+    def watch_child(self, pid: int) -> None:
+        """Get notified as soon as a process started by this worker exits."""
+        # A recycled pid must not inherit a previous process's exit
+        self._exit_codes.pop(pid, None)
+        self._create_times.pop(pid, None)
+        if pid in self._pidfds or not hasattr(os, "pidfd_open"):
+            return
+        try:
+            pidfd = os.pidfd_open(pid)
+        except OSError:
+            return
+        self._pidfds[pid] = pidfd
+        asyncio.get_running_loop().add_reader(pidfd, self._on_child_exit, pid)
+
+    def _on_child_exit(self, pid: int) -> None:
+        pidfd = self._pidfds.pop(pid, None)
+        if pidfd is not None:
+            asyncio.get_running_loop().remove_reader(pidfd)
+            os.close(pidfd)
+        self._exit_codes.setdefault(pid, None)
+        logger.info(f"Managed process {pid} exited")
+        self.wake()
+
+    def notify_exit(self, pid: int, exit_code: Optional[int]) -> None:
+        """Record the exit code of a child reaped by its owner."""
+        self._exit_codes[pid] = exit_code
+        self.wake()
+
+    def _pid_alive(self, pid: int) -> bool:
+        """Runs in a worker thread; must not touch the event loop."""
+        if pid in self._exit_codes:
+            return False
+        if pid in self._pidfds:
+            return True
+        try:
+            process = psutil.Process(pid)
+            if process.status() == psutil.STATUS_ZOMBIE:
+                return False
+            create_time = process.create_time()
+        except (psutil.NoSuchProcess, psutil.AccessDenied):
+            return False
+        known = self._create_times.setdefault(pid, create_time)
+        return known == create_time
+
+    # ---- discovery -------------------------------------------------------
+
+    async def _discover(self) -> List[Tuple[str, str, Optional[int], Dict[str, Any]]]:
+        services = []
+        for name, info in (await load_rags_from_json()).items():
+            services.append((RAG, name, info.get("process_id"), {}))
+            for replica in info.get("replicas") or []:
+                services.append((RAG, replica_name(name, replica["index"]), replica.get("process_id"), {}))
+        for name, info in (await load_super_analysis_from_json()).items():
+            services.append((SUPER_ANALYSIS, name, info.get("process_id"), {}))
+        for name, info in (await load_byzer_sql_from_json()).items():
+            pid_file = os.path.join(info.get("install_dir", ""), "pid")
+            services.append((BYZER_SQL, name, info.get("process_id"), {"pid_file": pid_file}))
+        servers = (await load_config()).get("openaiServerList") or []
+        if servers:
+            services.append((OPENAI_SERVICE, OPENAI_SERVICE_NAME, servers[0].get("pid"), {}))
+        return services
+
+    def _probe(self, services) -> Dict[str, Dict[str, Any]]:
+        """Runs in a worker thread: liveness of every discovered process."""
+        now = time.time()
+        table = {}
+        seen = set()
+        for kind, name, pid, extra in services:
+            if kind == BYZER_SQL:
+                # byzer.sh writes the pid of the JVM it daemonizes
+                try:
+                    with open(extra["pid_file"]) as f:
+                        pid = int(f.read().strip())
+                except (OSError, ValueError):
+                    pid = None
+            alive = pid is not None and self._pid_alive(pid)
+            seen.add(pid)
+            if kind == BYZER_SQL and pid is not None and not alive:
+                try:
+                    os.remove(extra["pid_file"])
+                except OSError:
+                    pass
+            table[service_key(kind, name)] = {
+                "kind": kind,
+                "name": name,
+                "status": "running" if alive else "stopped",
+                "is_alive": alive,
+                "process_id": pid if alive else None,
+                "exit_code": self._exit_codes.get(pid) if pid is not None else None,
+                "checked_at": now,
+            }
+        self._create_times = {pid: t for pid, t in self._create_times.items() if pid in seen}
+        return table
+
+    async def _check_model(self, name: str, info: Dict[str, Any]) -> Dict[str, Any]:
+        command = info.get("status_command") or f"byzerllm stat --model {name}"
+        entry = {"kind": MODEL, "name": name, "checked_at": time.time()}
+        try:
+            process = await asyncio.create_subprocess_shell(
+                command, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE
+            )
+            stdout, stderr = await asyncio.wait_for(process.communicate(), timeout=60)
+            if process.returncode == 0:
+                entry.update(status="running", success=True, detail=stdout.decode().strip())
+            else:
+                entry.update(
+                    status="stopped",
+                    success=False,
+                    detail=f"Command failed with return code {process.returncode}: {stderr.decode().strip()}",
+                )
+        except Exception as e:
+            entry.update(status="unknown", success=False, detail=f"Failed to get status for model {name}: {str(e)}")
+        return entry
+
+    async def _check_models(self, names: Optional[List[str]] = None) -> Dict[str, Dict[str, Any]]:
+        models = await load_models_from_json()
+        targets = [
+            (name, info) for name, info in models.items()
+            if info.get("product_type", "pro") != "lite" and (names is None or name in names)
+        ]
+        semaphore = asyncio.Semaphore(4)
+
+        async def check(name, info):
+            async with semaphore:
+                return await self._check_model(name, info)
+
+        entries = await asyncio.gather(*[check(name, info) for name, info in targets])
+        return {service_key(MODEL, entry["name"]): entry for entry in entries}
+
+    # ---- registry reconciliation -----------------------------------------
+
+    async def _reconcile(self, table: Dict[str, Dict[str, Any]],
+                         discovered: Optional[Dict[str, Optional[int]]] = None):
+        """Write status changes back to the registries, which the UI lists.
+
+        discovered maps each probed service to the process_id its registry
+        entry had when it was read. Every registry is rewritten under its
+        lock, and an entry is only changed while it still holds that
+        process_id: a service (re)started since the scan keeps its process.
+        """
+        discovered = discovered or {}
+
+        def unchanged(kind: str, name: str, stored_pid: Optional[int]) -> bool:
+            key = service_key(kind, name)
+            return key in table and key in discovered and discovered[key] == stored_pid
+
+        def dead(kind: str, name: str, stored_pid: Optional[int]) -> bool:
+            return unchanged(kind, name, stored_pid) and table[service_key(kind, name)]["status"] == "stopped"
+
+        def mark_stopped(kind: str):
+            def mutate(registry: Dict[str, Any]) -> bool:
+                changed = False
+                for name, info in registry.items():
+                    if dead(kind, name, info.get("process_id")) and (
+                        info.get("status") != "stopped" or "process_id" in info
+                    ):
+                        info["status"] = "stopped"
+                        for key in ("process_id", "stdout_fd", "stderr_fd"):
+                            info.pop(key, None)
+                        changed = True
+                    # A replica that died keeps its port for the next start
+                    for replica in info.get("replicas") or []:
+                        if "process_id" in replica and dead(
+                            kind, replica_name(name, replica["index"]), replica["process_id"]
+                        ):
+                            replica.pop("process_id")
+                            changed = True
+                return changed
+            return mutate
+
+        await modify_json_file(RAGS_JSON_PATH, mark_stopped(RAG))
+        await modify_json_file(SUPER_ANALYSIS_JSON_PATH, mark_stopped(SUPER_ANALYSIS))
+
+        def sync_byzer_sql(services: Dict[str, Any]) -> bool:
+            changed = False
+            for name, info in services.items():
+                if not unchanged(BYZER_SQL, name, info.get("process_id")):
+                    continue
+                entry = table[service_key(BYZER_SQL, name)]
+                if info.get("status") != entry["status"] or info.get("process_id") != entry["process_id"]:
+                    info["status"] = entry["status"]
+                    if entry["process_id"]:
+                        info["process_id"] = entry["process_id"]
+                    else:
+                        info.pop("process_id", None)
+                    changed = True
+            return changed
+
+        await modify_json_file(BYZER_SQL_JSON_PATH, sync_byzer_sql)
+
+        openai_key = service_key(OPENAI_SERVICE, OPENAI_SERVICE_NAME)
+        openai_entry = table.get(openai_key)
+        if openai_entry is not None and not openai_entry["is_alive"]:
+            def clear_openai(config: Dict[str, Any]) -> bool:
+                servers = config.get("openaiServerList")
+                if not servers or openai_key not in discovered or servers[0].get("pid") != discovered[openai_key]:
+                    return False
+                config["openaiServerList"] = []
+                return True
+
+            await modify_json_file(CONFIG_JSON_PATH, clear_openai)
+
+        model_entries = {
+            entry["name"]: entry["status"] for entry in table.values()
+            if entry["kind"] == MODEL and entry["status"] in ("running", "stopped")
+        }
+        if model_entries:
+            def sync_models(models: Dict[str, Any]) -> bool:
+                changed = False
+                for name, status in model_entries.items():
+                    if name in models and models[name].get("status") != status:
+                        models[name]["status"] = status
+                        changed = True
+                return changed
+
+            await modify_json_file(MODELS_JSON_PATH, sync_models)
+
+    # ---- scan loop -------------------------------------------------------
+
+    async def scan_once(self, check_models: bool = False) -> Dict[str, Dict[str, Any]]:
+        if self._scan_lock is None:
+            self._scan_lock = asyncio.Lock()
+        async with self._scan_lock:
+            services = await self._discover()
+            table = await asyncio.to_thread(self._probe, services)
+            if check_models:
+                table.update(await self._check_models())
+                self._last_model_check = time.monotonic()
+
+            state = get_shared_state()
+            previous = await state.items(SERVICE_STATUS)
+            for key, entry in table.items():
+                old = previous.get(key)
+                if old is None or old.get("status") != entry["status"] or old.get("process_id") != entry.get("process_id"):
+                    entry["since"] = entry["checked_at"]
+                else:
+                    entry["since"] = old.get("since", entry["checked_at"])
+                await state.set(SERVICE_STATUS, key, entry)
+            # Model entries survive scans that skip the CLI check
+            for key in previous.keys() - table.keys():
+                if not key.startswith(f"{MODEL}/"):
+                    await state.delete(SERVICE_STATUS, key)
+
+            await self._reconcile(table, {service_key(kind, name): pid for kind, name, pid, _ in services})
+            return table
+
+    def wake(self):
+        if self._wake is not None:
+            self._wake.set()
+
+    async def run(self):
+        """Scan loop; registered on the owner lease so it runs in one worker."""
+        self._wake = asyncio.Event()
+        logger.info("Service supervisor started")
+        while True:
+            try:
+                check_models = time.monotonic() - self._last_model_check >= self.model_interval
+                await self.scan_once(check_models=check_models)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Service supervisor scan failed: {str(e)}")
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+
+    # ---- readers ---------------------------------------------------------
+
+    async def get(self, kind: str, name: str) -> Optional[Dict[str, Any]]:
+        """Status entry for one service; probed on demand if not scanned yet."""
+        state = get_shared_state()
+        entry = await state.get(SERVICE_STATUS, service_key(kind, name))
+        if entry is None:
+            if kind == MODEL:
+                entries = await self._check_models([name])
+                for key, value in entries.items():
+                    await state.set(SERVICE_STATUS, key, {**value, "since": value["checked_at"]})
+                await self._reconcile(entries)
+            else:
+                await self.scan_once()
+            entry = await state.get(SERVICE_STATUS, service_key(kind, name))
+        return entry
+
+    async def table(self, kind: Optional[str] = None) -> Dict[str, Dict[str, Any]]:
+        entries = await get_shared_state().items(SERVICE_STATUS)
+        if kind is None:
+            return entries
+        return {entry["name"]: entry for entry in entries.values() if entry.get("kind") == kind}
+
+    async def refresh(self) -> None:
+        """Re-scan right after a start/stop so readers do not see stale state."""
+        await self.scan_once()
+        self.wake()
+
+    async def mark(self, kind: str, name: str, status: str, **fields) -> None:
+        """Record a status known from a start/stop command's own result."""
+        now = time.time()
+        await get_shared_state().set(SERVICE_STATUS, service_key(kind, name), {
+            "kind": kind, "name": name, "status": status, "checked_at": now, "since": now, **fields
+        })
+
+
+service_supervisor = ServiceSupervisor()
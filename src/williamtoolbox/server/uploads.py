@@ -0,0 +1,252 @@
+import os
+import re
+import math
+import time
+import uuid
+import shutil
+import hashlib
+import asyncio
+import aiofiles
+from typing import Any, AsyncIterator, Dict, Optional, Tuple
+from fastapi import UploadFile
+from loguru import logger
+
+from ..storage.json_file import read_json_file, write_json_file, with_file_lock
+from ..storage.blob_store import blob_store
+
+# Uploads are copied in blocks of this size instead of being read whole
+COPY_BLOCK_BYTES = 1024 * 1024
+# Resumable uploads keep their chunks here until they are completed
+UPLOAD_SESSIONS_DIR = os.path.join("data", "uploads", "sessions")
+DEFAULT_CHUNK_BYTES = 8 * 1024 * 1024
+MIN_CHUNK_BYTES = 64 * 1024
+MAX_CHUNK_BYTES = 64 * 1024 * 1024
+# Sessions without a chunk for this long are removed
+SESSION_TTL_SECONDS = 7 * 24 * 3600
+
+UPLOAD_ID_RE = re.compile(r"^[0-9a-f]{32}$")
+
+
+def resolve_target(base_dir: str, filename: str) -> str:
+    """Absolute path of filename inside base_dir; rejects paths escaping it."""
+    base = os.path.abspath(base_dir)
+    path = os.path.abspath(os.path.join(base, filename or ""))
+    if path == base or os.path.commonpath([base, path]) != base:
+        raise ValueError(f"Invalid file name: {filename}")
+    return path
+
+
+def temp_path(path: str) -> str:
+    # Hidden, so doc_dir scans and the watcher ignore half-written files
+    return os.path.join(os.path.dirname(path), f".{os.path.basename(path)}.{uuid.uuid4().hex}.part")
+
+
+async def upload_blocks(upload: UploadFile) -> AsyncIterator[bytes]:
+    while True:
+        block = await upload.read(COPY_BLOCK_BYTES)
+        if not block:
+            return
+        yield block
+
+
+async def write_atomic(blocks: AsyncIterator[bytes], path: str,
+                       max_bytes: Optional[int] = None) -> Tuple[int, str]:
+    """Stream blocks into a temp file next to path and rename it into place.
+
+    Returns the size and sha256 of what was written. Readers never see a
+    partial file, and a failed upload leaves the previous file untouched.
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = temp_path(path)
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        async with aiofiles.open(tmp_path, "wb") as f:
+            async for block in blocks:
+                size += len(block)
+                if max_bytes is not None and size > max_bytes:
+                    raise ValueError(f"More than the expected {max_bytes} bytes")
+                digest.update(block)
+                await f.write(block)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except FileNotFoundError:
+            pass
+        raise
+    return size, digest.hexdigest()
+
+
+async def save_upload(upload: UploadFile, path: str) -> Tuple[int, str]:
+    """Stream an upload into the blob store and link it at path; returns size and sha256."""
+    return await blob_store.put(upload_blocks(upload), path)
+
+
+# ---- Resumable uploads: init, put chunk N (any order, retried freely), complete ----
+
+def _session_dir(upload_id: str) -> str:
+    if not UPLOAD_ID_RE.match(upload_id):
+        raise LookupError(f"Upload {upload_id} not found")
+    return os.path.join(UPLOAD_SESSIONS_DIR, upload_id)
+
+
+def _session_file(upload_id: str) -> str:
+    return os.path.join(_session_dir(upload_id), "session.json")
+
+
+def _chunk_path(upload_id: str, index: int) -> str:
+    return os.path.join(_session_dir(upload_id), f"chunk-{index:06d}")
+
+
+def _expected_size(session: Dict[str, Any], index: int) -> int:
+    if index < session["total_chunks"] - 1:
+        return session["chunk_size"]
+    return session["size"] - session["chunk_size"] * (session["total_chunks"] - 1)
+
+
+def session_status(session: Dict[str, Any]) -> Dict[str, Any]:
+    received = session["chunks"]
+    return {
+        "upload_id": session["upload_id"],
+        "filename": session["filename"],
+        "size": session["size"],
+        "sha256": session["sha256"],
+        "chunk_size": session["chunk_size"],
+        "total_chunks": session["total_chunks"],
+        "received_chunks": len(received),
+        "bytes_received": sum(chunk["size"] for chunk in received.values()),
+        "missing": [i for i in range(session["total_chunks"]) if str(i) not in received],
+        "created_at": session["created_at"],
+        "updated_at": session["updated_at"],
+    }
+
+
+def _remove_expired_sync() -> None:
+    if not os.path.isdir(UPLOAD_SESSIONS_DIR):
+        return
+    now = time.time()
+    for upload_id in os.listdir(UPLOAD_SESSIONS_DIR):
+        path = os.path.join(UPLOAD_SESSIONS_DIR, upload_id)
+        try:
+            if now - os.path.getmtime(os.path.join(path, "session.json")) > SESSION_TTL_SECONDS:
+                shutil.rmtree(path, ignore_errors=True)
+                logger.info(f"Removed expired upload {upload_id}")
+        except FileNotFoundError:
+            continue
+
+
+async def create_session(scope: str, base_dir: str, filename: str, size: int,
+                         chunk_size: Optional[int] = None, sha256: Optional[str] = None) -> Dict[str, Any]:
+    """Start a resumable upload of filename (size bytes) into base_dir.
+
+    scope ties the session to its owner (e.g. the RAG name) so another
+    owner's upload id cannot be used.
+    """
+    target = resolve_target(base_dir, filename)
+    await asyncio.to_thread(_remove_expired_sync)
+    chunk_size = chunk_size or DEFAULT_CHUNK_BYTES
+    now = time.time()
+    session = {
+        "upload_id": uuid.uuid4().hex,
+        "scope": scope,
+        "filename": filename,
+        "target": target,
+        "size": size,
+        "sha256": sha256.lower() if sha256 else None,
+        "chunk_size": chunk_size,
+        "total_chunks": math.ceil(size / chunk_size),
+        "chunks": {},
+        "created_at": now,
+        "updated_at": now,
+    }
+    os.makedirs(_session_dir(session["upload_id"]))
+    await write_json_file(_session_file(session["upload_id"]), session)
+    return session
+
+
+async def load_session(upload_id: str, scope: str) -> Dict[str, Any]:
+    path = _session_file(upload_id)
+    if not os.path.exists(path):
+        raise LookupError(f"Upload {upload_id} not found")
+    async with with_file_lock(path):
+        session = await read_json_file(path, None)
+    if not session or session["scope"] != scope:
+        raise LookupError(f"Upload {upload_id} not found")
+    return session
+
+
+async def put_chunk(upload_id: str, scope: str, index: int, blocks: AsyncIterator[bytes],
+                    sha256: Optional[str] = None) -> Dict[str, Any]:
+    """Store chunk index, verifying its size and (if given) its sha256.
+
+    Sending a chunk again replaces it, so a client can retry any chunk whose
+    response it did not see.
+    """
+    session = await load_session(upload_id, scope)
+    if not 0 <= index < session["total_chunks"]:
+        raise ValueError(f"Chunk {index} out of range (0..{session['total_chunks'] - 1})")
+    expected = _expected_size(session, index)
+    path = _chunk_path(upload_id, index)
+    size, digest = await write_atomic(blocks, path, max_bytes=expected)
+    error = None
+    if size != expected:
+        error = f"Chunk {index} has {size} bytes, expected {expected}"
+    elif sha256 and digest != sha256.lower():
+        error = f"Checksum mismatch for chunk {index}"
+    if error:
+        os.remove(path)
+        raise ValueError(error)
+
+    session_file = _session_file(upload_id)
+    async with with_file_lock(session_file):
+        session = await read_json_file(session_file, None)
+        session["chunks"][str(index)] = {"size": size, "sha256": digest}
+        session["updated_at"] = time.time()
+        await write_json_file(session_file, session)
+    return session
+
+
+def _assemble_sync(session: Dict[str, Any]) -> Tuple[int, str, str]:
+    tmp_path = os.path.join(_session_dir(session["upload_id"]), "assembled")
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        with open(tmp_path, "wb") as out:
+            for index in range(session["total_chunks"]):
+                with open(_chunk_path(session["upload_id"], index), "rb") as chunk:
+                    while True:
+                        block = chunk.read(COPY_BLOCK_BYTES)
+                        if not block:
+                            break
+                        digest.update(block)
+                        size += len(block)
+                        out.write(block)
+        if session["sha256"] and digest.hexdigest() != session["sha256"]:
+            raise ValueError("Checksum mismatch for the assembled file")
+        mode = blob_store.store_file_sync(tmp_path, digest.hexdigest(), session["target"])
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except FileNotFoundError:
+            pass
+        raise
+    return size, digest.hexdigest(), mode
+
+
+async def complete_session(upload_id: str, scope: str) -> Dict[str, Any]:
+    """Concatenate the chunks into the target file (in a worker thread) and
+    drop the session. On a whole-file checksum mismatch the session is kept."""
+    session = await load_session(upload_id, scope)
+    missing = session_status(session)["missing"]
+    if missing:
+        raise ValueError(f"{len(missing)} chunk(s) missing, first: {missing[0]}")
+    size, digest, mode = await asyncio.to_thread(_assemble_sync, session)
+    await blob_store.add_refs([(digest, session["target"], mode)])
+    await abort_session(upload_id, scope)
+    return {"filename": session["filename"], "path": session["target"], "size": size, "sha256": digest}
+
+
+async def abort_session(upload_id: str, scope: str) -> None:
+    await load_session(upload_id, scope)
+    await asyncio.to_thread(shutil.rmtree, _session_dir(upload_id), True)
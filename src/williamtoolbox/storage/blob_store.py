@@ -0,0 +1,397 @@
+import os
+import sys
+import time
+import uuid
+import errno
+import shutil
+import hashlib
+import asyncio
+import aiofiles
+from typing import Any, AsyncIterator, Callable, Dict, Iterable, List, Optional, Tuple
+from loguru import logger
+
+from ..metrics import Counter, Gauge
+from .json_file import read_json_file, write_json_file, with_file_lock
+
+# Content-addressed store for uploaded documents: data/blobs/ab/abcdef.../ (sha256)
+# holds the content, a refs.json listing the paths linked to it, and results
+# derived from the content (<kind>.json). doc_dirs and annotation uploads get
+# reflinks of the blobs where the filesystem supports them, so a document
+# uploaded to several places shares its storage. Where it does not, files are
+# written directly and no blob is kept (it would only store the content a
+# second time); blobs without live refs are collected.
+BLOB_DIR = os.path.join("data", "blobs")
+BLOB_LINK_ENV = "WILLIAM_TOOLBOX_BLOB_LINK"
+# auto: reflink, else a plain copy; hardlink only when chosen explicitly (the
+# file is then shared and read-only); copy and off: write uploads directly
+LINK_MODES = ("auto", "reflink", "hardlink", "copy", "off")
+# Blobs and temp files younger than this are never collected (a link may be in flight)
+GC_GRACE_SECONDS = 3600
+GC_INTERVAL_SECONDS = 3600
+# Linux FICLONE ioctl (btrfs, xfs, ...)
+FICLONE = 0x40049409
+
+BLOB_LINKS = Counter("blob_store_links_total", "Files materialized from the blob store.", ["mode"])
+BLOB_DEDUP_HITS = Counter("blob_store_dedup_hits_total", "Stored files whose content was already in the blob store.")
+BLOB_COUNT = Gauge("blob_store_blobs", "Blobs in the blob store (as of the last collection).")
+BLOB_BYTES = Gauge("blob_store_bytes", "Bytes in the blob store (as of the last collection).")
+DERIVED_HITS = Counter("blob_store_derived_total", "Lookups of results derived from blob content.", ["kind", "result"])
+
+
+def _modes(setting: str) -> List[str]:
+    if setting == "auto":
+        # Both give every doc_dir its own writable file; a hardlink would be
+        # the read-only blob itself, shared with every other doc_dir
+        return ["copy"] if os.name == "nt" else ["reflink", "copy"]
+    return [setting]
+
+
+def _reflink(src: str, dst: str) -> None:
+    if not sys.platform.startswith("linux"):
+        raise OSError(errno.EOPNOTSUPP, "reflink not supported")
+    import fcntl
+    with open(src, "rb") as s, open(dst, "wb") as d:
+        fcntl.ioctl(d.fileno(), FICLONE, s.fileno())
+
+
+def _temp_path(path: str) -> str:
+    return os.path.join(os.path.dirname(path), f".{os.path.basename(path)}.{uuid.uuid4().hex}.part")
+
+
+class BlobStore:
+    """sha256-addressed, ref-counted file store.
+
+    Writers stream content into a temp file in the store (put) or hand over
+    a temp file they already hashed (store_file_sync); the content is kept
+    once and the destination path becomes a reflink of it (or, if
+    configured, a hardlink). Where neither works the temp file simply becomes
+    the destination and nothing is stored. Blobs are read-only, so a hardlinked file cannot
+    be edited in place; writes through the API replace files instead of
+    rewriting them.
+    """
+
+    def __init__(self, root: str = BLOB_DIR, link_mode: Optional[str] = None):
+        self.root = root
+        link_mode = link_mode or os.environ.get(BLOB_LINK_ENV, "auto")
+        if link_mode not in LINK_MODES:
+            raise ValueError(f"{BLOB_LINK_ENV} must be one of {', '.join(LINK_MODES)}")
+        self.enabled = link_mode != "off"
+        self.modes = _modes(link_mode) if self.enabled else []
+        # Modes that share the blob's storage; "copy" means a plain file
+        self.shared_modes = [mode for mode in self.modes if mode != "copy"]
+        # st_dev of destinations where no shared mode worked (e.g. ext4)
+        self._unshareable = set()
+
+    def _dir(self, sha256: str) -> str:
+        return os.path.join(self.root, sha256[:2], sha256)
+
+    def path(self, sha256: str) -> str:
+        return os.path.join(self._dir(sha256), "content")
+
+    def _refs_path(self, sha256: str) -> str:
+        return os.path.join(self._dir(sha256), "refs.json")
+
+    def _derived_path(self, kind: str, sha256: str) -> str:
+        return os.path.join(self._dir(sha256), f"{kind}.json")
+
+    @property
+    def tmp_dir(self) -> str:
+        return os.path.join(self.root, "tmp")
+
+    # ---- storing ----
+
+    async def put(self, blocks: AsyncIterator[bytes], dest: str,
+                  max_bytes: Optional[int] = None) -> Tuple[int, str]:
+        """Stream blocks into the store and materialize them at dest.
+
+        Returns the size and sha256. dest is replaced atomically.
+        """
+        os.makedirs(self.tmp_dir, exist_ok=True)
+        tmp_path = os.path.join(self.tmp_dir, uuid.uuid4().hex)
+        digest = hashlib.sha256()
+        size = 0
+        try:
+            async with aiofiles.open(tmp_path, "wb") as f:
+                async for block in blocks:
+                    size += len(block)
+                    if max_bytes is not None and size > max_bytes:
+                        raise ValueError(f"More than the expected {max_bytes} bytes")
+                    digest.update(block)
+                    await f.write(block)
+            sha256 = digest.hexdigest()
+            mode = await asyncio.to_thread(self.store_file_sync, tmp_path, sha256, dest)
+        except BaseException:
+            self._discard(tmp_path)
+            raise
+        await self.add_refs([(sha256, dest, mode)])
+        return size, sha256
+
+    def store_file_sync(self, tmp_path: str, sha256: str, dest: str) -> str:
+        """Move a fully written temp file (content hash sha256) into the store
+        and link it to dest; returns how dest was materialized."""
+        dest_dir = os.path.dirname(os.path.abspath(dest))
+        os.makedirs(dest_dir, exist_ok=True)
+        if not self.shared_modes:
+            return self._place(tmp_path, dest)
+        device = os.stat(dest_dir).st_dev
+        if device in self._unshareable:
+            return self._place(tmp_path, dest)
+        blob = self.path(sha256)
+        adopted = False
+        for _ in range(2):
+            if not os.path.exists(blob):
+                self._adopt(tmp_path, blob)
+                tmp_path, adopted = None, True
+            try:
+                mode = self._link(blob, dest)
+                break
+            except FileNotFoundError:
+                # Blob collected between the check and the link: store ours
+                if tmp_path is None:
+                    raise
+            except OSError:
+                if "copy" not in self.modes:
+                    raise
+                # A blob beside a plain copy would only double the space used:
+                # write dest directly, taking back the blob just stored
+                self._unshareable.add(device)
+                if adopted:
+                    tmp_path = self._unadopt(blob)
+                return self._place(tmp_path, dest)
+        if tmp_path is not None:
+            BLOB_DEDUP_HITS.inc()
+            self._discard(tmp_path)
+        BLOB_LINKS.inc(mode=mode)
+        return mode
+
+    def _adopt(self, tmp_path: str, blob: str) -> None:
+        os.makedirs(os.path.dirname(blob), exist_ok=True)
+        try:
+            os.replace(tmp_path, blob)
+        except OSError as e:
+            if e.errno != errno.EXDEV:
+                raise
+            # Temp file on another filesystem (e.g. beside a doc_dir elsewhere)
+            staged = os.path.join(self.tmp_dir, uuid.uuid4().hex)
+            os.makedirs(self.tmp_dir, exist_ok=True)
+            shutil.copyfile(tmp_path, staged)
+            os.replace(staged, blob)
+            self._discard(tmp_path)
+        if os.name != "nt":
+            os.chmod(blob, 0o444)
+
+    def _unadopt(self, blob: str) -> str:
+        """Take a blob nothing links to yet back out of the store."""
+        staged = os.path.join(self.tmp_dir, uuid.uuid4().hex)
+        os.makedirs(self.tmp_dir, exist_ok=True)
+        os.chmod(blob, 0o644)
+        os.replace(blob, staged)
+        try:
+            os.rmdir(os.path.dirname(blob))
+        except OSError:
+            pass
+        return staged
+
+    def _place(self, tmp_path: str, dest: str) -> str:
+        """Move a temp file to dest without the store."""
+        try:
+            os.replace(tmp_path, dest)
+        except OSError as e:
+            if e.errno != errno.EXDEV:
+                raise
+            # Temp file in the store, dest on another filesystem
+            tmp_dest = _temp_path(dest)
+            try:
+                shutil.copyfile(tmp_path, tmp_dest)
+                os.replace(tmp_dest, dest)
+            except BaseException:
+                self._discard(tmp_dest)
+                raise
+            self._discard(tmp_path)
+        return "direct"
+
+    def _link(self, blob: str, dest: str) -> str:
+        tmp_dest = _temp_path(dest)
+        for mode in self.shared_modes:
+            try:
+                if mode == "reflink":
+                    _reflink(blob, tmp_dest)
+                else:
+                    os.link(blob, tmp_dest)
+                break
+            except FileNotFoundError:
+                self._discard(tmp_dest)
+                raise
+            except OSError:
+                # Unsupported here (filesystem, cross-device): try the next mode
+                self._discard(tmp_dest)
+                if mode == self.shared_modes[-1]:
+                    raise
+        os.replace(tmp_dest, dest)
+        return mode
+
+    @staticmethod
+    def _discard(path: Optional[str]) -> None:
+        if path is None:
+            return
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    # ---- refs ----
+
+    @staticmethod
+    def _ref_entry(dest: str, mode: str) -> Dict[str, Any]:
+        st = os.stat(dest)
+        return {"mode": mode, "size": st.st_size, "mtime_ns": st.st_mtime_ns, "ino": st.st_ino}
+
+    async def add_refs(self, refs: Iterable[Tuple[str, str, str]]) -> None:
+        """Record (sha256, path, mode) links made by store_file_sync."""
+        if not self.enabled:
+            return
+        by_blob: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        for sha256, dest, mode in refs:
+            if mode == "direct":
+                continue
+            try:
+                by_blob.setdefault(sha256, {})[os.path.abspath(dest)] = self._ref_entry(dest, mode)
+            except FileNotFoundError:
+                continue
+        for sha256, entries in by_blob.items():
+            refs_path = self._refs_path(sha256)
+            os.makedirs(os.path.dirname(refs_path), exist_ok=True)
+            async with with_file_lock(refs_path):
+                current = await read_json_file(refs_path, {})
+                current.update(entries)
+                await write_json_file(refs_path, current)
+
+    @staticmethod
+    def _live(blob_stat: os.stat_result, dest: str, ref: Dict[str, Any]) -> bool:
+        """Whether dest still holds this blob's content as linked."""
+        try:
+            st = os.stat(dest)
+        except FileNotFoundError:
+            return False
+        if ref["mode"] == "hardlink":
+            return st.st_ino == blob_stat.st_ino and st.st_dev == blob_stat.st_dev
+        return st.st_size == ref["size"] and st.st_mtime_ns == ref["mtime_ns"]
+
+    def _live_refs_sync(self, sha256: str, refs: Dict[str, Dict[str, Any]]) -> Optional[Dict[str, Dict[str, Any]]]:
+        try:
+            blob_stat = os.stat(self.path(sha256))
+        except FileNotFoundError:
+            return None
+        # Copies (made by earlier versions) share nothing with the blob, so
+        # they neither keep it alive nor count as deduplicated
+        return {
+            dest: ref for dest, ref in refs.items()
+            if ref["mode"] != "copy" and self._live(blob_stat, dest, ref)
+        }
+
+    # ---- collection ----
+
+    def _blobs_sync(self) -> List[Tuple[str, os.stat_result]]:
+        blobs = []
+        if not os.path.isdir(self.root):
+            return blobs
+        for prefix in os.listdir(self.root):
+            directory = os.path.join(self.root, prefix)
+            if len(prefix) != 2 or not os.path.isdir(directory):
+                continue
+            for name in os.listdir(directory):
+                try:
+                    blobs.append((name, os.stat(self.path(name))))
+                except (FileNotFoundError, NotADirectoryError):
+                    continue
+        return blobs
+
+    def _remove_blob_sync(self, sha256: str) -> None:
+        if os.name == "nt":
+            os.chmod(self.path(sha256), 0o644)
+        shutil.rmtree(self._dir(sha256), ignore_errors=True)
+
+    def _sweep_tmp_sync(self, now: float) -> None:
+        if not os.path.isdir(self.tmp_dir):
+            return
+        for name in os.listdir(self.tmp_dir):
+            path = os.path.join(self.tmp_dir, name)
+            try:
+                if now - os.path.getmtime(path) > GC_GRACE_SECONDS:
+                    os.remove(path)
+            except FileNotFoundError:
+                continue
+
+    async def gc(self) -> Dict[str, Any]:
+        """Drop refs whose path was deleted or replaced, and blobs left without refs."""
+        now = time.time()
+        await asyncio.to_thread(self._sweep_tmp_sync, now)
+        blobs = await asyncio.to_thread(self._blobs_sync)
+        removed = freed = refs_total = kept_bytes = saved = 0
+        for sha256, st in blobs:
+            refs_path = self._refs_path(sha256)
+            async with with_file_lock(refs_path):
+                refs = await read_json_file(refs_path, {})
+                live = await asyncio.to_thread(self._live_refs_sync, sha256, refs)
+                if live is None:
+                    continue
+                unreferenced = not live and now - st.st_ctime > GC_GRACE_SECONDS
+                if live != refs and not unreferenced:
+                    await write_json_file(refs_path, live)
+            if unreferenced:
+                # Outside the lock: its lock file lives in the removed directory
+                await asyncio.to_thread(self._remove_blob_sync, sha256)
+                removed += 1
+                freed += st.st_size
+                continue
+            refs_total += len(live)
+            kept_bytes += st.st_size
+            saved += st.st_size * max(0, len(live) - 1)
+        BLOB_COUNT.set(len(blobs) - removed)
+        BLOB_BYTES.set(kept_bytes)
+        stats = {"blobs": len(blobs) - removed, "bytes": kept_bytes, "refs": refs_total,
+                 "bytes_deduplicated": saved, "removed": removed, "bytes_freed": freed}
+        if removed:
+            logger.info(f"Blob store collection: {stats}")
+        return stats
+
+    async def run(self):
+        """Collection loop; registered on the owner lease so it runs in one worker."""
+        if not self.enabled:
+            return
+        while True:
+            try:
+                await self.gc()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Blob store collection failed: {str(e)}")
+            await asyncio.sleep(GC_INTERVAL_SECONDS)
+
+    # ---- results derived from content ----
+
+    async def derived(self, kind: str, sha256: Optional[str], compute: Callable[[], Any]) -> Any:
+        """compute() (blocking, run in a worker thread) cached by content hash.
+
+        Identical documents, wherever they were uploaded, are parsed once.
+        Results must be JSON-serializable; without a hash nothing is cached.
+        """
+        if not sha256:
+            return await asyncio.to_thread(compute)
+        path = self._derived_path(kind, sha256)
+        if os.path.exists(path):
+            async with with_file_lock(path):
+                cached = await read_json_file(path, None)
+            if cached is not None:
+                DERIVED_HITS.inc(kind=kind, result="hit")
+                return cached["result"]
+        DERIVED_HITS.inc(kind=kind, result="miss")
+        result = await asyncio.to_thread(compute)
+        # Only cached while the blob exists, so collection removes it too
+        if os.path.isdir(self._dir(sha256)):
+            async with with_file_lock(path):
+                await write_json_file(path, {"result": result, "created_at": time.time()})
+        return result
+
+
+blob_store = BlobStore()
@@ -8,9 +8,11 @@ import asyncio
 import aiofiles
 from contextlib import asynccontextmanager
 from pathlib import Path
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Callable, Optional
 from datetime import datetime, timedelta
+import time
 import uuid
+from ..metrics import STORAGE_LOCK_WAIT, STORAGE_OPERATION_DURATION, STORAGE_BYTES
 
 class AsyncFileLock:
     def __init__(self, lock_file: str):
@@ -39,20 +41,87 @@ class AsyncFileLock:
                 self.lock_file.unlink()  # 删除锁文件
                 self._lock_handle = None  # 重置
 
+def registry_name(file_path: str) -> str:
+    """Metric label for a JSON file: models.json -> models, chat_data/<user>/chat.json -> chat."""
+    return os.path.splitext(os.path.basename(file_path))[0]
+
+
 @asynccontextmanager
 async def with_file_lock(file_path: str, timeout: int = 30):
     lock = AsyncFileLock(file_path)
     try:
+        start = time.perf_counter()
         await lock.acquire(timeout=timeout)
+        STORAGE_LOCK_WAIT.observe(time.perf_counter() - start, registry=registry_name(file_path))
         yield
     finally:
         await lock.release()
 
 
+async def read_json_file(file_path: str, default: Any) -> Any:
+    """Read and parse a JSON registry, or return default if it does not exist.
+
+    Callers hold the file lock where needed; load time and size are recorded
+    in the storage_* metrics.
+    """
+    if not os.path.exists(file_path):
+        return default
+    start = time.perf_counter()
+    async with aiofiles.open(file_path, "r") as f:
+        content = await f.read()
+    data = json.loads(content)
+    registry = registry_name(file_path)
+    STORAGE_OPERATION_DURATION.observe(time.perf_counter() - start, registry=registry, operation="load")
+    STORAGE_BYTES.inc(len(content.encode("utf-8")), registry=registry, operation="load")
+    return data
+
+
+async def write_json_file(file_path: str, data: Any) -> None:
+    """Serialize data to a JSON registry; callers hold the file lock."""
+    start = time.perf_counter()
+    content = json.dumps(data, ensure_ascii=False)
+    async with aiofiles.open(file_path, "w") as f:
+        await f.write(content)
+    registry = registry_name(file_path)
+    STORAGE_OPERATION_DURATION.observe(time.perf_counter() - start, registry=registry, operation="save")
+    STORAGE_BYTES.inc(len(content.encode("utf-8")), registry=registry, operation="save")
+
+
+async def update_json_entry(file_path: str, key: str, value: Any) -> None:
+    """Replace one entry of a JSON registry, holding the lock across read and write.
+
+    Unlike load + save this cannot drop entries changed concurrently by
+    another request (e.g. several RAGs started in parallel).
+    """
+    async with with_file_lock(file_path):
+        data = await read_json_file(file_path, {})
+        data[key] = value
+        await write_json_file(file_path, data)
+
+
+async def modify_json_file(file_path: str, mutate: Callable[[Any], bool], default: Any = None) -> bool:
+    """Read-modify-write of a JSON registry under its lock.
+
+    mutate edits the data in place and returns whether it changed anything;
+    the file is only rewritten then. Returns that flag.
+    """
+    async with with_file_lock(file_path):
+        data = await read_json_file(file_path, {} if default is None else default)
+        if not mutate(data):
+            return False
+        await write_json_file(file_path, data)
+        return True
+
+
 # Path to the models.json file
 MODELS_JSON_PATH = "models.json"
 RAGS_JSON_PATH = "rags.json"
 SUPER_ANALYSIS_JSON_PATH = "super_analysis.json"
+BOOT_PROFILES_JSON_PATH = "boot_profiles.json"
+LOG_POLICIES_JSON_PATH = "log_policies.json"
+BUILD_JOBS_JSON_PATH = "build_jobs.json"
+BYZER_SQL_JSON_PATH = "byzer_sql.json"
+CONFIG_JSON_PATH = "config.json"
 
 # Path to the chat.json file
 CHAT_JSON_PATH = "chat.json"
@@ -63,11 +132,7 @@ async def load_chat_data(username: str):
     chat_dir = os.path.join("chat_data", username)
     chat_file = os.path.join(chat_dir, "chat.json")
     os.makedirs(chat_dir, exist_ok=True)        
-    if os.path.exists(chat_file):
-        async with aiofiles.open(chat_file, "r") as f:
-            content = await f.read()
-            return json.loads(content)
-    return {"conversations": []}
+    return await read_json_file(chat_file, {"conversations": []})
 
 
 # Function to save chat data to JSON file for a specific user
@@ -77,14 +142,12 @@ async def save_chat_data(username: str, data):
     os.makedirs(chat_dir, exist_ok=True)
     
     async with with_file_lock(chat_file):
-        async with aiofiles.open(chat_file, "w") as f:
-            content = json.dumps(data, ensure_ascii=False)
-            await f.write(content)
+        await write_json_file(chat_file, data)
 
 
 # Add this function to load the config
 async def load_config():
-    config_path = "config.json"
+    config_path = CONFIG_JSON_PATH
     default_config = {
         "saasBaseUrls": [
             {"value": "https://ark.cn-beijing.volces.com/api/v3", "label": "火山方舟"},
@@ -105,28 +168,23 @@ async def load_config():
     }
 
     async with with_file_lock(config_path):
-        if os.path.exists(config_path):
-            async with aiofiles.open(config_path, "r") as f:
-                content = await f.read()
-                user_config = json.loads(content)
-                
-                # Merge user config with default config
-                for key in default_config:
-                    if key not in user_config:
-                        user_config[key] = default_config[key]
-                
-                return user_config
+        user_config = await read_json_file(config_path, None)
+        if user_config is not None:
+            # Merge user config with default config
+            for key in default_config:
+                if key not in user_config:
+                    user_config[key] = default_config[key]
+            
+            return user_config
                 
         return default_config
 
 
 async def save_config(config):
     """Save the configuration to file."""
-    config_path = "config.json"
+    config_path = CONFIG_JSON_PATH
     async with with_file_lock(config_path):
-        async with aiofiles.open(config_path, "w") as f:
-            content = json.dumps(config, ensure_ascii=False)
-            await f.write(content)
+        await write_json_file(config_path, config)
 
 
 # Path to the models.json file
@@ -137,19 +195,13 @@ RAGS_JSON_PATH = "rags.json"
 # Function to load models from JSON file
 async def load_models_from_json():
     async with with_file_lock(MODELS_JSON_PATH):
-        if os.path.exists(MODELS_JSON_PATH):
-            async with aiofiles.open(MODELS_JSON_PATH, "r") as f:
-                content = await f.read()
-                return json.loads(content)
-        return {}
+        return await read_json_file(MODELS_JSON_PATH, {})
 
 
 # Function to save models to JSON file
 async def save_models_to_json(models):
     async with with_file_lock(MODELS_JSON_PATH):
-        async with aiofiles.open(MODELS_JSON_PATH, "w") as f:
-            content = json.dumps(models, ensure_ascii=False)
-            await f.write(content)
+        await write_json_file(MODELS_JSON_PATH, models)
 
 
 def b_load_models_from_json():    
@@ -169,35 +221,76 @@ def b_save_models_to_json(models):
 # Function to load RAGs from JSON file
 async def load_rags_from_json():
     async with with_file_lock(RAGS_JSON_PATH):
-        if os.path.exists(RAGS_JSON_PATH):
-            async with aiofiles.open(RAGS_JSON_PATH, "r") as f:
-                content = await f.read()
-                return json.loads(content)
-        return {}
+        return await read_json_file(RAGS_JSON_PATH, {})
 
 
 # Function to save RAGs to JSON file
 async def save_rags_to_json(rags):
     async with with_file_lock(RAGS_JSON_PATH):
-        async with aiofiles.open(RAGS_JSON_PATH, "w") as f:
-            content = json.dumps(rags, ensure_ascii=False)
-            await f.write(content)
+        await write_json_file(RAGS_JSON_PATH, rags)
+
+
+async def update_rag_in_json(rag_name: str, rag_info: Dict[str, Any]) -> None:
+    await update_json_entry(RAGS_JSON_PATH, rag_name, rag_info)
+
+
+async def set_rag_fields(rag_name: str, **fields: Any) -> bool:
+    """Set some fields of a RAG entry as it is now on disk, leaving the rest
+    (status, process_id, replicas) to whoever changed them meanwhile."""
+    def mutate(rags: Dict[str, Any]) -> bool:
+        if rag_name not in rags:
+            return False
+        rags[rag_name].update(fields)
+        return True
+
+    return await modify_json_file(RAGS_JSON_PATH, mutate)
+
+
+async def update_model_in_json(model_name: str, model_info: Dict[str, Any]) -> None:
+    await update_json_entry(MODELS_JSON_PATH, model_name, model_info)
+
+
+# Boot profiles: named sets of RAGs/models to start together, one of them
+# optionally restored when the backend starts
+def _empty_boot_profiles() -> Dict[str, Any]:
+    return {"profiles": {}, "restore_on_boot": None}
+
+
+async def load_boot_profiles() -> Dict[str, Any]:
+    async with with_file_lock(BOOT_PROFILES_JSON_PATH):
+        return await read_json_file(BOOT_PROFILES_JSON_PATH, _empty_boot_profiles())
+
+
+async def modify_boot_profiles(mutate: Callable[[Dict[str, Any]], bool]) -> bool:
+    return await modify_json_file(BOOT_PROFILES_JSON_PATH, mutate, _empty_boot_profiles())
+
+
+async def save_boot_profiles(data: Dict[str, Any]) -> None:
+    async with with_file_lock(BOOT_PROFILES_JSON_PATH):
+        await write_json_file(BOOT_PROFILES_JSON_PATH, data)
+
+
+async def load_log_policies() -> Dict[str, Any]:
+    async with with_file_lock(LOG_POLICIES_JSON_PATH):
+        return await read_json_file(LOG_POLICIES_JSON_PATH, {"default": {}, "services": {}})
+
+
+async def save_log_policies(data: Dict[str, Any]) -> None:
+    async with with_file_lock(LOG_POLICIES_JSON_PATH):
+        await write_json_file(LOG_POLICIES_JSON_PATH, data)
 
 # Function to load Super Analysis from JSON file
 async def load_super_analysis_from_json():
     async with with_file_lock(SUPER_ANALYSIS_JSON_PATH):
-        if os.path.exists(SUPER_ANALYSIS_JSON_PATH):
-            async with aiofiles.open(SUPER_ANALYSIS_JSON_PATH, "r") as f:
-                content = await f.read()
-                return json.loads(content)
-        return {}
+        return await read_json_file(SUPER_ANALYSIS_JSON_PATH, {})
 
 # Function to save Super Analysis to JSON file
 async def save_super_analysis_to_json(analyses):
     async with with_file_lock(SUPER_ANALYSIS_JSON_PATH):
-        async with aiofiles.open(SUPER_ANALYSIS_JSON_PATH, "w") as f:
-            content = json.dumps(analyses, ensure_ascii=False)
-            await f.write(content)
+        await write_json_file(SUPER_ANALYSIS_JSON_PATH, analyses)
+
+async def update_super_analysis_in_json(analysis_name: str, analysis_info: Dict[str, Any]) -> None:
+    await update_json_entry(SUPER_ANALYSIS_JSON_PATH, analysis_name, analysis_info)
 
 async def get_event_file_path(request_id: str) -> str:
     os.makedirs("chat_events", exist_ok=True)
@@ -205,20 +298,15 @@ async def get_event_file_path(request_id: str) -> str:
 
 
 async def load_byzer_sql_from_json():
-    byzer_sql_path = "byzer_sql.json"
-    async with with_file_lock(byzer_sql_path):
-        if os.path.exists(byzer_sql_path):
-            async with aiofiles.open(byzer_sql_path, "r") as f:
-                content = await f.read()
-                return json.loads(content)  
-        return {}     
+    async with with_file_lock(BYZER_SQL_JSON_PATH):
+        return await read_json_file(BYZER_SQL_JSON_PATH, {})
 
 async def save_byzer_sql_to_json(services) -> None:
-    byzer_sql_path = "byzer_sql.json"
-    async with with_file_lock(byzer_sql_path):
-        async with aiofiles.open(byzer_sql_path, "w") as f:
-            content = json.dumps(services, ensure_ascii=False)
-            await f.write(content)
+    async with with_file_lock(BYZER_SQL_JSON_PATH):
+        await write_json_file(BYZER_SQL_JSON_PATH, services)
+
+async def update_byzer_sql_in_json(service_name: str, service_info: Dict[str, Any]) -> None:
+    await update_json_entry(BYZER_SQL_JSON_PATH, service_name, service_info)
 
 # File resources related functions
 FILE_RESOURCES_JSON_PATH = "file_resources.json"
@@ -226,18 +314,12 @@ FILE_RESOURCES_JSON_PATH = "file_resources.json"
 async def load_file_resources() -> Dict[str, Any]:
     """Load file resources from JSON file"""
     async with with_file_lock(FILE_RESOURCES_JSON_PATH):
-        if os.path.exists(FILE_RESOURCES_JSON_PATH):
-            async with aiofiles.open(FILE_RESOURCES_JSON_PATH, "r") as f:
-                content = await f.read()
-                return json.loads(content)
-        return {}
+        return await read_json_file(FILE_RESOURCES_JSON_PATH, {})
 
 async def save_file_resources(resources: Dict[str, Any]) -> None:
     """Save file resources to JSON file"""
     async with with_file_lock(FILE_RESOURCES_JSON_PATH):
-        async with aiofiles.open(FILE_RESOURCES_JSON_PATH, "w") as f:
-            content = json.dumps(resources, ensure_ascii=False)
-            await f.write(content)
+        await write_json_file(FILE_RESOURCES_JSON_PATH, resources)
 
 
 # API Key related functions
@@ -246,18 +328,12 @@ API_KEYS_JSON_PATH = "api_keys.json"
 async def load_api_keys() -> Dict[str, Any]:
     """Load API keys from JSON file"""
     async with with_file_lock(API_KEYS_JSON_PATH):
-        if os.path.exists(API_KEYS_JSON_PATH):
-            async with aiofiles.open(API_KEYS_JSON_PATH, "r") as f:
-                content = await f.read()
-                return json.loads(content)
-        return {}
+        return await read_json_file(API_KEYS_JSON_PATH, {})
 
 async def save_api_keys(api_keys: Dict[str, Any]) -> None:
     """Save API keys to JSON file"""
     async with with_file_lock(API_KEYS_JSON_PATH):
-        async with aiofiles.open(API_KEYS_JSON_PATH, "w") as f:
-            content = json.dumps(api_keys, ensure_ascii=False)
-            await f.write(content)
+        await write_json_file(API_KEYS_JSON_PATH, api_keys)
 
 async def create_api_key(name: str, description: Optional[str] = None, expires_in_days: int = 30) -> Dict[str, Any]:
     """Create a new API key"""
@@ -0,0 +1,209 @@
+import os
+import json
+import time
+import sqlite3
+import asyncio
+import threading
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+from loguru import logger
+
+# State that every backend worker must see (task progress, build state, ...).
+# With a single worker it lives in memory; with --workers > 1 it is kept in a
+# SQLite database next to the other registries so all worker processes share it.
+SHARED_STATE_DB_PATH = "shared_state.db"
+OWNER_LOCK_PATH = "backend.owner.lock"
+WORKERS_ENV = "WILLIAM_TOOLBOX_WORKERS"
+
+
+class MemoryStateStore:
+    """In-process store used when the backend runs a single worker."""
+
+    def __init__(self):
+        self._data: Dict[str, Dict[str, Any]] = {}
+
+    async def get(self, namespace: str, key: str, default: Any = None) -> Any:
+        return self._data.get(namespace, {}).get(key, default)
+
+    async def set(self, namespace: str, key: str, value: Any) -> None:
+        self._data.setdefault(namespace, {})[key] = value
+
+    async def update(self, namespace: str, key: str, changes: Dict[str, Any]) -> Dict[str, Any]:
+        value = {**self._data.get(namespace, {}).get(key, {}), **changes}
+        self._data.setdefault(namespace, {})[key] = value
+        return value
+
+    async def delete(self, namespace: str, key: str) -> None:
+        self._data.get(namespace, {}).pop(key, None)
+
+    async def items(self, namespace: str) -> Dict[str, Any]:
+        return dict(self._data.get(namespace, {}))
+
+
+class SQLiteStateStore:
+    """Cross-process store: one row per (namespace, key) holding a JSON value."""
+
+    def __init__(self, db_path: str = SHARED_STATE_DB_PATH):
+        self.db_path = db_path
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS shared_state ("
+                " namespace TEXT NOT NULL,"
+                " key TEXT NOT NULL,"
+                " value TEXT NOT NULL,"
+                " updated_at REAL NOT NULL,"
+                " PRIMARY KEY (namespace, key))"
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _get(self, namespace: str, key: str, default: Any) -> Any:
+        row = self._connect().execute(
+            "SELECT value FROM shared_state WHERE namespace = ? AND key = ?",
+            (namespace, key),
+        ).fetchone()
+        return json.loads(row[0]) if row else default
+
+    def _set(self, namespace: str, key: str, value: Any) -> None:
+        self._connect().execute(
+            "INSERT OR REPLACE INTO shared_state (namespace, key, value, updated_at) VALUES (?, ?, ?, ?)",
+            (namespace, key, json.dumps(value, ensure_ascii=False), time.time()),
+        )
+
+    def _update(self, namespace: str, key: str, changes: Dict[str, Any]) -> Dict[str, Any]:
+        conn = self._connect()
+        # BEGIN IMMEDIATE takes the write lock up front so read-modify-write is atomic
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            value = {**(self._get(namespace, key, None) or {}), **changes}
+            self._set(namespace, key, value)
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return value
+
+    def _delete(self, namespace: str, key: str) -> None:
+        self._connect().execute(
+            "DELETE FROM shared_state WHERE namespace = ? AND key = ?", (namespace, key)
+        )
+
+    def _items(self, namespace: str) -> Dict[str, Any]:
+        rows = self._connect().execute(
+            "SELECT key, value FROM shared_state WHERE namespace = ?", (namespace,)
+        ).fetchall()
+        return {key: json.loads(value) for key, value in rows}
+
+    async def get(self, namespace: str, key: str, default: Any = None) -> Any:
+        return await asyncio.to_thread(self._get, namespace, key, default)
+
+    async def set(self, namespace: str, key: str, value: Any) -> None:
+        await asyncio.to_thread(self._set, namespace, key, value)
+
+    async def update(self, namespace: str, key: str, changes: Dict[str, Any]) -> Dict[str, Any]:
+        return await asyncio.to_thread(self._update, namespace, key, changes)
+
+    async def delete(self, namespace: str, key: str) -> None:
+        await asyncio.to_thread(self._delete, namespace, key)
+
+    async def items(self, namespace: str) -> Dict[str, Any]:
+        return await asyncio.to_thread(self._items, namespace)
+
+
+def configured_workers() -> int:
+    try:
+        return max(1, int(os.environ.get(WORKERS_ENV, "1")))
+    except ValueError:
+        return 1
+
+
+_shared_state = None
+
+
+def get_shared_state():
+    """Return the process-wide state store, SQLite-backed when running multiple workers."""
+    global _shared_state
+    if _shared_state is None:
+        if configured_workers() > 1:
+            _shared_state = SQLiteStateStore()
+        else:
+            _shared_state = MemoryStateStore()
+    return _shared_state
+
+
+class OwnerLease:
+    """Elects one backend worker as the owner of background tasks.
+
+    The owner holds an exclusive flock on OWNER_LOCK_PATH for its lifetime.
+    Other workers retry periodically and take over if the owner exits, so
+    background loops run exactly once per deployment.
+    """
+
+    def __init__(self, lock_path: str = OWNER_LOCK_PATH, retry_interval: float = 5.0):
+        self.lock_path = lock_path
+        self.retry_interval = retry_interval
+        self._fd: Optional[int] = None
+        self._tasks: List[asyncio.Task] = []
+        self._factories: List[tuple] = []
+        self._watcher: Optional[asyncio.Task] = None
+
+    @property
+    def is_owner(self) -> bool:
+        return self._fd is not None
+
+    def register(self, name: str, factory: Callable[[], Awaitable[Any]]) -> None:
+        """Register a coroutine factory to run only in the owner worker."""
+        self._factories.append((name, factory))
+        if self.is_owner and self._watcher is not None:
+            self._tasks.append(asyncio.create_task(factory(), name=name))
+
+    def _try_acquire(self) -> bool:
+        try:
+            import fcntl
+        except ImportError:
+            # No flock (Windows): only single-worker mode is supported there
+            self._fd = -1
+            return True
+        fd = os.open(self.lock_path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            return False
+        os.ftruncate(fd, 0)
+        os.write(fd, str(os.getpid()).encode())
+        self._fd = fd
+        return True
+
+    async def _acquire_loop(self):
+        while not self._try_acquire():
+            await asyncio.sleep(self.retry_interval)
+        logger.info(f"Worker {os.getpid()} owns background tasks")
+        for name, factory in self._factories:
+            self._tasks.append(asyncio.create_task(factory(), name=name))
+
+    async def start(self):
+        if self._watcher is None:
+            self._watcher = asyncio.create_task(self._acquire_loop())
+
+    async def stop(self):
+        if self._watcher is not None:
+            self._watcher.cancel()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks.clear()
+        if self._fd is not None and self._fd >= 0:
+            os.close(self._fd)
+        self._fd = None
+        self._watcher = None
+
+
+owner_lease = OwnerLease()
@@ -0,0 +1,90 @@
+import os
+import stat
+import zipfile
+
+import pytest
+
+from williamtoolbox.server.archive_ingest import _Extraction, ingest_sync, ADDED, SKIPPED
+
+
+def extraction(tmp_path, exts=None, strip_components=0, subdir=None):
+    return _Extraction(str(tmp_path / "docs"), exts or [], strip_components, subdir, {})
+
+
+@pytest.mark.parametrize("name", [
+    "../escape.md",
+    "a/../../escape.md",
+    "a/b/../../../escape.md",
+    "/etc/passwd",
+    "..\\escape.md",
+])
+def test_target_rejects_escaping_paths(tmp_path, name):
+    assert extraction(tmp_path).target(name) == (None, "path escapes doc_dir")
+
+
+@pytest.mark.parametrize("name", [
+    ".hidden.md",
+    "a/.git/config",
+    "_images/a.png",
+    "a/_images/b.png",
+    ".cache/index.json",
+    "__MACOSX/a.md",
+])
+def test_target_rejects_hidden_and_reserved_paths(tmp_path, name):
+    assert extraction(tmp_path).target(name) == (None, "hidden or reserved path")
+
+
+def test_target_strip_components_and_subdir(tmp_path):
+    ex = extraction(tmp_path, strip_components=1, subdir="imported")
+    assert ex.target("root/a/b.md") == (os.path.join("imported", "a", "b.md"), None)
+    assert ex.target("./root//c.md") == (os.path.join("imported", "c.md"), None)
+    assert ex.target("only-top.md") == (None, "outside strip_components")
+
+
+def test_target_rejects_subdir_escape(tmp_path):
+    for subdir in ("..", "../other", "a/../.."):
+        assert extraction(tmp_path, subdir=subdir).target("b.md") == (None, "path escapes doc_dir")
+
+
+def test_target_filters_extensions(tmp_path):
+    ex = extraction(tmp_path, exts=[".md"])
+    assert ex.target("a.MD") == ("a.MD", None)
+    assert ex.target("a.pdf") == (None, "extension not in required_exts")
+
+
+def test_ingest_zip_skips_symlinks_and_escapes(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    archive = tmp_path / "docs.zip"
+    with zipfile.ZipFile(archive, "w") as zf:
+        zf.writestr("top/a.md", "hello")
+        zf.writestr("top/../../evil.md", "evil")
+        link = zipfile.ZipInfo("top/link.md")
+        link.external_attr = (stat.S_IFLNK | 0o777) << 16
+        zf.writestr(link, "/etc/passwd")
+
+    result = ingest_sync(str(archive), str(tmp_path / "docs"), strip_components=1)
+
+    by_path = {f["path"]: f for f in result["files"]}
+    assert by_path["a.md"]["status"] == ADDED
+    assert by_path["top/link.md"] == {"path": "top/link.md", "status": SKIPPED, "reason": "symlink"}
+    assert by_path["top/../../evil.md"]["status"] == SKIPPED
+    assert (tmp_path / "docs" / "a.md").read_text() == "hello"
+    assert not (tmp_path / "docs" / "link.md").exists()
+    assert not (tmp_path / "evil.md").exists()
+    assert result["summary"][ADDED] == 1 and result["summary"][SKIPPED] == 2
+
+
+def test_ingest_leaves_unchanged_files_alone(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    archive = tmp_path / "docs.zip"
+    with zipfile.ZipFile(archive, "w") as zf:
+        zf.writestr("a.md", "same")
+    doc_dir = tmp_path / "docs"
+    doc_dir.mkdir()
+    (doc_dir / "a.md").write_text("same")
+    mtime = os.stat(doc_dir / "a.md").st_mtime_ns
+
+    result = ingest_sync(str(archive), str(doc_dir))
+
+    assert result["files"][0]["status"] == "unchanged"
+    assert os.stat(doc_dir / "a.md").st_mtime_ns == mtime
@@ -0,0 +1,72 @@
+from williamtoolbox.server.build_progress import BuildProgress
+
+
+def test_files_are_timed_between_mentions():
+    progress = BuildProgress(["docs/a.md", "b.pdf", "c.md"], started_at=100.0)
+    progress.feed("Processing /data/rag/docs/a.md", now=101.0)
+    progress.feed("still working on it", now=102.0)
+    progress.feed("Processing b.pdf", now=104.0)
+    assert progress.current_file == "b.pdf"
+    snapshot = progress.snapshot(now=104.0)
+    assert snapshot["files_processed"] == 1
+    assert snapshot["files_total"] == 3
+    assert snapshot["slowest_files"] == [{"path": "docs/a.md", "seconds": 3.0}]
+    # One file in 4s, two to go
+    assert snapshot["eta_seconds"] == 8.0
+
+    progress.finish(now=110.0)
+    assert progress.current_file is None
+    assert progress.timings() == [
+        {"path": "b.pdf", "seconds": 6.0},
+        {"path": "docs/a.md", "seconds": 3.0},
+    ]
+
+
+def test_stated_duration_wins():
+    progress = BuildProgress(["a.md", "b.md"], started_at=100.0)
+    progress.feed("a.md took 1.25s", now=101.0)
+    progress.feed("b.md", now=150.0)
+    assert progress.timings()[0] == {"path": "a.md", "seconds": 1.25}
+
+
+def test_unknown_and_similar_paths_are_ignored():
+    progress = BuildProgress(["docs/a.md"], started_at=100.0)
+    progress.feed("loading config.yaml", now=101.0)
+    progress.feed("Processing other/a.md", now=102.0)
+    progress.feed("Processing xdocs/a.md", now=103.0)
+    assert progress.current_file is None
+    progress.feed("Processing C:\\rag\\docs\\a.md", now=104.0)
+    assert progress.current_file == "docs/a.md"
+
+
+def test_tqdm_bar_gives_counts_and_eta():
+    progress = BuildProgress(["a.md", "b.md", "c.md", "d.md"], started_at=100.0)
+    progress.feed(" 50%|#####     | 2/4 [00:12<01:05, 1.2it/s]", now=112.0)
+    snapshot = progress.snapshot(now=112.0)
+    assert (snapshot["files_processed"], snapshot["files_total"], snapshot["percent"]) == (2, 4, 50.0)
+    assert snapshot["eta_seconds"] == 65
+    # Unknown remaining time: estimated from the elapsed time instead
+    progress.feed(" 75%|#######   | 3/4 [00:20<?, ?it/s]", now=120.0)
+    assert progress.bar_eta is None
+    assert progress.snapshot(now=130.0)["eta_seconds"] == 10.0
+
+
+def test_bar_over_something_else_is_not_the_file_count():
+    progress = BuildProgress(["a.md", "b.md"], started_at=100.0)
+    progress.feed("embedding: 30/500 [00:01<00:20]", now=101.0)
+    snapshot = progress.snapshot(now=101.0)
+    assert (snapshot["files_processed"], snapshot["files_total"]) == (0, 2)
+
+
+def test_chunk_and_token_counts():
+    progress = BuildProgress([], started_at=100.0)
+    progress.feed("a.md: 12 chunks, 3000 tokens", now=101.0)
+    progress.feed("b.md: chunks=8 tokens: 1000", now=102.0)
+    assert (progress.chunks, progress.tokens) == (20, 4000)
+    progress.feed("c.md: tokens=18 chunks=2", now=102.5)
+    assert (progress.chunks, progress.tokens) == (22, 4018)
+    # A total restates the running count instead of adding to it
+    progress.feed("Total: 25 chunks, 5000 tokens", now=103.0)
+    assert (progress.chunks, progress.tokens) == (25, 5000)
+    snapshot = progress.snapshot(now=104.0)
+    assert snapshot["files_total"] == 0 and snapshot["percent"] is None
@@ -0,0 +1,69 @@
+import pytest
+
+from williamtoolbox.server.doc_index import DocDirIndex, encode_cursor
+
+
+@pytest.fixture
+def index(tmp_path):
+    for i, name in enumerate(["b.md", "a.md", "d.pdf", "c.md", "sub/e.md"]):
+        path = tmp_path / name
+        path.parent.mkdir(exist_ok=True)
+        path.write_bytes(b"x" * (10 * (i + 1)))
+    # Never listed: image extraction output and the index cache
+    (tmp_path / "_images").mkdir()
+    (tmp_path / "_images" / "i.png").write_bytes(b"png")
+    return DocDirIndex(str(tmp_path))
+
+
+def pages(index, **kwargs):
+    names, cursor = [], None
+    while True:
+        page = index.query(limit=2, cursor=cursor, **kwargs)
+        names.append([item["name"] for item in page["items"]])
+        cursor = page["next_cursor"]
+        if cursor is None:
+            return names
+
+
+def test_pages_ascending(index):
+    assert pages(index) == [["a.md", "b.md"], ["c.md", "d.pdf"], ["sub/e.md"]]
+
+
+def test_pages_descending(index):
+    assert pages(index, order="desc") == [["sub/e.md", "d.pdf"], ["c.md", "b.md"], ["a.md"]]
+
+
+def test_pages_by_size(index):
+    assert pages(index, sort="size") == [["b.md", "a.md"], ["d.pdf", "c.md"], ["sub/e.md"]]
+    assert pages(index, sort="size", order="desc") == [["sub/e.md", "c.md"], ["d.pdf", "a.md"], ["b.md"]]
+
+
+def test_filters_and_totals(index):
+    page = index.query(ext="md", limit=10)
+    assert [item["name"] for item in page["items"]] == ["a.md", "b.md", "c.md", "sub/e.md"]
+    assert page["total"] == 4
+    assert page["total_bytes"] == 10 + 20 + 40 + 50
+    assert page["next_cursor"] is None
+    assert page["extensions"] == {".md": {"count": 4, "bytes": 120}}
+
+
+def test_cursor_survives_changes_between_pages(index, tmp_path):
+    first = index.query(limit=2)
+    (tmp_path / "a.md").unlink()
+    (tmp_path / "aa.md").write_bytes(b"new")
+    index.refresh(force=True)
+    second = index.query(limit=2, cursor=first["next_cursor"])
+    assert [item["name"] for item in second["items"]] == ["c.md", "d.pdf"]
+
+
+def test_bad_cursor(index):
+    with pytest.raises(ValueError):
+        index.query(cursor="not a cursor")
+
+
+def test_cursor_of_another_sort_key(index):
+    cursor = index.query(limit=2)["next_cursor"]
+    with pytest.raises(ValueError, match="sort key"):
+        index.query(sort="size", cursor=cursor)
+    with pytest.raises(ValueError, match="sort key"):
+        index.query(sort="name", cursor=encode_cursor(10, "a.md"))
@@ -0,0 +1,86 @@
+import asyncio
+import hashlib
+import os
+
+import pytest
+
+from williamtoolbox.server import uploads
+
+
+async def blocks(*parts):
+    for part in parts:
+        yield part
+
+
+def sha(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+@pytest.fixture
+def session(tmp_path, monkeypatch):
+    # Sessions and blobs live under relative data/ paths
+    monkeypatch.chdir(tmp_path)
+    return asyncio.run(uploads.create_session("rag-a", str(tmp_path / "docs"), "doc.txt", size=10, chunk_size=4))
+
+
+def put(session, index, *parts, sha256=None, scope="rag-a"):
+    return asyncio.run(uploads.put_chunk(session["upload_id"], scope, index, blocks(*parts), sha256=sha256))
+
+
+def test_chunks_are_sized_from_the_session(session):
+    assert session["total_chunks"] == 3
+    assert [uploads._expected_size(session, i) for i in range(3)] == [4, 4, 2]
+
+
+def test_put_chunk_records_size_and_checksum(session):
+    stored = put(session, 1, b"ef", b"gh", sha256=sha(b"efgh").upper())
+    assert stored["chunks"]["1"] == {"size": 4, "sha256": sha(b"efgh")}
+    assert uploads.session_status(stored)["missing"] == [0, 2]
+
+
+def test_put_chunk_rejects_wrong_sizes(session):
+    with pytest.raises(ValueError, match="More than the expected 4 bytes"):
+        put(session, 0, b"abc", b"de")
+    with pytest.raises(ValueError, match="has 3 bytes, expected 4"):
+        put(session, 0, b"abc")
+    # The last chunk is shorter
+    with pytest.raises(ValueError, match="expected 2"):
+        put(session, 2, b"ijkl")
+    assert not os.path.exists(uploads._chunk_path(session["upload_id"], 0))
+
+
+def test_put_chunk_rejects_checksum_mismatch(session):
+    with pytest.raises(ValueError, match="Checksum mismatch for chunk 0"):
+        put(session, 0, b"abcd", sha256=sha(b"abce"))
+    assert not os.path.exists(uploads._chunk_path(session["upload_id"], 0))
+    status = uploads.session_status(asyncio.run(uploads.load_session(session["upload_id"], "rag-a")))
+    assert status["received_chunks"] == 0
+
+
+def test_put_chunk_checks_index_and_scope(session):
+    with pytest.raises(ValueError, match="out of range"):
+        put(session, 3, b"ab")
+    with pytest.raises(LookupError):
+        put(session, 0, b"abcd", scope="rag-b")
+
+
+def test_retried_chunk_replaces_the_first(session, tmp_path):
+    put(session, 0, b"xxxx")
+    put(session, 0, b"abcd")
+    put(session, 2, b"ij")
+    put(session, 1, b"efgh")
+    result = asyncio.run(uploads.complete_session(session["upload_id"], "rag-a"))
+    assert result["size"] == 10 and result["sha256"] == sha(b"abcdefghij")
+    assert (tmp_path / "docs" / "doc.txt").read_bytes() == b"abcdefghij"
+    assert not os.path.exists(uploads._session_dir(session["upload_id"]))
+
+
+def test_complete_keeps_session_on_file_checksum_mismatch(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    session = asyncio.run(uploads.create_session("rag-a", str(tmp_path / "docs"), "doc.txt", size=4,
+                                                 chunk_size=4, sha256=sha(b"other")))
+    put(session, 0, b"abcd")
+    with pytest.raises(ValueError, match="assembled file"):
+        asyncio.run(uploads.complete_session(session["upload_id"], "rag-a"))
+    assert not (tmp_path / "docs" / "doc.txt").exists()
+    assert os.path.exists(uploads._session_file(session["upload_id"]))